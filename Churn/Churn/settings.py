@@ -138,6 +138,71 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Latency-sensitive work (ingestion, per-customer detection, notifications)
+# and bulk work (batch scoring, baselines, retention, training) run on
+# separate queues served by separate worker pools (see celery.py), so a
+# nightly batch run never queues in front of a real-time alert. Within a
+# queue, Redis delivers lower priority numbers first.
+REALTIME_TASK_PRIORITIES = {
+    'churnapp.tasks.send_anomaly_notification': 0,
+    'churnapp.tasks.send_incident_notification': 0,
+    'churnapp.tasks.send_watchlist_update': 0,
+    'churnapp.tasks.process_customer_event': 3,
+    'churnapp.tasks.process_customer_events_batch': 3,
+    'churnapp.tasks.detect_customer_anomaly': 3,
+    'churnapp.tasks.run_coalesced_detection': 3,
+    'churnapp.tasks.detect_customer_anomalies': 3,
+    'churnapp.tasks.trigger_churn_prediction': 5,
+    'churnapp.tasks.add_to_watchlist': 5,
+}
+BULK_TASK_PRIORITIES = {
+    'churnapp.tasks.batch_anomaly_detection': 5,
+    'churnapp.tasks.detect_anomaly_range': 5,
+    'churnapp.tasks.merge_batch_anomaly_results': 5,
+    'churnapp.tasks.update_customer_baselines': 5,
+    'churnapp.tasks.update_customer_baseline_range': 5,
+    'churnapp.tasks.cleanup_old_alerts': 7,
+    'churnapp.tasks.apply_retention': 7,
+    'churnapp.tasks.backfill_customer_sessions': 7,
+    'churnapp.tasks.reconcile_behavior_counters': 7,
+    'churnapp.tasks.train_anomaly_model': 9,
+}
+CELERY_TASK_QUEUES = {
+    'realtime': {'exchange': 'realtime', 'routing_key': 'realtime'},
+    'bulk': {'exchange': 'bulk', 'routing_key': 'bulk'},
+}
+CELERY_TASK_DEFAULT_QUEUE = 'bulk'  # unrouted tasks must not delay real-time work
+CELERY_TASK_ROUTES = {
+    **{name: {'queue': 'realtime', 'priority': priority} for name, priority in REALTIME_TASK_PRIORITIES.items()},
+    **{name: {'queue': 'bulk', 'priority': priority} for name, priority in BULK_TASK_PRIORITIES.items()},
+}
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+# Reserve one task at a time so priorities hold and a long bulk task
+# doesn't sit on prefetched work
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    'train-anomaly-model': {
+        'task': 'churnapp.tasks.train_anomaly_model',
+        'schedule': 24 * 60 * 60,  # nightly
+    },
+    'reconcile-behavior-counters': {
+        'task': 'churnapp.tasks.reconcile_behavior_counters',
+        'schedule': 24 * 60 * 60,
+    },
+    'update-customer-baselines': {
+        'task': 'churnapp.tasks.update_customer_baselines',
+        'schedule': 24 * 60 * 60,  # folds yesterday in; a day is never applied twice
+    },
+    'apply-retention': {
+        'task': 'churnapp.tasks.apply_retention',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
 # Channels Configuration (WebSocket)
 ASGI_APPLICATION = 'churn.asgi.application'
 CHANNEL_LAYERS = {
@@ -156,3 +221,61 @@ CACHES = {
         'LOCATION': 'redis://127.0.0.1:6379/1',
     }
 }
+
+# Real-time pipeline tuning
+CHURN_RESPONSE_CACHE_TIMEOUT = 60  # seconds a cached listing may be served
+CHURN_INFERENCE_WORKERS = None  # inference threads for async views (None = CPU count)
+CHURN_MAX_EVENTS_PER_BATCH = 10000  # cap for /api/track-events/
+CHURN_DETECTION_DEBOUNCE_SECONDS = 10  # quiet period before a customer's pending detection runs
+CHURN_DETECTION_MAX_WAIT_SECONDS = 60  # ...but never later than this after the first trigger
+CHURN_ALERT_DEDUP_SECONDS = 6 * 60 * 60  # one alert per customer and alert type per window
+CHURN_FUSED_PIPELINE = False  # predict, update the watchlist and notify inside the detection task
+CHURN_NOTIFICATION_TICK_MS = 100  # WebSocket notifications per group are batched per tick (0 = send each)
+CHURN_NOTIFICATION_MAX_BATCH = 500  # ...flushing early once a group has this many queued
+CHURN_INCIDENT_EWMA_ALPHA = 0.1  # smoothing of per-minute event counts for platform spike detection
+CHURN_INCIDENT_SIGMAS = 6.0  # standard deviations above the EWMA that make a spike
+CHURN_INCIDENT_MIN_EVENTS_PER_MINUTE = 50  # ...and never below this many events platform-wide
+CHURN_INCIDENT_WARMUP_MINUTES = 15  # minutes of history before incidents may be raised
+CHURN_INCIDENT_QUIET_MINUTES = 10  # an incident resolves, and suppression ends, after this long without a spike
+
+# Anomaly model artifacts, trained by the train_anomaly_model task and hot-reloaded by workers
+CHURN_ANOMALY_MODEL_DIR = BASE_DIR / 'churnapp' / 'Model' / 'anomaly'
+CHURN_ANOMALY_MODEL_CHECK_SECONDS = 30
+CHURN_ANOMALY_DETECTOR = 'isolation_forest'  # or 'streaming': robust z-scores updated with each closed day
+CHURN_BATCH_SCORING_CHUNK = 20000  # customers scored per decision_function call in batch detection
+CHURN_BATCH_DETECTION_RANGE_SIZE = 20000  # active customers per batch detection sub-task in the chord
+CHURN_RETENTION_DAYS = {}  # per-policy overrides, e.g. {'events': 180}; defaults in churnapp/retention.py
+CHURN_RETENTION_CHUNK_SIZE = 5000  # rows deleted per short transaction
+CHURN_ARCHIVE_EXPIRED_EVENTS = False  # write expired events to compressed columnar files before deleting them
+CHURN_EVENT_ARCHIVE_DIR = BASE_DIR / 'event_archive'
+CHURN_BASELINE_HALF_LIFE_DAYS = 30  # decay of online per-customer baselines
+CHURN_BASELINE_RANGE_SIZE = 50000  # customer ids per baseline update task
+CHURN_MIN_SKETCH_DAYS = 14  # observed days before per-customer P5/P95 thresholds replace fixed ratios
+
+# Rolling 1/7/30-day per-customer behavior counters maintained at ingestion
+CHURN_BEHAVIOR_COUNTERS = False
+
+# Streaming dashboard sketches maintained at ingestion: Space-Saving top
+# customers per event type and hour (count error <= events / capacity) and
+# HyperLogLog distinct active customers (standard error 1.04 / sqrt(2**precision))
+CHURN_DASHBOARD_STATS = True
+CHURN_STATS_TOP_K_CAPACITY = 200
+CHURN_STATS_HLL_PRECISION = 12
+CHURN_STATS_FLUSH_EVENTS = 500  # pending events that trigger a merge into the cache
+CHURN_STATS_FLUSH_INTERVAL_MS = 1000  # longest an event waits in the local delta
+CHURN_STATS_MAX_PENDING_KEYS = 500  # sketch keys kept locally while the cache is down
+
+# Sessions: logins unanswered for longer are unterminated; read features from
+# persisted CustomerSession rows (run backfill_customer_sessions first)
+CHURN_MAX_SESSION_MINUTES = 12 * 60
+CHURN_PERSISTED_SESSIONS = False
+
+# Write-behind event buffer: accept events in memory and bulk insert them
+CHURN_EVENT_WRITE_BEHIND = False
+CHURN_EVENT_BUFFER = {
+    'CAPACITY': 50000,
+    'FLUSH_INTERVAL_MS': 200,
+    'FLUSH_SIZE': 1000,
+    'SPILL_DIR': BASE_DIR / 'event_spill',
+    'FSYNC': True,
+}
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import celeryd_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'churn.settings')
@@ -10,6 +11,27 @@ app = Celery('churn')
 # the configuration object to child processes.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Queues, routes and priorities come from the CELERY_TASK_* settings so
+# publishers in the web process route the same way; the worker pools for
+# each queue are configured here:
+#
+#   celery -A churn worker -n realtime@%h -Q realtime
+#   celery -A churn worker -n bulk@%h -Q bulk
+#
+# Worker pool settings by node name (the part before '@')
+WORKER_POOLS = {
+    'realtime': {'worker_concurrency': 8, 'task_acks_late': False, 'worker_max_tasks_per_child': None},
+    'bulk': {'worker_concurrency': 2, 'task_acks_late': True, 'worker_max_tasks_per_child': 20},
+}
+
+
+@celeryd_init.connect
+def configure_worker_pool(sender=None, conf=None, **kwargs):
+    pool = WORKER_POOLS.get(str(sender).split('@')[0])
+    if pool:
+        for option, value in pool.items():
+            setattr(conf, option, value)
+
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
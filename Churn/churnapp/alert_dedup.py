@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+import logging
+
+from .models import AnomalyAlert
+
+logger = logging.getLogger(__name__)
+
+# A (customer, alert_type) pair alerts at most once per window
+DEDUP_WINDOW_SECONDS = getattr(settings, 'CHURN_ALERT_DEDUP_SECONDS', 6 * 60 * 60)
+
+DEDUP_KEY = 'churnapp:alert_dedup:{}:{}'
+WARM_KEY = 'churnapp:alert_dedup:warm'
+
+
+class AlertDedupIndex:
+    """
+    TTL index of recently alerted (customer, alert_type) pairs. claim() is an
+    atomic set-if-absent (cache.add; SET NX on Redis), so of two workers
+    detecting the same customer only one creates the alert, and the database
+    is only touched for alerts that are really new. Falls back to an
+    in-process index when the cache is unavailable.
+    """
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def claim(self, customer_id, alert_type):
+        """True if no alert of this type was raised for the customer within the window"""
+        try:
+            self._ensure_warm()
+            return cache.add(DEDUP_KEY.format(customer_id, alert_type), 1, self.ttl_seconds)
+        except Exception as exc:
+            logger.warning(f"Alert dedup cache unavailable, using in-process index: {exc}")
+            return self._claim_local((customer_id, alert_type), time.time() + self.ttl_seconds)
+
+    def release(self, customer_id, alert_type):
+        """Forget a claim whose alert could not be written"""
+        try:
+            cache.delete(DEDUP_KEY.format(customer_id, alert_type))
+        except Exception:
+            pass
+        with self._lock:
+            self._local.pop((customer_id, alert_type), None)
+
+    def _claim_local(self, key, expires_at):
+        now = time.time()
+        with self._lock:
+            if self._local.get(key, 0) > now:
+                return False
+            if len(self._local) > 100000:
+                self._local = {k: v for k, v in self._local.items() if v > now}
+            self._local[key] = expires_at
+            return True
+
+    def _ensure_warm(self):
+        """
+        After a cache flush or on first use, load alerts already in the
+        database for the current window so the index agrees with it
+        """
+        if not cache.add(WARM_KEY, 1, self.ttl_seconds):
+            return
+        cutoff = timezone.now() - timedelta(seconds=self.ttl_seconds)
+        recent = AnomalyAlert.objects.filter(detected_at__gte=cutoff).values_list(
+            'customer_id', 'alert_type', 'detected_at'
+        ).order_by()
+        now = timezone.now()
+        for customer_id, alert_type, detected_at in recent.iterator(chunk_size=5000):
+            remaining = self.ttl_seconds - (now - detected_at).total_seconds()
+            if remaining > 0:
+                cache.add(DEDUP_KEY.format(customer_id, alert_type), 1, remaining)
+
+
+# Global dedup index
+alert_dedup = AlertDedupIndex(ttl_seconds=DEDUP_WINDOW_SECONDS)
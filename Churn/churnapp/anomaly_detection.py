@@ -3,27 +3,197 @@ import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 from datetime import datetime, timedelta
+from pathlib import Path
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import Count, Avg, Q
+from django.db.models.functions import ExtractHour
 from .models import Customer, CustomerEvent, CustomerBehaviorBaseline, AnomalyAlert
+from .caching import bump_table_version
+from .alert_dedup import alert_dedup
+from .incidents import platform_monitor
+from .sessions import average_session_minutes, DEFAULT_SESSION_MINUTES
+import joblib
+import json
 import logging
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Where trained scaler + IsolationForest artifacts are published for workers
+MODEL_DIR = getattr(settings, 'CHURN_ANOMALY_MODEL_DIR', Path(__file__).resolve().parent / 'Model' / 'anomaly')
+MODEL_POINTER = 'current.json'
+MODEL_CHECK_INTERVAL = getattr(settings, 'CHURN_ANOMALY_MODEL_CHECK_SECONDS', 30)
+KEEP_MODEL_VERSIONS = 3
+
+ENGAGEMENT_EVENTS = ['page_view', 'search', 'cart_add']
+PROBLEM_EVENTS = ['payment_failed', 'app_crash', 'support_ticket']
+
+
+def behavioral_feature_aggregates():
+    """
+    Conditional aggregates behind every behavioral feature except session
+    duration, so a whole feature vector costs a single query
+    """
+    login = Q(event_type='login')
+    purchase = Q(event_type='purchase')
+    return {
+        'login_count': Count('id', filter=login),
+        'avg_login_hour': Avg(ExtractHour('timestamp'), filter=login),
+        'purchase_count': Count('id', filter=purchase),
+        'avg_purchase_amount': Avg('amount', filter=purchase),
+        'logout_count': Count('id', filter=Q(event_type='logout')),
+        'engagement_count': Count('id', filter=Q(event_type__in=ENGAGEMENT_EVENTS)),
+        'problem_count': Count('id', filter=Q(event_type__in=PROBLEM_EVENTS)),
+        'cart_abandon_count': Count('id', filter=Q(event_type='cart_abandon')),
+        'weekend_count': Count('id', filter=Q(timestamp__week_day__in=[1, 7])),  # Sunday=1, Saturday=7
+        'late_night_count': Count('id', filter=Q(timestamp__hour__gte=23) | Q(timestamp__hour__lt=5)),  # 11PM-5AM
+        'total_count': Count('id'),
+    }
+
+
+def features_from_aggregates(stats, avg_session_duration):
+    """Build the ordered feature dict from behavioral_feature_aggregates() output"""
+    total = stats['total_count']
+    return {
+        'login_frequency': stats['login_count'],
+        'avg_login_hour': stats['avg_login_hour'] if stats['avg_login_hour'] is not None else 12,  # Default to noon
+        'purchase_frequency': stats['purchase_count'],
+        'avg_purchase_amount': stats['avg_purchase_amount'] or 0.0,
+        'avg_session_duration': avg_session_duration,
+        'engagement_frequency': stats['engagement_count'],
+        'problem_frequency': stats['problem_count'],
+        'cart_abandon_frequency': stats['cart_abandon_count'],
+        'weekend_activity': (stats['weekend_count'] / total) * 100 if total else 0.0,
+        'late_night_activity': (stats['late_night_count'] / total) * 100 if total else 0.0,
+    }
+
+
+# Column order of feature vectors and matrices
+FEATURE_NAMES = [
+    'login_frequency', 'avg_login_hour', 'purchase_frequency', 'avg_purchase_amount',
+    'avg_session_duration', 'engagement_frequency', 'problem_frequency',
+    'cart_abandon_frequency', 'weekend_activity', 'late_night_activity',
+]
+
+# Aggregate output for a customer with no events in the window
+EMPTY_FEATURE_STATS = {
+    'login_count': 0, 'avg_login_hour': None, 'purchase_count': 0, 'avg_purchase_amount': None,
+    'logout_count': 0, 'engagement_count': 0, 'problem_count': 0, 'cart_abandon_count': 0,
+    'weekend_count': 0, 'late_night_count': 0, 'total_count': 0,
+}
+
+
+def sample_customer_ids(sample_size, sampling='stratified', min_events=50, seed=42):
+    """
+    Pick customers with at least min_events events from the whole population.
+    'random' samples uniformly; 'stratified' samples proportionally from
+    activity quartiles so light and heavy users are both represented.
+    """
+    eligible = np.array(
+        CustomerEvent.objects.values('customer_id').annotate(
+            event_count=Count('id')
+        ).filter(event_count__gte=min_events).order_by().values_list('customer_id', 'event_count'),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    
+    if sample_size is None or len(eligible) <= sample_size:
+        return np.sort(eligible[:, 0])
+    
+    rng = np.random.default_rng(seed)
+    if sampling == 'random':
+        return np.sort(rng.choice(eligible[:, 0], size=sample_size, replace=False))
+    if sampling != 'stratified':
+        raise ValueError(f"Unknown sampling strategy: {sampling}")
+    
+    edges = np.quantile(eligible[:, 1], [0.25, 0.5, 0.75])
+    strata = np.searchsorted(edges, eligible[:, 1], side='right')
+    sampled = []
+    for stratum in np.unique(strata):
+        members = eligible[strata == stratum, 0]
+        take = max(1, round(sample_size * len(members) / len(eligible)))
+        sampled.append(rng.choice(members, size=min(take, len(members)), replace=False))
+    sampled = np.concatenate(sampled)
+    if len(sampled) > sample_size:
+        # Rounding up small strata overshoots; trim at random, not by id
+        sampled = rng.choice(sampled, size=sample_size, replace=False)
+    return np.sort(sampled)
+
+
+def build_feature_matrix(customer_ids, days_back=30, chunk_size=5000):
+    """
+    Build the customer x feature matrix with one grouped aggregate query and
+    one session query per chunk of customers, streaming rows
+    into a preallocated array. Returns (customer_ids, X) in matching order.
+    """
+    customer_ids = np.asarray(customer_ids, dtype=np.int64)
+    X = np.empty((len(customer_ids), len(FEATURE_NAMES)), dtype=np.float64)
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=days_back)
+    
+    for offset in range(0, len(customer_ids), chunk_size):
+        chunk = customer_ids[offset:offset + chunk_size].tolist()
+        window = CustomerEvent.objects.filter(
+            customer_id__in=chunk,
+            timestamp__gte=start_date,
+            timestamp__lte=end_date
+        )
+        
+        stats_by_customer = {
+            row.pop('customer_id'): row
+            for row in window.values('customer_id').annotate(
+                **behavioral_feature_aggregates()
+            ).order_by()
+        }
+        
+        sessions_by_customer = average_session_minutes(chunk, start_date, end_date)
+        
+        for row_index, customer_id in enumerate(chunk, start=offset):
+            features = features_from_aggregates(
+                stats_by_customer.get(customer_id, EMPTY_FEATURE_STATS),
+                sessions_by_customer.get(customer_id, DEFAULT_SESSION_MINUTES)
+            )
+            X[row_index] = [features[name] for name in FEATURE_NAMES]
+    
+    return customer_ids, X
+
+
+def _new_isolation_forest():
+    return IsolationForest(
+        contamination=0.1,  # Expect 10% of data to be anomalous
+        random_state=42,
+        n_estimators=100
+    )
+
+
 class CustomerAnomalyDetector:
     """Real-time anomaly detection for customer behavior patterns"""
     
-    def __init__(self):
-        self.isolation_forest = IsolationForest(
-            contamination=0.1,  # Expect 10% of data to be anomalous
-            random_state=42,
-            n_estimators=100
-        )
+    def __init__(self, model_dir=MODEL_DIR):
+        self.isolation_forest = _new_isolation_forest()
         self.scaler = StandardScaler()
         self.is_fitted = False
+        
+        # Persisted model tracking (see save_model / refresh_model)
+        self.model_dir = Path(model_dir)
+        self.model_version = None
+        self.fitted_at = None
+        self.n_samples = 0
+        self._model_lock = threading.Lock()
+        self._last_model_check = None
     
     def extract_behavioral_features(self, customer, days_back=7):
-        """Extract behavioral features for anomaly detection"""
+        """Extract behavioral features for anomaly detection in one or two queries"""
+        from .behavior_counters import behavior_counters, COUNTERS_ENABLED, HOURS
+        
+        # Rolling counters answer without touching the event table
+        if COUNTERS_ENABLED and days_back * 24 <= HOURS:
+            features = behavior_counters.features(customer.id, days_back)
+            if features is not None:
+                return features
+        
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days_back)
         
@@ -34,143 +204,166 @@ class CustomerAnomalyDetector:
             timestamp__lte=end_date
         )
         
-        # Calculate behavioral metrics
-        features = {}
+        # All counts and averages in a single round trip
+        stats = recent_events.aggregate(**behavioral_feature_aggregates())
         
-        # Login patterns
-        login_events = recent_events.filter(event_type='login')
-        features['login_frequency'] = login_events.count()
-        features['avg_login_hour'] = self._calculate_avg_hour(login_events)
+        # Sessions need both a login and a logout in the window
+        avg_session_duration = DEFAULT_SESSION_MINUTES
+        if stats['login_count'] and stats['logout_count']:
+            avg_session_duration = average_session_minutes(
+                [customer.id], start_date, end_date
+            ).get(customer.id, DEFAULT_SESSION_MINUTES)
         
-        # Purchase patterns
-        purchase_events = recent_events.filter(event_type='purchase')
-        features['purchase_frequency'] = purchase_events.count()
-        features['avg_purchase_amount'] = self._calculate_avg_purchase_amount(purchase_events)
+        return features_from_aggregates(stats, avg_session_duration)
+    
+    def build_baseline_model(self, customer_sample_size=10000, sampling='stratified', min_events=50, days_back=30):
+        """
+        Build baseline anomaly detection model from historical data. Pass
+        customer_sample_size=None to fit on every eligible customer.
+        """
+        logger.info("Building baseline anomaly detection model...")
         
-        # Session patterns
-        session_events = recent_events.filter(event_type__in=['login', 'logout'])
-        features['avg_session_duration'] = self._calculate_avg_session_duration(session_events)
+        # Sample customers with sufficient data across the whole population
+        customer_ids = sample_customer_ids(customer_sample_size, sampling=sampling, min_events=min_events)
         
-        # Engagement patterns
-        engagement_events = recent_events.filter(event_type__in=['page_view', 'search', 'cart_add'])
-        features['engagement_frequency'] = engagement_events.count()
+        if not len(customer_ids):
+            logger.warning("Insufficient customer data for baseline model")
+            return False
         
-        # Problem indicators
-        problem_events = recent_events.filter(event_type__in=['payment_failed', 'app_crash', 'support_ticket'])
-        features['problem_frequency'] = problem_events.count()
+        # Extract features for all sampled customers with grouped queries
+        _, X = build_feature_matrix(customer_ids, days_back=days_back)
         
-        # Cart abandonment
-        cart_events = recent_events.filter(event_type='cart_abandon')
-        features['cart_abandon_frequency'] = cart_events.count()
+        # Fit fresh estimators so a detector that is serving is never half-updated
+        scaler = StandardScaler()
+        isolation_forest = _new_isolation_forest()
+        isolation_forest.fit(scaler.fit_transform(X))
         
-        # Time-based patterns
-        features['weekend_activity'] = self._calculate_weekend_activity(recent_events)
-        features['late_night_activity'] = self._calculate_late_night_activity(recent_events)
+        with self._model_lock:
+            self.scaler = scaler
+            self.isolation_forest = isolation_forest
+            self.is_fitted = True
+            self.fitted_at = timezone.now()
+            self.n_samples = len(X)
+            self.model_version = None
         
-        return features
-    
-    def _calculate_avg_hour(self, events):
-        """Calculate average hour of day for events"""
-        if not events.exists():
-            return 12  # Default to noon
-        hours = [event.timestamp.hour for event in events]
-        return np.mean(hours) if hours else 12
-    
-    def _calculate_avg_purchase_amount(self, purchase_events):
-        """Calculate average purchase amount from metadata"""
-        amounts = []
-        for event in purchase_events:
-            if 'amount' in event.metadata:
-                amounts.append(float(event.metadata['amount']))
-        return np.mean(amounts) if amounts else 0.0
-    
-    def _calculate_avg_session_duration(self, session_events):
-        """Calculate average session duration in minutes"""
-        sessions = []
-        login_time = None
-        
-        for event in session_events.order_by('timestamp'):
-            if event.event_type == 'login':
-                login_time = event.timestamp
-            elif event.event_type == 'logout' and login_time:
-                duration = (event.timestamp - login_time).total_seconds() / 60
-                sessions.append(duration)
-                login_time = None
-        
-        return np.mean(sessions) if sessions else 30.0  # Default 30 minutes
-    
-    def _calculate_weekend_activity(self, events):
-        """Calculate percentage of activity on weekends"""
-        if not events.exists():
-            return 0.0
-        weekend_events = events.filter(timestamp__week_day__in=[1, 7])  # Sunday=1, Saturday=7
-        return (weekend_events.count() / events.count()) * 100
+        logger.info(f"Baseline model built with {len(X)} customer samples")
+        return True
     
-    def _calculate_late_night_activity(self, events):
-        """Calculate percentage of activity between 11PM and 5AM"""
-        if not events.exists():
-            return 0.0
-        late_night_events = events.filter(
-            Q(timestamp__hour__gte=23) | Q(timestamp__hour__lt=5)
+    def save_model(self):
+        """
+        Persist the fitted scaler + IsolationForest as a new version and
+        point workers at it; returns the artifact metadata
+        """
+        if not self.is_fitted:
+            raise ValueError("Cannot save an unfitted anomaly detector")
+        
+        version = int(time.time() * 1000)
+        metadata = {
+            'version': version,
+            'fitted_at': (self.fitted_at or timezone.now()).isoformat(),
+            'n_samples': self.n_samples,
+            'feature_names': FEATURE_NAMES,
+            'path': f"anomaly-model-{version}.joblib",
+        }
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Write to temp files and rename so readers never see partial files
+        artifact_path = self.model_dir / metadata['path']
+        joblib.dump(
+            {'scaler': self.scaler, 'isolation_forest': self.isolation_forest, **metadata},
+            f"{artifact_path}.tmp"
         )
-        return (late_night_events.count() / events.count()) * 100
-    
-    def build_baseline_model(self, customer_sample_size=100):
-        """Build baseline anomaly detection model from historical data"""
-        logger.info("Building baseline anomaly detection model...")
+        os.replace(f"{artifact_path}.tmp", artifact_path)
         
-        # Get sample of customers with sufficient data
-        customers = Customer.objects.annotate(
-            event_count=Count('events')
-        ).filter(event_count__gte=50)[:customer_sample_size]
+        pointer_path = self.model_dir / MODEL_POINTER
+        with open(f"{pointer_path}.tmp", 'w') as pointer_file:
+            json.dump(metadata, pointer_file)
+        os.replace(f"{pointer_path}.tmp", pointer_path)
         
-        if not customers.exists():
-            logger.warning("Insufficient customer data for baseline model")
+        self.model_version = version
+        self._prune_model_versions()
+        logger.info(f"Saved anomaly model version {version} ({self.n_samples} samples)")
+        return metadata
+    
+    def load_model(self):
+        """Load the current persisted model version if it differs from ours"""
+        pointer_path = self.model_dir / MODEL_POINTER
+        if not pointer_path.exists():
             return False
         
-        # Extract features for all customers
-        feature_data = []
-        for customer in customers:
-            features = self.extract_behavioral_features(customer, days_back=30)
-            feature_data.append(list(features.values()))
+        with open(pointer_path) as pointer_file:
+            metadata = json.load(pointer_file)
+        if metadata['version'] == self.model_version:
+            return True
         
-        if not feature_data:
-            logger.warning("No feature data extracted")
+        artifact = joblib.load(self.model_dir / metadata['path'])
+        if artifact['feature_names'] != FEATURE_NAMES:
+            logger.error(f"Anomaly model {metadata['version']} was trained on different features; ignoring")
             return False
         
-        # Convert to numpy array and fit model
-        X = np.array(feature_data)
-        X_scaled = self.scaler.fit_transform(X)
-        self.isolation_forest.fit(X_scaled)
-        self.is_fitted = True
+        with self._model_lock:
+            self.scaler = artifact['scaler']
+            self.isolation_forest = artifact['isolation_forest']
+            self.model_version = artifact['version']
+            self.fitted_at = datetime.fromisoformat(artifact['fitted_at'])
+            self.n_samples = artifact['n_samples']
+            self.is_fitted = True
         
-        logger.info(f"Baseline model built with {len(feature_data)} customer samples")
+        logger.info(f"Loaded anomaly model version {self.model_version} fitted at {self.fitted_at}")
         return True
     
+    def refresh_model(self, force=False):
+        """
+        Hot-reload the persisted model when a newer version is published,
+        checking at most every MODEL_CHECK_INTERVAL seconds; never fits
+        """
+        now = time.monotonic()
+        if not force and self._last_model_check is not None and now - self._last_model_check < MODEL_CHECK_INTERVAL:
+            return self.is_fitted
+        self._last_model_check = now
+        
+        try:
+            self.load_model()
+        except Exception as e:
+            logger.error(f"Error loading anomaly model: {e}")
+        return self.is_fitted
+    
+    def _prune_model_versions(self):
+        artifacts = sorted(self.model_dir.glob('anomaly-model-*.joblib'))
+        for stale in artifacts[:-KEEP_MODEL_VERSIONS]:
+            stale.unlink(missing_ok=True)
+    
+    def score_matrix(self, customer_ids, X, days_back=7):
+        """
+        Anomaly scores for feature rows, negative for outliers (the
+        IsolationForest decision_function); callers refresh_model() first
+        """
+        with self._model_lock:
+            scaler, isolation_forest = self.scaler, self.isolation_forest
+        return isolation_forest.decision_function(scaler.transform(X))
+    
     def detect_anomaly(self, customer, alert_threshold=-0.5):
         """Detect anomalies in customer behavior"""
-        if not self.is_fitted:
-            logger.warning("Anomaly detector not fitted. Building baseline model...")
-            if not self.build_baseline_model():
-                return None
+        if not self.refresh_model():
+            logger.warning("No trained anomaly model available. Run the train_anomaly_model task.")
+            return None
         
         # Extract current features
         features = self.extract_behavioral_features(customer)
-        feature_vector = np.array([list(features.values())])
+        feature_vector = np.array([[features[name] for name in FEATURE_NAMES]])
         
-        # Scale features
+        # Get anomaly score; predict() labels exactly the negative scores as
+        # outliers, so derive the flag instead of running the forest twice
         try:
-            feature_vector_scaled = self.scaler.transform(feature_vector)
+            anomaly_score = float(self.score_matrix([customer.id], feature_vector)[0])
         except Exception as e:
-            logger.error(f"Error scaling features: {e}")
+            logger.error(f"Error scoring features: {e}")
             return None
-        
-        # Get anomaly score
-        anomaly_score = self.isolation_forest.decision_function(feature_vector_scaled)[0]
-        is_anomaly = self.isolation_forest.predict(feature_vector_scaled)[0] == -1
+        is_anomaly = anomaly_score < 0
         
         # Get baseline for comparison
         baseline = self._get_customer_baseline(customer)
+        anomaly_details = self._analyze_anomaly_details(features, baseline)
         
         result = {
             'customer': customer,
@@ -178,66 +371,147 @@ class CustomerAnomalyDetector:
             'is_anomaly': is_anomaly,
             'features': features,
             'baseline': baseline,
-            'anomaly_details': self._analyze_anomaly_details(features, baseline)
+            'anomaly_details': anomaly_details,
+            'incident_suppressed': self._incident_suppressed(anomaly_details, platform_monitor.suppressed_alert_types())
         }
         
-        # Create alert if anomaly detected and score below threshold
-        if is_anomaly and anomaly_score < alert_threshold:
+        # Create alert if anomaly detected and score below threshold, unless
+        # an active platform incident already explains it
+        if is_anomaly and anomaly_score < alert_threshold and not result['incident_suppressed']:
             self._create_anomaly_alert(result)
         
         return result
     
+    def detect_anomalies_batch(self, customer_ids, alert_threshold=-0.5, days_back=7):
+        """
+        Score many customers at once: one feature matrix and one
+        score_matrix call, with alerts written in a single bulk insert.
+        Returns None when no model is available.
+        """
+        if not self.refresh_model():
+            logger.warning("No trained anomaly model available. Run the train_anomaly_model task.")
+            return None
+        
+        customer_ids, X = build_feature_matrix(customer_ids, days_back=days_back)
+        if not len(customer_ids):
+            return {'processed_count': 0, 'anomalies': [], 'alerts_created': 0}
+        
+        scores = self.score_matrix(customer_ids, X, days_back=days_back)
+        anomalous = np.flatnonzero(scores < 0)
+        
+        customers = Customer.objects.select_related('baseline').in_bulk(customer_ids[anomalous].tolist())
+        suppressed_types = platform_monitor.suppressed_alert_types()
+        results = []
+        for index in anomalous:
+            customer = customers.get(int(customer_ids[index]))
+            if customer is None:
+                continue
+            features = dict(zip(FEATURE_NAMES, X[index].tolist()))
+            baseline = self._get_customer_baseline(customer)
+            anomaly_details = self._analyze_anomaly_details(features, baseline, days_back)
+            results.append({
+                'customer': customer,
+                'anomaly_score': float(scores[index]),
+                'is_anomaly': True,
+                'features': features,
+                'baseline': baseline,
+                'anomaly_details': anomaly_details,
+                'incident_suppressed': self._incident_suppressed(anomaly_details, suppressed_types)
+            })
+        
+        alerts = [
+            self._build_anomaly_alert(result)
+            for result in results
+            if result['anomaly_score'] < alert_threshold and not result['incident_suppressed']
+        ]
+        created = self._bulk_create_alerts(alerts)
+        
+        return {
+            'processed_count': len(customer_ids),
+            'anomalies': results,
+            'alerts_created': len(created)
+        }
+    
     def _get_customer_baseline(self, customer):
         """Get customer's behavioral baseline"""
+        from .baselines import baseline_to_dict
+        
         try:
-            baseline = customer.baseline
-            return {
-                'avg_logins_per_day': baseline.avg_logins_per_day,
-                'avg_purchases_per_week': baseline.avg_purchases_per_week,
-                'avg_session_duration': baseline.avg_session_duration,
-                'avg_page_views_per_session': baseline.avg_page_views_per_session,
-            }
+            return baseline_to_dict(customer.baseline)
         except CustomerBehaviorBaseline.DoesNotExist:
             return self._calculate_baseline(customer)
     
     def _calculate_baseline(self, customer, days_back=30):
-        """Calculate baseline behavior for customer"""
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days_back)
+        """Seed a customer's baseline by replaying their last days_back closed days"""
+        from .baselines import seed_baseline, baseline_to_dict
         
-        events = CustomerEvent.objects.filter(
-            customer=customer,
-            timestamp__gte=start_date,
-            timestamp__lte=end_date
-        )
+        return baseline_to_dict(seed_baseline(customer, days_back=days_back))
+    
+    def _analyze_anomaly_details(self, current_features, baseline, days_back=7):
+        """Analyze which specific behaviors are anomalous"""
+        if baseline.get('quantiles'):
+            return self._analyze_against_quantiles(current_features, baseline['quantiles'], days_back)
+        return self._analyze_against_ratios(current_features, baseline)
+    
+    def _analyze_against_quantiles(self, current_features, quantiles, days_back):
+        """
+        Compare the window's daily rates with the customer's own P5/P95 of
+        each daily metric, so naturally bursty customers are judged against
+        their usual spread instead of fixed ratios to the mean
+        """
+        anomalies = []
         
-        # Calculate baseline metrics
-        login_events = events.filter(event_type='login')
-        purchase_events = events.filter(event_type='purchase')
+        def daily_rate(feature):
+            return current_features[feature] / days_back
         
-        baseline = {
-            'avg_logins_per_day': login_events.count() / days_back,
-            'avg_purchases_per_week': (purchase_events.count() / days_back) * 7,
-            'avg_session_duration': 30.0,  # Default
-            'avg_page_views_per_session': 5.0,  # Default
-        }
+        # Check login frequency
+        login_p5, _ = quantiles['logins']
+        if daily_rate('login_frequency') < login_p5:
+            anomalies.append({
+                'type': 'login_drop',
+                'description': f"Daily logins {daily_rate('login_frequency'):.2f} below the customer's 5th percentile {login_p5:.2f}",
+                'severity': 'high' if current_features['login_frequency'] == 0 else 'medium',
+                'current_value': current_features['login_frequency'],
+                'baseline_value': login_p5 * days_back
+            })
         
-        # Save baseline to database
-        baseline_obj, created = CustomerBehaviorBaseline.objects.get_or_create(
-            customer=customer,
-            defaults=baseline
-        )
+        # Check purchase frequency
+        purchase_p5, _ = quantiles['purchases']
+        if daily_rate('purchase_frequency') < purchase_p5:
+            anomalies.append({
+                'type': 'purchase_drop',
+                'description': f"Daily purchases {daily_rate('purchase_frequency'):.2f} below the customer's 5th percentile {purchase_p5:.2f}",
+                'severity': 'critical' if current_features['purchase_frequency'] == 0 else 'high',
+                'current_value': current_features['purchase_frequency'],
+                'baseline_value': purchase_p5 * days_back
+            })
         
-        if not created:
-            # Update existing baseline
-            for key, value in baseline.items():
-                setattr(baseline_obj, key, value)
-            baseline_obj.save()
+        # Check problem frequency
+        _, problem_p95 = quantiles['problems']
+        if current_features['problem_frequency'] > 2 and daily_rate('problem_frequency') > problem_p95:
+            anomalies.append({
+                'type': 'problem_spike',
+                'description': f"Unusual number of problems: {current_features['problem_frequency']} events",
+                'severity': 'high',
+                'current_value': current_features['problem_frequency'],
+                'baseline_value': problem_p95 * days_back
+            })
+        
+        # Check cart abandonment
+        _, abandon_p95 = quantiles['cart_abandons']
+        if current_features['cart_abandon_frequency'] > 3 and daily_rate('cart_abandon_frequency') > abandon_p95:
+            anomalies.append({
+                'type': 'cart_abandon_spike',
+                'description': f"High cart abandonment: {current_features['cart_abandon_frequency']} events",
+                'severity': 'medium',
+                'current_value': current_features['cart_abandon_frequency'],
+                'baseline_value': abandon_p95 * days_back
+            })
         
-        return baseline
+        return anomalies
     
-    def _analyze_anomaly_details(self, current_features, baseline):
-        """Analyze which specific behaviors are anomalous"""
+    def _analyze_against_ratios(self, current_features, baseline):
+        """Fixed-ratio checks for customers without enough history for quantiles"""
         anomalies = []
         
         # Check login frequency
@@ -286,9 +560,12 @@ class CustomerAnomalyDetector:
         
         return anomalies
     
-    def _create_anomaly_alert(self, anomaly_result):
-        """Create anomaly alert in database"""
-        customer = anomaly_result['customer']
+    def _incident_suppressed(self, anomaly_details, suppressed_types):
+        """True when every anomalous behavior is of a type covered by an active platform incident"""
+        return bool(anomaly_details) and all(detail['type'] in suppressed_types for detail in anomaly_details)
+    
+    def _build_anomaly_alert(self, anomaly_result):
+        """Build an unsaved anomaly alert for a detection result"""
         anomaly_details = anomaly_result['anomaly_details']
         
         # Determine primary anomaly type and severity
@@ -306,20 +583,8 @@ class CustomerAnomalyDetector:
             baseline_value = None
             current_value = None
         
-        # Check if similar alert exists recently
-        recent_alerts = AnomalyAlert.objects.filter(
-            customer=customer,
-            alert_type=alert_type,
-            detected_at__gte=timezone.now() - timedelta(hours=6)
-        )
-        
-        if recent_alerts.exists():
-            logger.info(f"Similar alert already exists for {customer.name}")
-            return None
-        
-        # Create new alert
-        alert = AnomalyAlert.objects.create(
-            customer=customer,
+        return AnomalyAlert(
+            customer=anomaly_result['customer'],
             alert_type=alert_type,
             severity=severity,
             description=description,
@@ -327,9 +592,56 @@ class CustomerAnomalyDetector:
             baseline_value=baseline_value,
             current_value=current_value
         )
+    
+    def _create_anomaly_alert(self, anomaly_result):
+        """Create anomaly alert in database"""
+        alert = self._build_anomaly_alert(anomaly_result)
+        customer = alert.customer
+        
+        # Atomically claim the (customer, type) pair; a recent alert holds it
+        if not alert_dedup.claim(customer.id, alert.alert_type):
+            logger.info(f"Similar alert already exists for {customer.name}")
+            return None
+        
+        # Create new alert
+        try:
+            alert.save()
+        except Exception:
+            alert_dedup.release(customer.id, alert.alert_type)
+            raise
         
         logger.info(f"Created anomaly alert: {alert}")
         return alert
+    
+    def _bulk_create_alerts(self, alerts):
+        """Insert alerts in bulk, skipping (customer, type) pairs alerted within the dedup window"""
+        new_alerts = [alert for alert in alerts if alert_dedup.claim(alert.customer_id, alert.alert_type)]
+        if not new_alerts:
+            return []
+        
+        try:
+            created = AnomalyAlert.objects.bulk_create(new_alerts)
+        except Exception:
+            for alert in new_alerts:
+                alert_dedup.release(alert.customer_id, alert.alert_type)
+            raise
+        
+        # bulk_create skips post_save, so invalidate cached listings here
+        bump_table_version('alerts')
+        logger.info(f"Created {len(created)} anomaly alerts in bulk")
+        return created
+
+def fit_and_publish_anomaly_model(customer_sample_size=10000, sampling='stratified'):
+    """Fit a new model offline and publish it for every worker to hot-reload"""
+    detector = CustomerAnomalyDetector()
+    if not detector.build_baseline_model(customer_sample_size=customer_sample_size, sampling=sampling):
+        return None
+    return detector.save_model()
 
-# Global detector instance
-anomaly_detector = CustomerAnomalyDetector()
+# Global detector instance: the batch-fitted IsolationForest, or the
+# incrementally updated robust z-score detector
+if getattr(settings, 'CHURN_ANOMALY_DETECTOR', 'isolation_forest') == 'streaming':
+    from .streaming_detection import StreamingAnomalyDetector
+    anomaly_detector = StreamingAnomalyDetector()
+else:
+    anomaly_detector = CustomerAnomalyDetector()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ChurnappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'churnapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import queue_metrics  # noqa: F401
@@ -0,0 +1,155 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponseNotAllowed
+from django.utils import timezone
+from functools import wraps
+from datetime import timedelta
+import json
+import logging
+
+from .models import Customer, CustomerEvent, AnomalyAlert, RealTimeWatchlist
+from .utils import predict_with_explainability, RAW_FEATURES
+from .inference import run_inference
+from .views import alert_to_dict, watchlist_entry_to_dict, event_to_dict, customer_alert_to_dict
+try:
+    from .anomaly_detection import anomaly_detector
+    ANOMALY_DETECTOR_AVAILABLE = True
+except ImportError:
+    ANOMALY_DETECTOR_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def async_api_view(methods):
+    """
+    Async counterpart of DRF's api_view for ASGI-native endpoints: restricts
+    methods and exempts the view from CSRF (Django 4.2's csrf_exempt and
+    require_http_methods wrap views in sync functions)
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view_func(request, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@async_api_view(['POST', 'GET'])
+async def predict_view_async(request):
+    if request.method == 'POST':
+        try:
+            input_data = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+        # Validate required fields
+        missing = [col for col in RAW_FEATURES if col not in input_data]
+        if missing:
+            return JsonResponse({"error": f"Missing required fields: {missing}"}, status=400)
+
+        try:
+            result = await run_inference(predict_with_explainability, input_data)
+            return JsonResponse(result, status=200)
+        except Exception as e:
+            return JsonResponse({"error": f"Prediction failed: {str(e)}"}, status=500)
+
+    return JsonResponse({"message": "Use POST to submit data for churn prediction."}, status=200)
+
+
+@async_api_view(['GET'])
+async def get_anomaly_alerts_async(request):
+    """Get recent anomaly alerts"""
+    try:
+        hours_back = int(request.GET.get('hours', 24))
+        limit = int(request.GET.get('limit', 50))
+
+        cutoff_time = timezone.now() - timedelta(hours=hours_back)
+        alerts = AnomalyAlert.objects.filter(
+            detected_at__gte=cutoff_time
+        ).select_related('customer').order_by('-detected_at')[:limit]
+
+        alert_data = [alert_to_dict(alert) async for alert in alerts]
+
+        return JsonResponse({
+            'alerts': alert_data,
+            'count': len(alert_data),
+            'hours_back': hours_back
+        }, status=200)
+
+    except Exception as e:
+        logger.error(f"Error getting alerts: {e}")
+        return JsonResponse({"error": "Failed to get alerts"}, status=500)
+
+
+@async_api_view(['GET'])
+async def get_watchlist_async(request):
+    """Get current real-time watchlist"""
+    try:
+        active_only = request.GET.get('active_only', 'true').lower() == 'true'
+        limit = int(request.GET.get('limit', 50))
+
+        queryset = RealTimeWatchlist.objects.select_related('customer')
+        if active_only:
+            queryset = queryset.filter(is_active=True)
+
+        watchlist_entries = queryset.order_by('-added_at')[:limit]
+        watchlist_data = [watchlist_entry_to_dict(entry) async for entry in watchlist_entries]
+
+        return JsonResponse({
+            'watchlist': watchlist_data,
+            'count': len(watchlist_data),
+            'active_only': active_only
+        }, status=200)
+
+    except Exception as e:
+        logger.error(f"Error getting watchlist: {e}")
+        return JsonResponse({"error": "Failed to get watchlist"}, status=500)
+
+
+@async_api_view(['GET'])
+async def get_customer_behavior_async(request, customer_id):
+    """Get customer behavior analysis and anomaly status"""
+    try:
+        try:
+            customer = await Customer.objects.aget(id=customer_id)
+        except Customer.DoesNotExist:
+            return JsonResponse({"error": "Customer not found"}, status=404)
+
+        days_back = int(request.GET.get('days', 7))
+        cutoff_time = timezone.now() - timedelta(days=days_back)
+
+        recent_events = CustomerEvent.objects.filter(
+            customer=customer,
+            timestamp__gte=cutoff_time
+        ).order_by('-timestamp')[:20]  # Limit to 20 recent events
+        events_data = [event_to_dict(event) async for event in recent_events]
+
+        features = await sync_to_async(anomaly_detector.extract_behavioral_features)(customer, days_back)
+
+        recent_alerts = AnomalyAlert.objects.filter(
+            customer=customer,
+            detected_at__gte=cutoff_time
+        ).order_by('-detected_at')
+        alerts_data = [customer_alert_to_dict(alert) async for alert in recent_alerts]
+
+        on_watchlist = await RealTimeWatchlist.objects.filter(
+            customer=customer,
+            is_active=True
+        ).aexists()
+
+        return JsonResponse({
+            'customer_id': customer_id,
+            'customer_name': customer.name,
+            'behavioral_features': features,
+            'recent_events': events_data,
+            'recent_alerts': alerts_data,
+            'on_watchlist': on_watchlist,
+            'analysis_period_days': days_back,
+            'timestamp': timezone.now().isoformat()
+        }, status=200)
+
+    except Exception as e:
+        logger.error(f"Error getting customer behavior: {e}")
+        return JsonResponse({"error": "Failed to get customer behavior"}, status=500)
@@ -0,0 +1,299 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+import math
+
+from django.conf import settings
+from django.db.models import Count, Avg, Min, Max, Q
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+import logging
+
+from .models import Customer, CustomerEvent, CustomerBehaviorBaseline
+from .sessions import sessions_from_events
+from .sketches import MetricSketches
+from .anomaly_detection import ENGAGEMENT_EVENTS, PROBLEM_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Older days fade out of a baseline with this half-life
+HALF_LIFE_DAYS = getattr(settings, 'CHURN_BASELINE_HALF_LIFE_DAYS', 30)
+DECAY_ALPHA = 1 - 0.5 ** (1 / HALF_LIFE_DAYS)
+
+# Customer ids per baseline update task; ranges are independent so they can
+# run on separate workers
+RANGE_SIZE = getattr(settings, 'CHURN_BASELINE_RANGE_SIZE', 50000)
+
+BASELINE_FIELDS = [
+    'avg_logins_per_day', 'std_logins_per_day', 'typical_login_hours',
+    'avg_purchases_per_week', 'std_purchases_per_week', 'avg_purchase_amount',
+    'avg_session_duration', 'std_session_duration',
+    'avg_page_views_per_session', 'avg_searches_per_session',
+    'robust_stats', 'quantile_sketches', 'data_points_count', 'last_observed_date', 'last_updated',
+]
+
+# A customer-day without events
+EMPTY_DAY = {
+    'logins': 0, 'purchases': 0, 'purchase_amount': None, 'page_views': 0, 'searches': 0,
+    'engagement': 0, 'problems': 0, 'cart_abandons': 0,
+    'login_hours': [0] * 24, 'session_minutes': [],
+}
+
+# Days of history before anomaly checks trust a customer's own quantiles
+MIN_SKETCH_DAYS = getattr(settings, 'CHURN_MIN_SKETCH_DAYS', 14)
+
+# Daily counts tracked with a streaming median / MAD for robust z-scores
+ROBUST_METRICS = ['logins', 'purchases', 'engagement', 'problems', 'cart_abandons']
+MAD_FLOOR = 0.5
+
+
+def daily_observation_aggregates():
+    """Conditional aggregates for one customer-day of events"""
+    purchase = Q(event_type='purchase')
+    return {
+        'logins': Count('id', filter=Q(event_type='login')),
+        'purchases': Count('id', filter=purchase),
+        'purchase_amount': Avg('amount', filter=purchase),
+        'page_views': Count('id', filter=Q(event_type='page_view')),
+        'searches': Count('id', filter=Q(event_type='search')),
+        'engagement': Count('id', filter=Q(event_type__in=ENGAGEMENT_EVENTS)),
+        'problems': Count('id', filter=Q(event_type__in=PROBLEM_EVENTS)),
+        'cart_abandons': Count('id', filter=Q(event_type='cart_abandon')),
+    }
+
+
+def daily_observations(events):
+    """
+    Per customer-day observations for an event queryset, keyed by
+    (customer_id, date): one grouped aggregate, one grouped login-hour
+    histogram and one vectorized login/logout pairing
+    """
+    observations = {}
+    for row in events.values('customer_id', day=TruncDate('timestamp')).annotate(
+        **daily_observation_aggregates()
+    ).order_by():
+        key = (row.pop('customer_id'), row.pop('day'))
+        observations[key] = {**row, 'login_hours': [0] * 24, 'session_minutes': []}
+
+    for customer_id, day, hour, count in events.filter(event_type='login').values_list(
+        'customer_id', TruncDate('timestamp'), ExtractHour('timestamp')
+    ).annotate(count=Count('id')).order_by():
+        observations[(customer_id, day)]['login_hours'][hour] = count
+
+    # Sessions count towards the day they started on
+    sessions = sessions_from_events(events)
+    for customer_id, started_at, minutes in zip(
+        sessions.customer_ids.tolist(), sessions.started_at.tolist(), sessions.minutes.tolist()
+    ):
+        day = timezone.localtime(datetime.fromtimestamp(started_at, tz=dt_timezone.utc)).date()
+        observations[(customer_id, day)]['session_minutes'].append(minutes)
+
+    return observations
+
+
+def _weighted_update(mean, std, value, weight):
+    """
+    One step of the incremental weighted mean/variance recurrence. With
+    weight=1/n this is Welford's algorithm; with a constant weight it is an
+    exponentially decayed mean and variance.
+    """
+    diff = value - mean
+    increment = weight * diff
+    variance = (1 - weight) * (std ** 2 + diff * increment)
+    return mean + increment, math.sqrt(max(variance, 0.0))
+
+
+def update_robust_stats(stats, observation, weight):
+    """
+    Streaming median and median absolute deviation per daily metric, stored
+    as {metric: [median, mad]}. The median moves by a MAD-scaled step
+    towards each observation, so a single extreme day shifts it by at most
+    one step.
+    """
+    updated = {}
+    for metric in ROBUST_METRICS:
+        value = observation[metric]
+        if metric not in stats:
+            updated[metric] = [float(value), 0.0]
+            continue
+        median, mad = stats[metric]
+        step = weight * max(mad, MAD_FLOOR)
+        median += step if value > median else -step if value < median else 0.0
+        mad += weight * (abs(value - median) - mad)
+        updated[metric] = [round(median, 4), round(mad, 4)]
+    return updated
+
+
+def fold_day(baseline, day, observation):
+    """Fold one closed day into a baseline in place; O(1) per customer"""
+    n = baseline.data_points_count + 1
+    # Exact running mean for the first days, exponential decay afterwards
+    weight = max(1 / n, DECAY_ALPHA)
+
+    baseline.avg_logins_per_day, baseline.std_logins_per_day = _weighted_update(
+        baseline.avg_logins_per_day, baseline.std_logins_per_day, observation['logins'], weight
+    )
+
+    # Purchases are tracked per day and stored per week (sum of 7 days)
+    mean, std = _weighted_update(
+        baseline.avg_purchases_per_week / 7, baseline.std_purchases_per_week / math.sqrt(7),
+        observation['purchases'], weight
+    )
+    baseline.avg_purchases_per_week, baseline.std_purchases_per_week = mean * 7, std * math.sqrt(7)
+
+    hours = baseline.typical_login_hours if len(baseline.typical_login_hours or []) == 24 else [0.0] * 24
+    baseline.typical_login_hours = [
+        round((1 - weight) * old + weight * new, 4)
+        for old, new in zip(hours, observation['login_hours'])
+    ]
+
+    # Amount and session metrics only move on days that observed them; the
+    # first observation replaces the model default outright
+    if observation['purchase_amount'] is not None:
+        first = baseline.avg_purchase_amount == 0
+        baseline.avg_purchase_amount, _ = _weighted_update(
+            baseline.avg_purchase_amount, 0.0, observation['purchase_amount'], 1.0 if first else weight
+        )
+
+    sessions = observation['session_minutes']
+    if sessions:
+        first = baseline.avg_session_duration == 0 and baseline.std_session_duration == 0
+        baseline.avg_session_duration, baseline.std_session_duration = _weighted_update(
+            baseline.avg_session_duration, baseline.std_session_duration,
+            sum(sessions) / len(sessions), 1.0 if first else weight
+        )
+
+    session_count = len(sessions) or observation['logins']
+    if session_count:
+        first = baseline.avg_page_views_per_session == 0 and baseline.avg_searches_per_session == 0
+        step = 1.0 if first else weight
+        baseline.avg_page_views_per_session, _ = _weighted_update(
+            baseline.avg_page_views_per_session, 0.0, observation['page_views'] / session_count, step
+        )
+        baseline.avg_searches_per_session, _ = _weighted_update(
+            baseline.avg_searches_per_session, 0.0, observation['searches'] / session_count, step
+        )
+
+    baseline.robust_stats = update_robust_stats(baseline.robust_stats or {}, observation, weight)
+    
+    sketches = MetricSketches.from_bytes(baseline.quantile_sketches)
+    sketches.add(observation)
+    baseline.quantile_sketches = sketches.to_bytes()
+    
+    baseline.data_points_count = n
+    baseline.last_observed_date = day
+    baseline.last_updated = timezone.now()
+    return baseline
+
+
+def baseline_to_dict(baseline):
+    sketches = MetricSketches.from_bytes(baseline.quantile_sketches)
+    return {
+        # Per-customer daily p5/p95, once enough days back them up
+        'quantiles': sketches.quantiles() if sketches.count >= MIN_SKETCH_DAYS else None,
+        'avg_logins_per_day': baseline.avg_logins_per_day,
+        'std_logins_per_day': baseline.std_logins_per_day,
+        'typical_login_hours': baseline.typical_login_hours,
+        'avg_purchases_per_week': baseline.avg_purchases_per_week,
+        'std_purchases_per_week': baseline.std_purchases_per_week,
+        'avg_purchase_amount': baseline.avg_purchase_amount,
+        'avg_session_duration': baseline.avg_session_duration,
+        'std_session_duration': baseline.std_session_duration,
+        'avg_page_views_per_session': baseline.avg_page_views_per_session,
+        'avg_searches_per_session': baseline.avg_searches_per_session,
+        'data_points_count': baseline.data_points_count,
+    }
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def seed_baseline(customer, days_back=30):
+    """Build a customer's baseline from scratch by folding their last days_back closed days"""
+    today = timezone.localdate()
+    start, _ = _day_bounds(today - timedelta(days=days_back))
+    end, _ = _day_bounds(today)
+    observations = daily_observations(
+        CustomerEvent.objects.filter(customer=customer, timestamp__gte=start, timestamp__lt=end)
+    )
+
+    baseline = CustomerBehaviorBaseline(customer=customer)
+    for offset in range(days_back, 0, -1):
+        day = today - timedelta(days=offset)
+        fold_day(baseline, day, observations.get((customer.id, day), EMPTY_DAY))
+
+    _upsert_baselines([baseline])
+    return baseline
+
+
+def _upsert_baselines(baselines):
+    """Insert or update baselines in one statement, keyed on customer"""
+    return CustomerBehaviorBaseline.objects.bulk_create(
+        baselines,
+        update_conflicts=True,
+        unique_fields=['customer'],
+        update_fields=BASELINE_FIELDS,
+    )
+
+
+def customer_id_ranges(range_size=RANGE_SIZE):
+    """Half-open [start, end) customer id ranges covering every customer"""
+    bounds = Customer.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    return [
+        (start, min(start + range_size, bounds['high'] + 1))
+        for start in range(bounds['low'], bounds['high'] + 1, range_size)
+    ]
+
+
+def roll_baseline_range(day, start_id, end_id, chunk_size=5000):
+    """
+    Fold a closed day into the baselines of customers with ids in
+    [start_id, end_id): customers are streamed in id chunks, each chunk
+    costs one baseline read, one grouped observation query per kind and a
+    single upsert. Baselines that already saw the day are left alone.
+    """
+    day_start, day_end = _day_bounds(day)
+    customer_ids = Customer.objects.filter(
+        id__gte=start_id, id__lt=end_id
+    ).order_by('id').values_list('id', flat=True)
+
+    updated_count = 0
+    for offset in range(0, end_id - start_id, chunk_size):
+        chunk_ids = list(customer_ids.filter(id__gte=start_id + offset, id__lt=min(start_id + offset + chunk_size, end_id)))
+        if not chunk_ids:
+            continue
+
+        existing = {
+            baseline.customer_id: baseline
+            for baseline in CustomerBehaviorBaseline.objects.filter(customer_id__in=chunk_ids)
+        }
+        observations = daily_observations(CustomerEvent.objects.filter(
+            customer_id__gte=chunk_ids[0], customer_id__lte=chunk_ids[-1],
+            timestamp__gte=day_start, timestamp__lt=day_end
+        ))
+
+        pending = []
+        for customer_id in chunk_ids:
+            baseline = existing.get(customer_id) or CustomerBehaviorBaseline(customer_id=customer_id)
+            if baseline.last_observed_date is not None and baseline.last_observed_date >= day:
+                continue
+            pending.append(fold_day(baseline, day, observations.get((customer_id, day), EMPTY_DAY)))
+
+        if pending:
+            _upsert_baselines(pending)
+            updated_count += len(pending)
+
+    return updated_count
+
+
+def roll_baselines(day=None, range_size=RANGE_SIZE, chunk_size=5000):
+    """Fold a closed day (default: yesterday) into every customer's baseline"""
+    day = day or timezone.localdate() - timedelta(days=1)
+    updated_count = sum(
+        roll_baseline_range(day, start_id, end_id, chunk_size)
+        for start_id, end_id in customer_id_ranges(range_size)
+    )
+    logger.info(f"Folded {day} into {updated_count} customer baselines")
+    return updated_count
@@ -0,0 +1,326 @@
+import time
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import logging
+
+from .models import CustomerEvent
+from .caching import acquire_locks, release_locks
+from .anomaly_detection import ENGAGEMENT_EVENTS, PROBLEM_EVENTS, features_from_aggregates
+from .sessions import MAX_SESSION_MINUTES
+
+logger = logging.getLogger(__name__)
+
+# Serve extract_behavioral_features from the counters instead of SQL
+COUNTERS_ENABLED = getattr(settings, 'CHURN_BEHAVIOR_COUNTERS', False)
+
+WINDOW_DAYS = (1, 7, 30)
+HOURS = max(WINDOW_DAYS) * 24  # longest window served, in hours
+HOURLY_ROWS = 24
+DAILY_ROWS = max(WINDOW_DAYS)
+COUNTER_KEY = 'churnapp:behavior_counters:v2:{}'
+LOCK_KEY = 'churnapp:behavior_counters:lock:{}'
+LOCK_TTL = 5
+LOCK_WAIT_SECONDS = 0.5  # longest a batch waits for another worker's update
+
+LATE_NIGHT_HOURS = {23, 0, 1, 2, 3, 4}
+
+# Per-row event counts (uint32) and sums (float32). Hour-of-day only enters
+# the features through the login hour sum and the late-night count, so daily
+# rows carry those as channels; a row's weekday is known from its day
+COUNT_CHANNELS = [
+    'total', 'login', 'logout', 'purchase', 'amount_count', 'engagement', 'problem',
+    'cart_abandon', 'session_count', 'late_night', 'login_hour_sum',
+]
+SUM_CHANNELS = ['amount_sum', 'session_minutes']
+COUNT = {name: index for index, name in enumerate(COUNT_CHANNELS)}
+SUM = {name: index for index, name in enumerate(SUM_CHANNELS)}
+EVENT_CHANNEL = {
+    'login': 'login',
+    'logout': 'logout',
+    'purchase': 'purchase',
+    'cart_abandon': 'cart_abandon',
+    **{event_type: 'engagement' for event_type in ENGAGEMENT_EVENTS},
+    **{event_type: 'problem' for event_type in PROBLEM_EVENTS},
+}
+
+
+def _absolute_hour(epoch_seconds):
+    return int(epoch_seconds // 3600)
+
+
+def _event_time(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = parse_datetime(timestamp)
+    return (timestamp or timezone.now()).timestamp()
+
+
+def _amount(metadata):
+    try:
+        return float(metadata['amount'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _weekday(day):
+    return (day + 3) % 7  # 1970-01-01 was a Thursday; Monday=0
+
+
+def _newest_day(head_hour):
+    """Latest day whose hours have (partly) left the hourly ring"""
+    return (head_hour - HOURLY_ROWS) // 24
+
+
+class CustomerCounters:
+    """
+    Rolling per-customer behavior counters: a ring of the last 24 hourly
+    rows and a ring of 30 daily rows (about 2.6 KB), plus the open login
+    used to pair sessions as events arrive. Hours leaving the hourly ring
+    are folded into their day's row, so the 1-day window is exact to the
+    hour and longer windows extend back to whole UTC days. Reads cost
+    O(rows), independent of how many events occurred.
+    """
+
+    def __init__(self, head_hour=None, open_login=None, hourly=None, daily=None):
+        self.head_hour = head_hour
+        self.open_login = open_login
+        self.hourly = hourly if hourly is not None else self._empty(HOURLY_ROWS)
+        self.daily = daily if daily is not None else self._empty(DAILY_ROWS)
+
+    @staticmethod
+    def _empty(rows):
+        return (np.zeros((rows, len(COUNT_CHANNELS)), dtype=np.uint32),
+                np.zeros((rows, len(SUM_CHANNELS)), dtype=np.float32))
+
+    @classmethod
+    def from_state(cls, state):
+        def ring(counts, sums, rows):
+            return (np.frombuffer(counts, dtype=np.uint32).reshape(rows, len(COUNT_CHANNELS)).copy(),
+                    np.frombuffer(sums, dtype=np.float32).reshape(rows, len(SUM_CHANNELS)).copy())
+
+        return cls(
+            state['head_hour'], state['open_login'],
+            ring(state['hourly_counts'], state['hourly_sums'], HOURLY_ROWS),
+            ring(state['daily_counts'], state['daily_sums'], DAILY_ROWS),
+        )
+
+    def to_state(self):
+        return {
+            'head_hour': self.head_hour,
+            'open_login': self.open_login,
+            'hourly_counts': self.hourly[0].tobytes(),
+            'hourly_sums': self.hourly[1].tobytes(),
+            'daily_counts': self.daily[0].tobytes(),
+            'daily_sums': self.daily[1].tobytes(),
+        }
+
+    def copy(self):
+        return CustomerCounters(
+            self.head_hour, self.open_login,
+            tuple(array.copy() for array in self.hourly), tuple(array.copy() for array in self.daily),
+        )
+
+    def _advance(self, hour):
+        """Move the ring heads forward, folding hours that leave the hourly ring into their day"""
+        if self.head_hour is None:
+            self.head_hour = hour
+            return
+        if hour <= self.head_hour:
+            return
+
+        # Days entering the daily window hold rows of days that left it
+        newest_day, last_day = _newest_day(self.head_hour), _newest_day(hour)
+        for day in range(max(newest_day + 1, last_day - DAILY_ROWS + 1), last_day + 1):
+            self.daily[0][day % DAILY_ROWS] = 0
+            self.daily[1][day % DAILY_ROWS] = 0
+
+        for stale in range(self.head_hour - HOURLY_ROWS + 1, min(self.head_hour, hour - HOURLY_ROWS) + 1):
+            index, day = stale % HOURLY_ROWS, stale // 24
+            if day > last_day - DAILY_ROWS:
+                self.daily[0][day % DAILY_ROWS] += self.hourly[0][index]
+                self.daily[1][day % DAILY_ROWS] += self.hourly[1][index]
+            self.hourly[0][index] = 0
+            self.hourly[1][index] = 0
+        self.head_hour = hour
+
+    def record(self, event_type, epoch_seconds, metadata=None):
+        hour = _absolute_hour(epoch_seconds)
+        self._advance(hour)
+        if hour > self.head_hour - HOURLY_ROWS:
+            counts, sums, index = self.hourly[0], self.hourly[1], hour % HOURLY_ROWS
+        elif hour // 24 > _newest_day(self.head_hour) - DAILY_ROWS:
+            counts, sums, index = self.daily[0], self.daily[1], (hour // 24) % DAILY_ROWS
+        else:
+            return  # older than the longest window
+
+        counts[index, COUNT['total']] += 1
+        if hour % 24 in LATE_NIGHT_HOURS:
+            counts[index, COUNT['late_night']] += 1
+        channel = EVENT_CHANNEL.get(event_type)
+        if channel:
+            counts[index, COUNT[channel]] += 1
+
+        if event_type == 'purchase':
+            amount = _amount(metadata or {})
+            if amount is not None:
+                sums[index, SUM['amount_sum']] += amount
+                counts[index, COUNT['amount_count']] += 1
+        elif event_type == 'login':
+            counts[index, COUNT['login_hour_sum']] += hour % 24
+            self.open_login = epoch_seconds
+        elif event_type == 'logout' and self.open_login is not None:
+            # Same rule as sessions.pair_sessions: overlong pairs are unterminated
+            if epoch_seconds - self.open_login <= MAX_SESSION_MINUTES * 60:
+                sums[index, SUM['session_minutes']] += (epoch_seconds - self.open_login) / 60
+                counts[index, COUNT['session_count']] += 1
+            self.open_login = None
+
+    def features(self, days_back=7, now=None):
+        """
+        Behavioral feature dict for the last days_back days: the hourly ring
+        covers the last day, daily rows the whole UTC days before it
+        """
+        if days_back * 24 > HOURS:
+            raise ValueError(f"Counters only cover {max(WINDOW_DAYS)} days")
+
+        now_hour = _absolute_hour((now or timezone.now()).timestamp())
+        counters = self
+        if self.head_hour is not None and now_hour > self.head_hour:
+            counters = self.copy()
+            counters._advance(now_hour)  # fold hours that aged out of the last day
+
+        hours = np.arange(now_hour - min(days_back * 24, HOURLY_ROWS) + 1, now_hour + 1)
+        days = np.arange((now_hour - days_back * 24 + 1) // 24, _newest_day(now_hour) + 1)
+        if days_back * 24 <= HOURLY_ROWS:
+            days = days[:0]
+        if counters.head_hour is not None:
+            head = counters.head_hour
+            hours = hours[(hours <= head) & (hours > head - HOURLY_ROWS)]
+            days = days[(days <= _newest_day(head)) & (days > _newest_day(head) - DAILY_ROWS)]
+        else:
+            hours, days = hours[:0], days[:0]
+
+        counts = np.vstack([counters.hourly[0][hours % HOURLY_ROWS], counters.daily[0][days % DAILY_ROWS]]).astype(np.int64)
+        sums = np.vstack([counters.hourly[1][hours % HOURLY_ROWS], counters.daily[1][days % DAILY_ROWS]]).astype(np.float64)
+        column = {name: counts[:, index] for name, index in COUNT.items()}
+        column.update({name: sums[:, index] for name, index in SUM.items()})
+
+        weekday = _weekday(np.concatenate([hours // 24, days]))
+        logins = column['login'].sum()
+        amount_count = column['amount_count'].sum()
+        session_count = column['session_count'].sum()
+
+        stats = {
+            'login_count': int(logins),
+            'avg_login_hour': float(column['login_hour_sum'].sum() / logins) if logins else None,
+            'purchase_count': int(column['purchase'].sum()),
+            'avg_purchase_amount': float(column['amount_sum'].sum() / amount_count) if amount_count else None,
+            'logout_count': int(column['logout'].sum()),
+            'engagement_count': int(column['engagement'].sum()),
+            'problem_count': int(column['problem'].sum()),
+            'cart_abandon_count': int(column['cart_abandon'].sum()),
+            'weekend_count': int(column['total'][weekday >= 5].sum()),
+            'late_night_count': int(column['late_night'].sum()),
+            'total_count': int(column['total'].sum()),
+        }
+        avg_session = float(column['session_minutes'].sum() / session_count) if session_count else 30.0
+        return features_from_aggregates(stats, avg_session)
+
+
+class BehaviorCounterStore:
+    """Counters kept in the Django cache (Redis in production), one key per customer"""
+
+    def get(self, customer_id):
+        state = cache.get(COUNTER_KEY.format(customer_id))
+        return CustomerCounters.from_state(state) if state else None
+
+    def record_events(self, events):
+        """
+        Apply a batch of ingested (already committed) events ({customer_id,
+        event_type, metadata, timestamp}); one cache read and write per
+        customer, under a short per-customer lock so concurrent workers do
+        not overwrite each other's counts. A customer without counters is
+        seeded from its events in the window, which include this batch.
+        Customers still locked after LOCK_WAIT_SECONDS are skipped and left
+        to reconcile_behavior_counters.
+        """
+        ordered = sorted(
+            ((event['customer_id'], _event_time(event.get('timestamp')), event['event_type'], event.get('metadata'))
+             for event in events),
+            key=itemgetter(0, 1)
+        )
+        pending = {customer_id: list(rows) for customer_id, rows in groupby(ordered, key=itemgetter(0))}
+
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while pending:
+            locked, token, acquired_at = acquire_locks([LOCK_KEY.format(customer_id) for customer_id in pending], LOCK_TTL)
+            try:
+                ready = {customer_id: pending.pop(customer_id) for customer_id in list(pending)
+                         if LOCK_KEY.format(customer_id) in locked}
+                if ready:
+                    self._apply(ready)
+            finally:
+                release_locks(locked, token, acquired_at, LOCK_TTL)
+            if pending:
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Behavior counters busy, skipping {len(pending)} customers until reconciliation")
+                    return
+                time.sleep(0.01)
+
+    def _apply(self, rows_by_customer):
+        keys = {customer_id: COUNTER_KEY.format(customer_id) for customer_id in rows_by_customer}
+        states = cache.get_many(keys.values())
+
+        missing = [customer_id for customer_id, key in keys.items() if key not in states]
+        updated = self._rebuilt_states(missing) if missing else {}
+        for customer_id, rows in rows_by_customer.items():
+            if keys[customer_id] in updated:
+                continue  # seeded from the event table, this batch included
+            counters = CustomerCounters.from_state(states[keys[customer_id]])
+            for _, epoch_seconds, event_type, metadata in rows:
+                counters.record(event_type, epoch_seconds, metadata)
+            updated[keys[customer_id]] = counters.to_state()
+
+        cache.set_many(updated, timeout=None)
+
+    def features(self, customer_id, days_back=7):
+        counters = self.get(customer_id)
+        return counters.features(days_back) if counters else None
+
+    def window_features(self, customer_id):
+        """Feature dicts for every maintained window (1, 7 and 30 days)"""
+        counters = self.get(customer_id)
+        if counters is None:
+            return None
+        return {days: counters.features(days) for days in WINDOW_DAYS}
+
+    def rebuild(self, customer_ids):
+        """Recompute counters for customers from their raw events in the window"""
+        rebuilt = self._rebuilt_states(customer_ids)
+        cache.set_many(rebuilt, timeout=None)
+        return len(rebuilt)
+
+    def _rebuilt_states(self, customer_ids):
+        cutoff = timezone.now() - timedelta(days=max(WINDOW_DAYS))
+        rows = CustomerEvent.objects.filter(
+            customer_id__in=customer_ids,
+            timestamp__gte=cutoff
+        ).order_by('customer_id', 'timestamp').values_list('customer_id', 'event_type', 'timestamp', 'metadata')
+
+        rebuilt = {COUNTER_KEY.format(customer_id): CustomerCounters().to_state() for customer_id in customer_ids}
+        for customer_id, events in groupby(rows.iterator(chunk_size=5000), key=itemgetter(0)):
+            counters = CustomerCounters()
+            for _, event_type, timestamp, metadata in events:
+                counters.record(event_type, timestamp.timestamp(), metadata)
+            rebuilt[COUNTER_KEY.format(customer_id)] = counters.to_state()
+        return rebuilt
+
+
+# Global counter store
+behavior_counters = BehaviorCounterStore()
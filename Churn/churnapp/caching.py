@@ -0,0 +1,179 @@
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework import status
+from rest_framework.response import Response
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long a cached listing may be served before it is rebuilt, even if no
+# table it depends on has changed (bounds staleness of time-windowed queries)
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'CHURN_RESPONSE_CACHE_TIMEOUT', 60)
+
+TABLE_VERSION_KEY = 'churnapp:table_version:{}'
+RESPONSE_KEY = 'churnapp:response:{}'
+STATS_KEY = 'churnapp:response_cache_stats:{}'
+STAT_NAMES = ('hits', 'misses', 'not_modified', 'queries_saved')
+
+
+def _incr(key, delta=1, timeout=None):
+    """Atomically increment a cache counter, creating it (expiring after timeout) if missing"""
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Key evicted between add() and incr()
+        cache.set(key, delta, timeout)
+        return delta
+
+
+def acquire_locks(lock_keys, ttl):
+    """
+    Take the short cache locks among lock_keys that are free. Returns the
+    keys taken, plus the token and time release_locks needs to delete only
+    locks that are still ours.
+    """
+    token = uuid.uuid4().hex
+    acquired_at = time.monotonic()
+    locked = []
+    try:
+        for lock_key in lock_keys:
+            if cache.add(lock_key, token, ttl):
+                locked.append(lock_key)
+    except Exception as exc:
+        logger.warning(f"Cache unavailable for locking: {exc}")
+    return locked, token, acquired_at
+
+
+def release_locks(locked, token, acquired_at, ttl):
+    """Delete the locks from acquire_locks that this caller still owns"""
+    if not locked:
+        return
+    try:
+        if time.monotonic() - acquired_at >= ttl / 2:
+            # Our locks may have expired and been taken by another worker
+            held = cache.get_many(locked)
+            locked = [lock_key for lock_key in locked if held.get(lock_key) == token]
+        cache.delete_many(locked)
+    except Exception as exc:
+        logger.warning(f"Could not release cache locks: {exc}")
+
+
+def get_table_version(table):
+    """Current change counter for a table"""
+    version = cache.get(TABLE_VERSION_KEY.format(table))
+    if version is None:
+        cache.add(TABLE_VERSION_KEY.format(table), 1, None)
+        version = cache.get(TABLE_VERSION_KEY.format(table), 1)
+    return version
+
+
+def bump_table_version(table):
+    """Invalidate every cached response that depends on a table"""
+    # Model writes must not depend on the cache; a bump missed while it is
+    # down is bounded by RESPONSE_CACHE_TIMEOUT
+    try:
+        return _incr(TABLE_VERSION_KEY.format(table))
+    except Exception as exc:
+        logger.warning(f"Could not bump {table} cache version: {exc}")
+        return None
+
+
+def get_response_cache_stats():
+    """Hit ratio and database queries saved by the listing cache"""
+    stats = {name: cache.get(STATS_KEY.format(name), 0) for name in STAT_NAMES}
+    served = stats['hits'] + stats['not_modified']
+    total = served + stats['misses']
+    stats['hit_ratio'] = round(served / total, 4) if total else 0.0
+    return stats
+
+
+def reset_response_cache_stats():
+    cache.delete_many([STATS_KEY.format(name) for name in STAT_NAMES])
+
+
+def _etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in [tag.strip() for tag in header.split(',')]
+
+
+def _finalize(response, etag):
+    response['ETag'] = etag
+    # Let the browser keep the body but revalidate on every poll
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_listing(*tables):
+    """
+    Serve a GET listing view from cache, keyed by the request and the change
+    counters of the tables it reads. Unchanged polls get a 304 with no
+    database access; counters are bumped by the model signals in signals.py.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            try:
+                versions = ':'.join(f"{table}={get_table_version(table)}" for table in tables)
+                params = '&'.join(f"{k}={v}" for k, v in sorted(request.GET.items()))
+                raw_key = f"{request.path}?{params}|{versions}"
+                key = RESPONSE_KEY.format(hashlib.sha1(raw_key.encode()).hexdigest())
+
+                entry = cache.get(key)
+                if entry is not None:
+                    _incr(STATS_KEY.format('queries_saved'), entry['queries'])
+                    if _etag_matches(request, entry['etag']):
+                        _incr(STATS_KEY.format('not_modified'))
+                        return _finalize(Response(status=status.HTTP_304_NOT_MODIFIED), entry['etag'])
+                    _incr(STATS_KEY.format('hits'))
+                    return _finalize(Response(entry['data'], status=status.HTTP_200_OK), entry['etag'])
+            except Exception as exc:
+                # Cache unavailable: serve the listing uncached
+                logger.warning(f"Response cache unavailable, serving {request.path} uncached: {exc}")
+                return view_func(request, *args, **kwargs)
+
+            # Cache miss: run the view and count the queries it costs
+            query_count = [0]
+
+            def count_queries(execute, sql, params, many, context):
+                query_count[0] += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count_queries):
+                response = view_func(request, *args, **kwargs)
+            try:
+                _incr(STATS_KEY.format('misses'))
+            except Exception as exc:
+                logger.warning(f"Could not count response cache miss: {exc}")
+
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            body = json.dumps(response.data, sort_keys=True, default=str)
+            etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+            try:
+                cache.set(key, {
+                    'data': response.data,
+                    'etag': etag,
+                    'queries': query_count[0],
+                }, RESPONSE_CACHE_TIMEOUT)
+            except Exception as exc:
+                logger.warning(f"Could not cache {request.path}: {exc}")
+
+            if _etag_matches(request, etag):
+                return _finalize(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+            return _finalize(response, etag)
+
+        return wrapper
+    return decorator
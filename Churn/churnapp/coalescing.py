@@ -0,0 +1,104 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+import logging
+
+from .caching import _incr
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'churnapp:detection_pending:{}'
+LAST_TRIGGER_KEY = 'churnapp:detection_last_trigger:{}'
+STATS_KEY = 'churnapp:detection_stats:{}'
+STAT_NAMES = ('triggered', 'suppressed', 'scheduled', 'executed', 'deferred')
+
+
+class DetectionCoalescer:
+    """
+    Per-customer debounce for anomaly detection triggers. The first trigger
+    sets a pending flag and schedules one detection; triggers while the flag
+    is set only push the customer's quiet deadline back. A detection runs
+    once the customer has been quiet for debounce_seconds, or at the latest
+    max_wait_seconds after the first trigger, so it sees the whole burst.
+    """
+
+    def __init__(self, debounce_seconds, max_wait_seconds):
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max(max_wait_seconds, debounce_seconds)
+
+    def trigger(self, customer_ids):
+        """Record triggers; returns the customers that need a detection scheduled"""
+        now = time.time()
+        # Flags outlive the longest wait so a lost task cannot block a customer for long
+        flag_timeout = self.max_wait_seconds * 2 + 60
+        first = [
+            customer_id for customer_id in customer_ids
+            if cache.add(PENDING_KEY.format(customer_id), now, flag_timeout)
+        ]
+        cache.set_many({LAST_TRIGGER_KEY.format(customer_id): now for customer_id in customer_ids}, flag_timeout)
+
+        _incr(STATS_KEY.format('triggered'), len(customer_ids))
+        if len(customer_ids) > len(first):
+            _incr(STATS_KEY.format('suppressed'), len(customer_ids) - len(first))
+        if first:
+            _incr(STATS_KEY.format('scheduled'), len(first))
+        return first
+
+    def due(self, customer_ids):
+        """
+        Split pending customers into those ready to run now and the rest;
+        returns (ready_ids, waiting_ids, seconds until the next one is due)
+        """
+        now = time.time()
+        keys = [PENDING_KEY.format(customer_id) for customer_id in customer_ids]
+        keys += [LAST_TRIGGER_KEY.format(customer_id) for customer_id in customer_ids]
+        values = cache.get_many(keys)
+
+        ready, waiting, next_due = [], [], None
+        for customer_id in customer_ids:
+            first_seen = values.get(PENDING_KEY.format(customer_id))
+            if first_seen is None:
+                ready.append(customer_id)  # flag expired: run rather than drop the trigger
+                continue
+            last_seen = values.get(LAST_TRIGGER_KEY.format(customer_id), first_seen)
+            remaining = min(
+                self.debounce_seconds - (now - last_seen),
+                self.max_wait_seconds - (now - first_seen)
+            )
+            if remaining <= 0:
+                ready.append(customer_id)
+            else:
+                waiting.append(customer_id)
+                next_due = remaining if next_due is None else min(next_due, remaining)
+
+        if waiting:
+            _incr(STATS_KEY.format('deferred'), len(waiting))
+        return ready, waiting, next_due
+
+    def complete(self, customer_ids):
+        """
+        Clear the pending flags of customers about to be scored. Called
+        before detection runs, so triggers arriving meanwhile schedule a
+        fresh run instead of being lost.
+        """
+        cache.delete_many([PENDING_KEY.format(customer_id) for customer_id in customer_ids])
+        if customer_ids:
+            _incr(STATS_KEY.format('executed'), len(customer_ids))
+
+    def stats(self):
+        stats = {name: cache.get(STATS_KEY.format(name), 0) for name in STAT_NAMES}
+        stats['debounce_seconds'] = self.debounce_seconds
+        stats['max_wait_seconds'] = self.max_wait_seconds
+        stats['suppression_ratio'] = round(stats['suppressed'] / stats['triggered'], 4) if stats['triggered'] else 0.0
+        return stats
+
+    def reset_stats(self):
+        cache.delete_many([STATS_KEY.format(name) for name in STAT_NAMES])
+
+
+# Global coalescer instance
+detection_coalescer = DetectionCoalescer(
+    debounce_seconds=getattr(settings, 'CHURN_DETECTION_DEBOUNCE_SECONDS', 10),
+    max_wait_seconds=getattr(settings, 'CHURN_DETECTION_MAX_WAIT_SECONDS', 60),
+)
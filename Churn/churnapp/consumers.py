@@ -63,6 +63,10 @@ class AlertsConsumer(AsyncWebsocketConsumer):
         message = event['message']
         await self.send(text_data=json.dumps(message))
     
+    async def send_alert_batch(self, event):
+        """Send alerts batched by the notification dispatcher in one frame"""
+        await self.send(text_data=json.dumps({'type': 'batch', 'messages': event['messages']}))
+    
     @database_sync_to_async
     def get_recent_alerts(self):
         """Get recent alerts from database"""
@@ -157,6 +161,10 @@ class WatchlistConsumer(AsyncWebsocketConsumer):
         message = event['message']
         await self.send(text_data=json.dumps(message))
     
+    async def send_update_batch(self, event):
+        """Send watchlist updates batched by the notification dispatcher in one frame"""
+        await self.send(text_data=json.dumps({'type': 'batch', 'messages': event['messages']}))
+    
     @database_sync_to_async
     def get_current_watchlist(self):
         """Get current active watchlist entries"""
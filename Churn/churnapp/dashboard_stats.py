@@ -0,0 +1,215 @@
+import atexit
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+import logging
+
+from .sketches import SpaceSaving, HyperLogLog, hash64
+from .caching import acquire_locks, release_locks
+
+logger = logging.getLogger(__name__)
+
+# Maintain the sketches at ingestion
+STATS_ENABLED = getattr(settings, 'CHURN_DASHBOARD_STATS', True)
+
+TOP_K_CAPACITY = getattr(settings, 'CHURN_STATS_TOP_K_CAPACITY', 200)
+HLL_PRECISION = getattr(settings, 'CHURN_STATS_HLL_PRECISION', 12)
+
+# Deltas are merged into the cache when this many events are pending or
+# this long after the first of them, whichever comes first
+FLUSH_EVENTS = getattr(settings, 'CHURN_STATS_FLUSH_EVENTS', 500)
+FLUSH_INTERVAL_MS = getattr(settings, 'CHURN_STATS_FLUSH_INTERVAL_MS', 1000)
+
+# Sketch keys a process keeps pending while the cache is unavailable; past
+# this the oldest hours are dropped
+MAX_PENDING_KEYS = getattr(settings, 'CHURN_STATS_MAX_PENDING_KEYS', 500)
+
+# Ranked by default on the dashboard: problem events
+DEFAULT_TOP_EVENT_TYPES = ['payment_failed', 'app_crash', 'support_ticket']
+
+TOP_KEY = 'churnapp:stats:top:{}:{}'          # event type, hour
+ACTIVE_HOUR_KEY = 'churnapp:stats:active_hour:{}'
+ACTIVE_DAY_KEY = 'churnapp:stats:active_day:{}'
+LOCK_KEY = 'churnapp:stats:lock:{}'          # sketch key
+LOCK_TTL = 5
+HOUR_TTL = 48 * 60 * 60
+DAY_TTL = 8 * 24 * 60 * 60
+
+
+def _hour(timestamp):
+    return timezone.localtime(timestamp).strftime('%Y%m%d%H')
+
+
+def _day(timestamp):
+    return timezone.localtime(timestamp).strftime('%Y%m%d')
+
+
+class DashboardStats:
+    """
+    Streaming dashboard statistics kept in the cache: a Space-Saving top-k
+    summary of customers per event type and hour, and HyperLogLog counts of
+    distinct active customers per hour and per day. Ingestion only folds
+    events into a local delta; the delta is merged into the cache once
+    flush_events are pending or flush_interval after the first of them.
+    Each sketch key is merged under its own short cache lock (read, merge,
+    write), so workers only contend on the same sketch; a key whose lock is
+    busy stays in the delta for the next flush, and at most max_pending_keys
+    keys are kept while the cache is unavailable. Reads are a few cache gets,
+    independent of how many events were seen.
+    """
+
+    def __init__(self, capacity, precision, flush_events=FLUSH_EVENTS, flush_interval_ms=FLUSH_INTERVAL_MS,
+                 max_pending_keys=MAX_PENDING_KEYS):
+        self.capacity = capacity
+        self.precision = precision
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending_keys = max_pending_keys
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending_counts = defaultdict(Counter)  # top-k key -> {customer_id: count}
+        self._pending_active = defaultdict(set)      # hour or day key -> customer ids
+        self._pending_events = 0
+        self._timer = None
+        self._exit_hook_registered = False
+
+    def record_events(self, events):
+        """Fold (customer_id, event_type, timestamp) triples into the local delta"""
+        with self._lock:
+            for customer_id, event_type, timestamp in events:
+                hour = _hour(timestamp)
+                self._pending_counts[TOP_KEY.format(event_type, hour)][customer_id] += 1
+                self._pending_active[ACTIVE_HOUR_KEY.format(hour)].add(customer_id)
+                self._pending_active[ACTIVE_DAY_KEY.format(_day(timestamp))].add(customer_id)
+                self._pending_events += 1
+            due = self._pending_events >= self.flush_events
+            if not due:
+                self._arm_timer()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Merge pending deltas into the cached sketches; returns False if any key stays pending"""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._pending_counts = self._pending_counts, defaultdict(Counter)
+                active, self._pending_active = self._pending_active, defaultdict(set)
+                self._pending_events = 0
+            keys = list(counts) + list(active)
+            if not keys:
+                return True
+
+            merged = []
+            lock_keys, token, acquired_at = acquire_locks([LOCK_KEY.format(key) for key in keys], LOCK_TTL)
+            locked_keys = set(lock_keys)
+            locked = [key for key in keys if LOCK_KEY.format(key) in locked_keys]
+            try:
+                if locked:
+                    stored = cache.get_many(locked)
+                    hourly, daily = {}, {}
+                    for key in locked:
+                        if key in counts:
+                            summary = SpaceSaving.from_dict(stored.get(key), self.capacity)
+                            summary.add_counts(counts[key])
+                            hourly[key] = summary.to_dict()
+                        else:
+                            sketch = HyperLogLog.from_bytes(stored.get(key), self.precision)
+                            sketch.add_hashes(hash64(sorted(active[key])))
+                            (daily if key.startswith(ACTIVE_DAY_KEY.format('')) else hourly)[key] = sketch.to_bytes()
+                    cache.set_many(hourly, HOUR_TTL)
+                    cache.set_many(daily, DAY_TTL)
+                    merged = locked
+            except Exception as exc:
+                logger.warning(f"Could not update dashboard stats, keeping the delta: {exc}")
+            finally:
+                release_locks(lock_keys, token, acquired_at, LOCK_TTL)
+
+            # Keys whose lock was busy or whose merge failed stay pending
+            merged = set(merged)
+            with self._lock:
+                for key, customer_counts in counts.items():
+                    if key not in merged:
+                        self._pending_counts[key].update(customer_counts)
+                        self._pending_events += sum(customer_counts.values())
+                for key, customer_ids in active.items():
+                    if key not in merged:
+                        self._pending_active[key].update(customer_ids)
+                self._trim_pending()
+                self._arm_timer()
+            return len(merged) == len(keys)
+
+    def _trim_pending(self):
+        """Drop the oldest pending keys past max_pending_keys (caller holds _lock)"""
+        keys = list(self._pending_counts) + list(self._pending_active)
+        excess = len(keys) - self.max_pending_keys
+        if excess <= 0:
+            return
+        # Keys end in YYYYMMDDHH or YYYYMMDD; a day sorts after its hours
+        oldest = sorted(keys, key=lambda key: key.rsplit(':', 1)[1].ljust(10, '9'))[:excess]
+        dropped_events = 0
+        for key in oldest:
+            if key in self._pending_counts:
+                dropped_events += sum(self._pending_counts.pop(key).values())
+            else:
+                self._pending_active.pop(key)
+        self._pending_events -= dropped_events
+        logger.warning(
+            f"Dashboard stats cache unavailable, dropped {len(oldest)} pending sketch keys "
+            f"({dropped_events} events) from {oldest[0].rsplit(':', 1)[1]} to {oldest[-1].rsplit(':', 1)[1]}"
+        )
+
+    def _arm_timer(self):
+        """Schedule a flush of the pending delta (caller holds _lock)"""
+        if self._timer is not None or not (self._pending_counts or self._pending_active):
+            return
+        self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+        if not self._exit_hook_registered:
+            atexit.register(self.flush)
+            self._exit_hook_registered = True
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as exc:
+            logger.error(f"Error flushing dashboard stats: {exc}")
+
+    def top_customers(self, event_types, k=20, hour=None):
+        """Top-k customers by events of the given types in an hour (default: the current one)"""
+        hour = hour or _hour(timezone.now())
+        stored = cache.get_many([TOP_KEY.format(event_type, hour) for event_type in event_types])
+        summary = SpaceSaving(self.capacity)
+        for data in stored.values():
+            summary.merge(SpaceSaving.from_dict(data, self.capacity))
+        return {
+            'hour': hour,
+            'event_types': list(event_types),
+            'total_events': summary.total,
+            'error_bound': round(summary.error_bound(), 2),
+            'customers': [
+                {'customer_id': customer_id, 'count': count, 'max_overcount': error}
+                for customer_id, count, error in summary.top(k)
+            ],
+        }
+
+    def active_customers(self, now=None):
+        """Distinct active customers in the current hour and day"""
+        now = now or timezone.now()
+        hour_key, day_key = ACTIVE_HOUR_KEY.format(_hour(now)), ACTIVE_DAY_KEY.format(_day(now))
+        stored = cache.get_many([hour_key, day_key])
+        hour = HyperLogLog.from_bytes(stored.get(hour_key), self.precision)
+        return {
+            'hour': hour.count(),
+            'day': HyperLogLog.from_bytes(stored.get(day_key), self.precision).count(),
+            'relative_standard_error': round(float(hour.relative_error()), 4),
+        }
+
+
+# Global dashboard statistics
+dashboard_stats = DashboardStats(capacity=TOP_K_CAPACITY, precision=HLL_PRECISION)
@@ -0,0 +1,266 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+import logging
+
+from .ingestion import ingest_events
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SETTINGS = {
+    'CAPACITY': 50000,          # events held in memory before spilling to disk
+    'FLUSH_INTERVAL_MS': 200,   # flush at least this often
+    'FLUSH_SIZE': 1000,         # ...or as soon as this many events are waiting
+    'SPILL_DIR': os.path.join(settings.BASE_DIR, 'event_spill'),
+    'FSYNC': True,              # fsync spill writes so accepted events survive a crash
+    **getattr(settings, 'CHURN_EVENT_BUFFER', {}),
+}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EventBuffer:
+    """
+    Per-process write-behind buffer for customer events. Events are accepted
+    immediately and written to CustomerEvent in bulk by a background thread
+    every FLUSH_INTERVAL_MS or FLUSH_SIZE events. When the buffer is full,
+    events go to an fsync'd append-only spill file that later flushes replay.
+    """
+
+    def __init__(self, capacity, flush_interval_ms, flush_size, spill_dir, fsync=True, autostart=True):
+        self.capacity = capacity
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_size = flush_size
+        self.spill_dir = Path(spill_dir)
+        self.fsync = fsync
+        self.autostart = autostart
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._exit_hook_registered = False
+
+        self._stats = {
+            'accepted': 0,
+            'spilled': 0,
+            'flushed': 0,
+            'flush_count': 0,
+            'flush_errors': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    @property
+    def spill_path(self):
+        return self.spill_dir / f"events-{os.getpid()}.ndjson"
+
+    def start(self):
+        """Start the background flusher (idempotent); flushes again on exit"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='churn-event-buffer', daemon=True)
+            self._thread.start()
+            if not self._exit_hook_registered:
+                atexit.register(self.stop)
+                self._exit_hook_registered = True
+
+    def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def append(self, customer_id, event_type, metadata=None):
+        """Accept an event without touching the database"""
+        event = {
+            'customer_id': customer_id,
+            'event_type': event_type,
+            'metadata': metadata or {},
+            'timestamp': timezone.now().isoformat(),
+        }
+        if self._thread is None and self.autostart:
+            self.start()
+
+        with self._lock:
+            self._stats['accepted'] += 1
+            if len(self._queue) >= self.capacity:
+                self._spill([event])
+                self._stats['spilled'] += 1
+            else:
+                self._queue.append(event)
+            depth = len(self._queue)
+
+        if depth >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write buffered and spilled events to the database; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                buffered = list(self._queue)
+                self._queue.clear()
+                claimed = self._claim_spill_files()
+
+            if not buffered and not claimed:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                batch = list(buffered)
+                for path in claimed:
+                    batch.extend(self._read_spill_file(path))
+                if not batch:
+                    result = {'events_created': 0, 'critical_customer_ids': []}
+                else:
+                    result = ingest_events(batch)
+            except Exception as exc:
+                # Claimed files stay on disk as *.replay and are read again by
+                # the next flush; only the in-memory events need spilling
+                logger.error(f"Event buffer flush failed, spilling {len(buffered)} events: {exc}")
+                with self._lock:
+                    if buffered:
+                        self._spill(buffered)
+                    self._stats['flush_errors'] += 1
+                return 0
+
+            for path in claimed:
+                path.unlink(missing_ok=True)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._stats['flushed'] += result['events_created']
+                self._stats['flush_count'] += 1
+                self._stats['last_flush_ms'] = elapsed_ms
+                self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+                self._stats['total_flush_ms'] += elapsed_ms
+
+            self._queue_detection(result['critical_customer_ids'])
+            return result['events_created']
+
+    def stats(self):
+        """Buffer depth and flush latency for dashboards"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['depth'] = len(self._queue)
+        stats['capacity'] = self.capacity
+        stats['spill_files'] = len(list(self.spill_dir.glob('events-*.ndjson*'))) if self.spill_dir.exists() else 0
+        stats['avg_flush_ms'] = round(stats['total_flush_ms'] / stats['flush_count'], 3) if stats['flush_count'] else 0.0
+        del stats['total_flush_ms']
+        return stats
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                logger.error(f"Error in event buffer flusher: {exc}")
+            finally:
+                close_old_connections()
+
+    def _spill(self, events):
+        """Append events to this process's spill file (caller holds _lock)"""
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.spill_path, 'a', encoding='utf-8') as spill_file:
+            for event in events:
+                spill_file.write(json.dumps(event) + '\n')
+            spill_file.flush()
+            if self.fsync:
+                os.fsync(spill_file.fileno())
+
+    def _claim_spill_files(self):
+        """
+        Take ownership of this process's spill file and those of dead
+        processes, plus replay files left behind by a failed flush or by a
+        process that died before unlinking them
+        """
+        if not self.spill_dir.exists():
+            return []
+        claimed = []
+        for path in sorted(self.spill_dir.glob('events-*.ndjson')):
+            pid = int(path.stem.split('-', 1)[1])
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            target = self._replay_path(path)
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue  # claimed by another process
+            claimed.append(target)
+        for path in sorted(self.spill_dir.glob('events-*.ndjson.*.replay')):
+            if path in claimed:
+                continue
+            owner = int(path.name.split('.')[-2].split('-')[0])
+            if owner != os.getpid():
+                if _pid_alive(owner):
+                    continue
+                target = self._replay_path(path)
+                try:
+                    os.rename(path, target)
+                except FileNotFoundError:
+                    continue
+                path = target
+            claimed.append(path)
+        return claimed
+
+    def _replay_path(self, path):
+        """Unique name a claimed spill file is renamed to, e.g. events-12.ndjson.34-<ns>.replay"""
+        return path.with_name(f"{path.name.split('.', 1)[0]}.ndjson.{os.getpid()}-{time.time_ns()}.replay")
+
+    def _read_spill_file(self, path):
+        """Events of a spill file, skipping a line torn by a crash mid-write"""
+        events = []
+        with open(path, encoding='utf-8') as spill_file:
+            for line in spill_file:
+                if not line.strip():
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable line in spill file {path.name}")
+        return events
+
+    def _queue_detection(self, customer_ids):
+        if not customer_ids:
+            return
+        try:
+            from .tasks import queue_anomaly_detection
+            queue_anomaly_detection(customer_ids)
+        except Exception as exc:
+            logger.error(f"Could not queue anomaly detection after flush: {exc}")
+
+
+# Global buffer instance
+event_buffer = EventBuffer(
+    capacity=BUFFER_SETTINGS['CAPACITY'],
+    flush_interval_ms=BUFFER_SETTINGS['FLUSH_INTERVAL_MS'],
+    flush_size=BUFFER_SETTINGS['FLUSH_SIZE'],
+    spill_dir=BUFFER_SETTINGS['SPILL_DIR'],
+    fsync=BUFFER_SETTINGS['FSYNC'],
+)
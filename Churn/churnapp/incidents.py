@@ -0,0 +1,240 @@
+from collections import Counter
+from datetime import timedelta
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+import logging
+
+from .models import PlatformIncident
+from .caching import _incr, acquire_locks, release_locks
+
+logger = logging.getLogger(__name__)
+
+# Event types watched for platform-wide spikes, and the per-customer alert
+# type their spikes would otherwise produce for every affected customer
+MONITORED_EVENTS = {
+    'app_crash': 'problem_spike',
+    'payment_failed': 'problem_spike',
+    'support_ticket': 'problem_spike',
+    'cart_abandon': 'cart_abandon_spike',
+}
+
+ACTIVE_KEY = 'churnapp:incident_active:{}'
+COUNT_KEY = 'churnapp:incident_count:{}:{}'  # event type, minute
+BASELINE_KEY = 'churnapp:incident_baseline'
+FOLD_LOCK_KEY = 'churnapp:incident_baseline:lock'
+COUNT_TTL = 6 * 60 * 60
+FOLD_LOCK_TTL = 30
+MAX_FOLD_MINUTES = 240
+
+
+def _fresh_baseline():
+    return {'minute': None, 'observed': 0, 'mean': {}, 'var': {}}
+
+
+class PlatformSpikeDetector:
+    """
+    Population-level spike detector. Every ingesting worker adds its events
+    of each monitored type to a shared per-minute counter in the cache, so
+    the threshold is checked against the platform-wide count. A type whose
+    count in the current minute crosses max(min_events, mean + sigmas * std)
+    raises one PlatformIncident, whose key suppresses per-customer detection
+    and alerts of that type until it has not spiked for quiet_minutes.
+
+    The per-minute EWMA baseline is shared too: once a minute is complete
+    (two minutes old, so late events from other workers are in), one worker
+    folds it into the baseline under a cache lock; the others reload it.
+    """
+
+    def __init__(self, alpha, sigmas, min_events, warmup_minutes, quiet_minutes):
+        self.alpha = alpha
+        self.sigmas = sigmas
+        self.min_events = min_events
+        self.warmup_minutes = warmup_minutes
+        self.quiet_minutes = quiet_minutes
+        self.reset()
+
+    def reset(self):
+        self.minute = None
+        self.baseline = _fresh_baseline()
+        self._reported = set()  # (event type, minute) already reported by this process
+
+    def threshold(self, event_type, baseline=None):
+        baseline = baseline or self.baseline
+        mean = baseline['mean'].get(event_type, 0.0)
+        return max(self.min_events, mean + self.sigmas * math.sqrt(baseline['var'].get(event_type, 0.0)))
+
+    def record_events(self, events):
+        """Count (event_type, datetime) pairs; returns the incidents raised"""
+        counts = Counter(
+            (int(timestamp.timestamp() // 60), event_type)
+            for event_type, timestamp in events if event_type in MONITORED_EVENTS
+        )
+        incidents = []
+        for minute, event_type in sorted(counts):
+            self._advance(minute)
+            if minute < self.minute - 1:
+                continue  # backfilled history is not live traffic
+            try:
+                count = _incr(COUNT_KEY.format(event_type, minute), counts[(minute, event_type)], COUNT_TTL)
+            except Exception as exc:
+                logger.warning(f"Platform event counts unavailable, not checking for spikes: {exc}")
+                return incidents
+
+            if (
+                (event_type, minute) not in self._reported
+                and self.baseline['observed'] >= self.warmup_minutes
+                and count >= self.threshold(event_type)
+            ):
+                self._reported.add((event_type, minute))
+                incident = self._report_spike(event_type, count, self.baseline['mean'].get(event_type, 0.0))
+                if incident is not None:
+                    incidents.append(incident)
+        return incidents
+
+    def _advance(self, minute):
+        """On a new minute, fold the completed minutes into the shared baseline and reload it"""
+        if self.minute is not None and minute <= self.minute:
+            return
+        self.minute = minute
+        self._reported = {reported for reported in self._reported if reported[1] >= minute - 1}
+        try:
+            baseline = cache.get(BASELINE_KEY)
+            if baseline is None:
+                # Start the baseline at the first minute with traffic
+                cache.add(BASELINE_KEY, {**_fresh_baseline(), 'minute': minute - 1}, None)
+                baseline = cache.get(BASELINE_KEY) or _fresh_baseline()
+            elif baseline['minute'] < minute - 2:
+                baseline = self._fold(minute - 2) or baseline
+        except Exception as exc:
+            logger.warning(f"Platform baseline unavailable: {exc}")
+            return
+        self.baseline = baseline
+
+    def _fold(self, up_to_minute):
+        """Fold completed minutes up to up_to_minute into the shared baseline; None if another worker is"""
+        locked, token, acquired_at = acquire_locks([FOLD_LOCK_KEY], FOLD_LOCK_TTL)
+        if not locked:
+            return None
+        spiked = {}
+        try:
+            baseline = cache.get(BASELINE_KEY)
+            if baseline is None or baseline['minute'] >= up_to_minute:
+                return baseline
+            start = max(baseline['minute'] + 1, up_to_minute - MAX_FOLD_MINUTES)
+            minutes = range(start, up_to_minute + 1)
+            stored = cache.get_many([COUNT_KEY.format(event_type, minute) for minute in minutes for event_type in MONITORED_EVENTS])
+
+            for minute in minutes:
+                for event_type in MONITORED_EVENTS:
+                    count = stored.get(COUNT_KEY.format(event_type, minute), 0)
+                    if baseline['observed'] >= self.warmup_minutes:
+                        threshold = self.threshold(event_type, baseline)
+                        if count >= threshold:
+                            spiked[event_type] = max(spiked.get(event_type, 0), count)
+                        # Clip outage minutes so an incident does not become the new normal
+                        count = min(count, threshold)
+                    if baseline['observed']:
+                        self._update(baseline, event_type, count)
+                    else:
+                        baseline['mean'][event_type] = count  # seed with the first full minute
+                baseline['observed'] += 1
+            baseline['minute'] = up_to_minute
+            cache.set(BASELINE_KEY, baseline, None)
+        finally:
+            release_locks(locked, token, acquired_at, FOLD_LOCK_TTL)
+
+        # Record the final counts of the minutes that spiked
+        for event_type, count in spiked.items():
+            self._extend_incident(event_type, count)
+        self.resolve_quiet_incidents()
+        return baseline
+
+    def _update(self, baseline, event_type, value):
+        mean = baseline['mean'].get(event_type, 0.0)
+        diff = value - mean
+        increment = self.alpha * diff
+        baseline['mean'][event_type] = mean + increment
+        baseline['var'][event_type] = (1 - self.alpha) * (baseline['var'].get(event_type, 0.0) + diff * increment)
+
+    def _report_spike(self, event_type, count, expected):
+        """Raise an incident for a spiking type, or extend the active one"""
+        key = ACTIVE_KEY.format(event_type)
+        ttl = self.quiet_minutes * 60
+        try:
+            claimed = cache.add(key, 0, ttl)
+        except Exception as exc:
+            logger.warning(f"Incident state unavailable, not raising {event_type} incident: {exc}")
+            return None
+        if not claimed:
+            self._extend_incident(event_type, count)
+            return None
+
+        incident = PlatformIncident.objects.create(
+            event_type=event_type,
+            severity='critical' if count >= 10 * max(expected, 1.0) else 'high',
+            description=f"Platform-wide {event_type} spike: {count} events in a minute against {expected:.1f} expected",
+            expected_per_minute=expected,
+            peak_per_minute=count
+        )
+        try:
+            cache.set(key, incident.id, ttl)
+        except Exception as exc:
+            logger.warning(f"Could not store incident {incident.id} state: {exc}")
+        logger.warning(f"Raised platform incident {incident.id}: {incident.description}")
+
+        from .tasks import send_incident_notification
+        send_incident_notification.delay(incident.id)
+        return incident
+
+    def _extend_incident(self, event_type, count):
+        """Keep the active incident (and its suppression) alive and record the minute's count"""
+        key = ACTIVE_KEY.format(event_type)
+        try:
+            incident_id = cache.get(key)
+            cache.touch(key, self.quiet_minutes * 60)
+        except Exception as exc:
+            logger.warning(f"Incident state unavailable, not extending {event_type} incident: {exc}")
+            return
+        if incident_id:
+            PlatformIncident.objects.filter(id=incident_id).update(
+                status='active',
+                resolved_at=None,
+                last_seen_at=timezone.now(),
+                peak_per_minute=Greatest('peak_per_minute', Value(count))
+            )
+
+    def resolve_quiet_incidents(self):
+        """Resolve incidents that no worker has seen spiking for quiet_minutes"""
+        now = timezone.now()
+        return PlatformIncident.objects.filter(
+            status='active',
+            last_seen_at__lt=now - timedelta(minutes=self.quiet_minutes)
+        ).update(status='resolved', resolved_at=now)
+
+    def active_event_types(self):
+        """Event types with an active platform incident"""
+        keys = {ACTIVE_KEY.format(event_type): event_type for event_type in MONITORED_EVENTS}
+        try:
+            return {keys[key] for key in cache.get_many(list(keys))}
+        except Exception as exc:
+            logger.warning(f"Incident state unavailable, not suppressing: {exc}")
+            return set()
+
+    def suppressed_alert_types(self):
+        """Per-customer alert types withheld while their event type has an incident"""
+        return {MONITORED_EVENTS[event_type] for event_type in self.active_event_types()}
+
+
+# Global spike detector
+platform_monitor = PlatformSpikeDetector(
+    alpha=getattr(settings, 'CHURN_INCIDENT_EWMA_ALPHA', 0.1),
+    sigmas=getattr(settings, 'CHURN_INCIDENT_SIGMAS', 6.0),
+    min_events=getattr(settings, 'CHURN_INCIDENT_MIN_EVENTS_PER_MINUTE', 50),
+    warmup_minutes=getattr(settings, 'CHURN_INCIDENT_WARMUP_MINUTES', 15),
+    quiet_minutes=getattr(settings, 'CHURN_INCIDENT_QUIET_MINUTES', 10),
+)
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+
+# CPU-bound scoring (sklearn + SHAP) runs here so it never blocks the event
+# loop; sized to the cores so concurrent requests queue instead of thrashing
+INFERENCE_WORKERS = getattr(settings, 'CHURN_INFERENCE_WORKERS', None) or os.cpu_count() or 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_inference_executor():
+    """Process-wide bounded thread pool for model inference"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=INFERENCE_WORKERS,
+                    thread_name_prefix='churn-inference'
+                )
+    return _executor
+
+
+async def run_inference(func, *args, **kwargs):
+    """Run a CPU-bound scoring function on the inference pool and await it"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_inference_executor(), partial(func, *args, **kwargs))
@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import logging
+
+from .models import Customer, CustomerEvent
+from .behavior_counters import behavior_counters, COUNTERS_ENABLED
+from .sessions import persist_sessions
+from .incidents import platform_monitor
+from .dashboard_stats import dashboard_stats, STATS_ENABLED
+
+# Event types that warrant an anomaly detection run for the customer
+CRITICAL_EVENTS = ['purchase', 'payment_failed', 'support_ticket', 'cart_abandon', 'app_crash']
+
+logger = logging.getLogger(__name__)
+
+
+def _event_timestamp(event, default):
+    timestamp = event.get('timestamp')
+    if isinstance(timestamp, str):
+        timestamp = parse_datetime(timestamp)
+    return timestamp or default
+
+
+def ingest_events(events):
+    """
+    Write a batch of validated events ({customer_id, event_type, metadata,
+    optional timestamp}) with one bulk insert and one last_activity update,
+    returning the customers whose new events warrant anomaly detection.
+    bulk_create skips save(), so the typed metadata columns are set here.
+
+    The insert and the update commit together; once they have, nothing
+    raises, so callers can retry a failure without inserting duplicates.
+    Counters, sessions, dashboard stats and the platform monitor are derived
+    state updated afterwards, each logging its own failure.
+    """
+    now = timezone.now()
+    customer_ids = {event['customer_id'] for event in events}
+    with transaction.atomic():
+        created = CustomerEvent.objects.bulk_create(
+            [
+                CustomerEvent(
+                    customer_id=event['customer_id'],
+                    event_type=event['event_type'],
+                    metadata=event.get('metadata') or {},
+                    timestamp=_event_timestamp(event, now),
+                    **CustomerEvent.typed_metadata(event.get('metadata'))
+                )
+                for event in events
+            ],
+            batch_size=1000
+        )
+        Customer.objects.filter(id__in=customer_ids).update(last_activity=now, updated_at=now)
+
+    if COUNTERS_ENABLED:
+        try:
+            behavior_counters.record_events([
+                {**event, 'timestamp': created_event.timestamp}
+                for event, created_event in zip(events, created)
+            ])
+        except Exception as exc:
+            logger.error(f"Could not update behavior counters for {len(created)} events: {exc}")
+
+    # Logouts complete sessions; store them so readers need not re-pair events
+    logouts = [created_event for created_event in created if created_event.event_type == 'logout']
+    if logouts:
+        try:
+            persist_sessions(
+                {created_event.customer_id for created_event in logouts},
+                since=min(created_event.timestamp for created_event in logouts)
+            )
+        except Exception as exc:
+            logger.error(f"Could not persist sessions for {len(logouts)} logouts: {exc}")
+
+    if STATS_ENABLED:
+        try:
+            dashboard_stats.record_events(
+                (created_event.customer_id, created_event.event_type, created_event.timestamp) for created_event in created
+            )
+        except Exception as exc:
+            logger.error(f"Could not update dashboard stats for {len(created)} events: {exc}")
+
+    # Count events for platform-wide spikes; an incident's event type stops
+    # triggering per-customer detection while it is active
+    try:
+        platform_monitor.record_events(
+            (created_event.event_type, created_event.timestamp) for created_event in created
+        )
+        suppressed = platform_monitor.active_event_types()
+    except Exception as exc:
+        logger.error(f"Could not update platform monitor for {len(created)} events: {exc}")
+        suppressed = set()
+
+    return {
+        'events_created': len(created),
+        'customers_updated': len(customer_ids),
+        'critical_customer_ids': sorted({
+            event['customer_id'] for event in events
+            if event['event_type'] in CRITICAL_EVENTS and event['event_type'] not in suppressed
+        }),
+    }
@@ -0,0 +1,132 @@
+from django.core.management.base import BaseCommand
+from urllib.parse import urlsplit
+import asyncio
+import json
+import time
+
+import numpy as np
+
+SAMPLE_PREDICTION_INPUT = {
+    'Tenure': 12, 'PreferredLoginDevice': 'Mobile Phone', 'CityTier': 1,
+    'WarehouseToHome': 15.0, 'PreferredPaymentMode': 'Debit Card', 'Gender': 'Male',
+    'HourSpendOnApp': 3.0, 'NumberOfDeviceRegistered': 3,
+    'PreferedOrderCat': 'Laptop & Accessory', 'SatisfactionScore': 3,
+    'MaritalStatus': 'Single', 'NumberOfAddress': 2, 'Complain': 0,
+    'OrderAmountHikeFromlastYear': 15.0, 'CouponUsed': 5, 'OrderCount': 3,
+    'DaySinceLastOrder': 5, 'CashbackAmount': 150.0
+}
+
+# Sync path -> ASGI-native path for every benchmarked endpoint
+ENDPOINTS = {
+    'predict': ('/api/predict/', '/api/async/predict/'),
+    'watchlist': ('/api/watchlist/', '/api/async/watchlist/'),
+    'alerts': ('/api/alerts/?hours=24', '/api/async/alerts/?hours=24'),
+    'behavior': ('/api/customer/{customer_id}/behavior/', '/api/async/customer/{customer_id}/behavior/'),
+}
+
+
+async def _request(host, port, method, path, body):
+    """Minimal HTTP/1.1 client so the load generator adds no dependencies"""
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = body.encode() if body else b''
+    head = (
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+    )
+    writer.write(head.encode() + payload)
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def _run_load(base_url, method, path, body, concurrency, total_requests):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    latencies = []
+    errors = 0
+    remaining = iter(range(total_requests))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                status_code = await _request(host, port, method, path, body)
+                if status_code >= 400:
+                    errors += 1
+            except OSError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return elapsed, np.array(latencies) * 1000, errors
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI-sync and ASGI-async endpoint throughput and tail latency under concurrent load'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wsgi-url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of the WSGI server (e.g. gunicorn churn.wsgi)'
+        )
+        parser.add_argument(
+            '--asgi-url',
+            default='http://127.0.0.1:8001',
+            help='Base URL of the ASGI server (e.g. uvicorn churn.asgi:application)'
+        )
+        parser.add_argument(
+            '--endpoint',
+            choices=sorted(ENDPOINTS),
+            default='predict',
+            help='Endpoint to load'
+        )
+        parser.add_argument(
+            '--customer-id',
+            type=int,
+            default=1,
+            help='Customer id used by the behavior endpoint'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[50, 200, 1000],
+            help='Concurrent client counts to test'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Requests per run'
+        )
+
+    def handle(self, *args, **options):
+        sync_path, async_path = (
+            path.format(customer_id=options['customer_id'])
+            for path in ENDPOINTS[options['endpoint']]
+        )
+        method = 'POST' if options['endpoint'] == 'predict' else 'GET'
+        body = json.dumps(SAMPLE_PREDICTION_INPUT) if method == 'POST' else ''
+
+        self.stdout.write(
+            f"{'mode':<12}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+        )
+        for concurrency in options['concurrency']:
+            for mode, base_url, path in (
+                ('wsgi-sync', options['wsgi_url'], sync_path),
+                ('asgi-async', options['asgi_url'], async_path),
+            ):
+                elapsed, latencies, errors = asyncio.run(
+                    _run_load(base_url, method, path, body, concurrency, options['requests'])
+                )
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                self.stdout.write(
+                    f"{mode:<12}{concurrency:>8}{len(latencies) / elapsed:>10.1f}"
+                    f"{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}{errors:>8}"
+                )
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand
+from churnapp.anomaly_detection import FEATURE_NAMES, _new_isolation_forest
+from sklearn.preprocessing import StandardScaler
+import time
+
+import numpy as np
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare vectorized and per-customer forest scoring of a prepared synthetic matrix (scoring only: no '
+        'queries, feature extraction or alerting), optionally running batch_anomaly_detection end to end'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customers',
+            type=int,
+            default=100000,
+            help='Synthetic customers to score'
+        )
+        parser.add_argument(
+            '--per-row-sample',
+            type=int,
+            default=1000,
+            help='Customers scored one at a time; the per-row runtime is extrapolated from this sample'
+        )
+        parser.add_argument(
+            '--end-to-end',
+            action='store_true',
+            help='Also run batch_anomaly_detection against the database and report its runtime'
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=None,
+            help='Active customers per id range in the end-to-end run (default: CHURN_BATCH_DETECTION_RANGE_SIZE)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='+',
+            default=[1, 2, 4, 8],
+            help='Worker counts to estimate the fanned-out wall time for'
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(42)
+        X = rng.gamma(2.0, 2.0, size=(options['customers'], len(FEATURE_NAMES)))
+
+        scaler = StandardScaler().fit(X[:10000])
+        forest = _new_isolation_forest().fit(scaler.transform(X[:10000]))
+
+        started = time.perf_counter()
+        scores = forest.decision_function(scaler.transform(X))
+        is_anomaly = scores < 0
+        vectorized = time.perf_counter() - started
+
+        sample = X[:min(options['per_row_sample'], len(X))]
+        started = time.perf_counter()
+        for row in sample:
+            scaled = scaler.transform(row.reshape(1, -1))
+            forest.decision_function(scaled)
+            forest.predict(scaled)
+        per_row = (time.perf_counter() - started) / len(sample) * len(X)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scoring only, {len(X)} synthetic customers: vectorized {vectorized:.2f}s, per-row ~{per_row:.1f}s "
+            f"({per_row / vectorized:.0f}x), {int(is_anomaly.sum())} anomalies"
+        ))
+        if not options['end_to_end']:
+            self.stdout.write('Run with --end-to-end for the task runtime including feature queries and alerting')
+
+        if options['end_to_end']:
+            from churnapp.tasks import batch_anomaly_detection
+
+            # Ranges run one after another here; the chord's wall time with n
+            # workers is the longest worker's share of the measured ranges
+            result = batch_anomaly_detection(fan_out=False, range_size=options['range_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"End to end, batch_anomaly_detection: {result['processed_count']} customers, "
+                f"{result['anomalies_found']} anomalies, {result['alerts_created']} alerts "
+                f"in {result['runtime_seconds']:.2f}s over {result['ranges']} id ranges"
+            ))
+            for workers in options['workers']:
+                wall = self.fanned_out_wall_time(result['range_seconds'], workers)
+                speedup = sum(result['range_seconds']) / wall if wall else 0.0
+                self.stdout.write(
+                    f"  {workers} workers: ~{wall:.2f}s ({speedup:.1f}x, {speedup / workers:.0%} of linear)"
+                )
+
+    def fanned_out_wall_time(self, range_seconds, workers):
+        # Workers take the next queued range as they free up
+        loads = [0.0] * workers
+        for seconds in range_seconds:
+            loads[loads.index(min(loads))] += seconds
+        return max(loads)
@@ -0,0 +1,130 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from churnapp.models import Customer
+from churnapp.tasks import _handle_anomaly_result, process_customer_event
+from celery import current_app
+from celery.signals import task_prerun
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+import asyncio
+import time
+
+import numpy as np
+
+
+class Command(BaseCommand):
+    help = 'Compare the chained and fused event-to-watchlist follow-ups: latency, task hops and queries per customer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customers',
+            type=int,
+            default=100,
+            help='Customers to run through the pipeline'
+        )
+        parser.add_argument(
+            '--live',
+            action='store_true',
+            help='Send events through the broker and time event -> WebSocket update against running workers'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=120.0,
+            help='Seconds to wait for WebSocket updates in --live mode'
+        )
+
+    def handle(self, *args, **options):
+        customers = list(Customer.objects.order_by('id')[:options['customers']])
+        if not customers:
+            self.stdout.write(self.style.WARNING('No customers found. Run populate_sample_data first.'))
+            return
+
+        if options['live']:
+            self.benchmark_live(customers, options['timeout'])
+            return
+
+        # Run every queued stage inline so the chain's stages are all measured
+        current_app.conf.task_always_eager = True
+        for label, fused in (('chained', False), ('fused', True)):
+            self.benchmark_in_process(label, fused, customers)
+        self.stdout.write(
+            'In production each chained hop also pays a broker round trip and a queue wait; '
+            'use --live against running workers to include them.'
+        )
+
+    def benchmark_in_process(self, label, fused, customers):
+        hops = []
+        queries = []
+
+        def count_hop(**kwargs):
+            hops.append(kwargs['task'].name)
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        task_prerun.connect(count_hop)
+        latencies = []
+        try:
+            with connection.execute_wrapper(count_query):
+                for customer in customers:
+                    # JSON-safe stand-in for a detection result, as the chain serializes it
+                    result = {
+                        'anomaly_score': -0.9,
+                        'is_anomaly': True,
+                        'incident_suppressed': False,
+                        'anomaly_details': [{'type': 'purchase_drop', 'severity': 'critical'}]
+                    }
+                    started = time.perf_counter()
+                    _handle_anomaly_result(customer, result, fused=fused)
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            task_prerun.disconnect(count_hop)
+
+        latencies = np.array(latencies) * 1000
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: p50 {np.percentile(latencies, 50):.1f} ms, p95 {np.percentile(latencies, 95):.1f} ms per customer, "
+            f"{len(hops) / len(customers):.1f} task hops and {len(queries) / len(customers):.1f} queries per customer"
+        ))
+
+    def benchmark_live(self, customers, timeout):
+        layer = get_channel_layer()
+        pending = {customer.id for customer in customers}
+
+        async def listen(channel, sent_at, latencies):
+            deadline = time.monotonic() + timeout
+            while pending and time.monotonic() < deadline:
+                try:
+                    event = await asyncio.wait_for(layer.receive(channel), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                customer_id = event.get('message', {}).get('customer_id')
+                if event.get('message', {}).get('type') == 'watchlist_update' and customer_id in pending:
+                    pending.discard(customer_id)
+                    latencies.append(time.monotonic() - sent_at[customer_id])
+
+        async def run():
+            channel = await layer.new_channel()
+            await layer.group_add('watchlist', channel)
+            sent_at, latencies = {}, []
+            try:
+                for customer in customers:
+                    sent_at[customer.id] = time.monotonic()
+                    process_customer_event.delay(customer.id, 'payment_failed', {'source': 'benchmark'})
+                await listen(channel, sent_at, latencies)
+            finally:
+                await layer.group_discard('watchlist', channel)
+            return latencies
+
+        latencies = np.array(async_to_sync(run)()) * 1000
+        if not len(latencies):
+            self.stdout.write(self.style.WARNING(
+                'No watchlist updates received: are workers running and are the customers anomalous?'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Event -> WebSocket: {len(latencies)}/{len(customers)} customers updated, "
+            f"p50 {np.percentile(latencies, 50):.0f} ms, p95 {np.percentile(latencies, 95):.0f} ms "
+            f"(includes the detection debounce)"
+        ))
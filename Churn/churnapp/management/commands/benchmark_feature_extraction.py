@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from churnapp.models import Customer
+from churnapp.anomaly_detection import anomaly_detector, build_feature_matrix, sample_customer_ids
+import time
+
+
+class Command(BaseCommand):
+    help = 'Measure queries and time per customer for behavioral feature extraction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customers',
+            type=int,
+            default=200,
+            help='Number of customers to extract features for'
+        )
+        parser.add_argument(
+            '--days-back',
+            type=int,
+            default=7,
+            help='Feature window in days'
+        )
+        parser.add_argument(
+            '--population',
+            action='store_true',
+            help='Benchmark the grouped population feature matrix instead of per-customer extraction'
+        )
+        parser.add_argument(
+            '--min-events',
+            type=int,
+            default=50,
+            help='Minimum events for a customer to be sampled (population mode)'
+        )
+
+    def handle(self, *args, **options):
+        if options['population']:
+            return self.benchmark_population(options)
+
+        customers = list(Customer.objects.order_by('?')[:options['customers']])
+        if not customers:
+            self.stdout.write(self.style.WARNING('No customers found. Run populate_sample_data first.'))
+            return
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for customer in customers:
+                anomaly_detector.extract_behavioral_features(customer, days_back=options['days_back'])
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(customers)} customers: {len(queries) / len(customers):.2f} queries/customer, "
+            f"{elapsed / len(customers) * 1000:.2f} ms/customer"
+        ))
+
+    def benchmark_population(self, options):
+        started = time.perf_counter()
+        customer_ids = sample_customer_ids(options['customers'], min_events=options['min_events'])
+        sampled_at = time.perf_counter()
+        if not len(customer_ids):
+            self.stdout.write(self.style.WARNING('No eligible customers found.'))
+            return
+
+        with CaptureQueriesContext(connection) as queries:
+            _, X = build_feature_matrix(customer_ids, days_back=options['days_back'])
+        elapsed = time.perf_counter() - sampled_at
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(customer_ids)} customers: sampled in {sampled_at - started:.2f}s, "
+            f"matrix built in {elapsed:.2f}s ({len(customer_ids) / elapsed:.0f} customers/s), "
+            f"{len(queries)} queries, {X.nbytes / 1e6:.1f} MB"
+        ))
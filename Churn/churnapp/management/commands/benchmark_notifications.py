@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from churnapp.notifications import NotificationBatcher
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare one group_send per notification with per-tick batched notifications on the configured channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=5000,
+            help='Anomaly notifications to send, as a batch detection run would'
+        )
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        messages = [
+            {'type': 'anomaly_detected', 'customer_id': customer_id, 'anomaly_score': -0.8, 'anomaly_details': []}
+            for customer_id in range(count)
+        ]
+        layer = get_channel_layer()
+
+        started = time.perf_counter()
+        for message in messages:
+            async_to_sync(layer.group_send)('alerts', {'type': 'send_alert', 'message': message})
+        per_message = time.perf_counter() - started
+
+        batcher = NotificationBatcher(tick_ms=100, max_batch=500, autostart=False)
+        started = time.perf_counter()
+        for start in range(0, count, batcher.max_batch):
+            for message in messages[start:start + batcher.max_batch]:
+                batcher.send('alerts', 'send_alert', message)
+            batcher.flush()
+        batched = time.perf_counter() - started
+
+        self.stdout.write(f"Per message: {count} group sends in {per_message:.2f}s ({count / per_message:.0f} msg/s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Batched: {batcher.stats()['group_sends']} group sends in {batched:.2f}s ({count / batched:.0f} msg/s), "
+            f"{per_message / batched:.1f}x faster"
+        ))
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Sum, FloatField
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+from churnapp.models import Customer, CustomerEvent
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare purchase amount averages and sums from JSON metadata versus the typed amount column'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed-events',
+            type=int,
+            default=0,
+            help='Insert this many synthetic purchase events first (e.g. 10000000)'
+        )
+        parser.add_argument(
+            '--customers',
+            type=int,
+            default=1000,
+            help='Customers the synthetic events are spread over'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed_events']:
+            self.seed(options['seed_events'], options['customers'])
+
+        purchases = CustomerEvent.objects.filter(event_type='purchase')
+
+        started = time.perf_counter()
+        amounts = [
+            float(metadata['amount'])
+            for metadata in purchases.values_list('metadata', flat=True).iterator(chunk_size=10000)
+            if 'amount' in metadata
+        ]
+        python_avg, python_sum = (sum(amounts) / len(amounts), sum(amounts)) if amounts else (None, None)
+        python_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        json_stats = purchases.filter(metadata__has_key='amount').aggregate(
+            avg=Avg(Cast(KT('metadata__amount'), FloatField())),
+            total=Sum(Cast(KT('metadata__amount'), FloatField()))
+        )
+        json_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        typed_stats = purchases.aggregate(avg=Avg('amount'), total=Sum('amount'))
+        typed_elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"{len(amounts)} purchase amounts (avg {python_avg}, sum {python_sum})")
+        for label, elapsed, stats in (
+            ('python loop over metadata', python_elapsed, None),
+            ('SQL cast of JSON metadata', json_elapsed, json_stats),
+            ('SQL on typed column', typed_elapsed, typed_stats),
+        ):
+            detail = f" (avg {stats['avg']}, sum {stats['total']})" if stats else ''
+            self.stdout.write(f"{label:<28}{elapsed:>9.3f}s{detail}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Typed column is {python_elapsed / typed_elapsed:.0f}x faster than the Python loop "
+            f"and {json_elapsed / typed_elapsed:.1f}x faster than casting JSON"
+        ))
+
+    def seed(self, count, customer_count):
+        customer_ids = list(Customer.objects.values_list('id', flat=True)[:customer_count])
+        if not customer_ids:
+            customer_ids = [
+                customer.id for customer in Customer.objects.bulk_create([
+                    Customer(customer_id=f'BENCH_{i}', name=f'Bench {i}', email=f'bench{i}@example.com')
+                    for i in range(customer_count)
+                ])
+            ]
+
+        rng = random.Random(42)
+        batch_size = 10000
+        for offset in range(0, count, batch_size):
+            events = []
+            for _ in range(min(batch_size, count - offset)):
+                amount = round(rng.uniform(10.0, 500.0), 2)
+                events.append(CustomerEvent(
+                    customer_id=rng.choice(customer_ids),
+                    event_type='purchase',
+                    metadata={'amount': amount},
+                    amount=amount
+                ))
+            CustomerEvent.objects.bulk_create(events)
+        self.stdout.write(f"Seeded {count} purchase events")
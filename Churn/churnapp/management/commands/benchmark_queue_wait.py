@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from churnapp.models import Customer
+from churnapp.queue_metrics import queue_wait_stats, reset_queue_wait_stats
+from churnapp.tasks import process_customer_event, batch_anomaly_detection, apply_retention
+import time
+
+
+class Command(BaseCommand):
+    help = 'Measure realtime and bulk queue wait against running workers, with and without a batch run in flight'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=50.0,
+            help='Real-time events per second to send in each phase'
+        )
+        parser.add_argument(
+            '--seconds',
+            type=float,
+            default=30.0,
+            help='Length of each phase'
+        )
+        parser.add_argument(
+            '--bulk-runs',
+            type=int,
+            default=4,
+            help='batch_anomaly_detection and apply_retention runs to queue in the second phase'
+        )
+
+    def handle(self, *args, **options):
+        customer_ids = list(Customer.objects.order_by('id').values_list('id', flat=True)[:1000])
+        if not customer_ids:
+            self.stdout.write(self.style.WARNING('No customers found. Run populate_sample_data first.'))
+            return
+
+        self.stdout.write('Phase 1: real-time events only')
+        idle = self.run_phase(customer_ids, options)
+
+        self.stdout.write(f"Phase 2: real-time events while {options['bulk_runs']} batch runs are queued")
+        for _ in range(options['bulk_runs']):
+            batch_anomaly_detection.delay()
+            apply_retention.delay()
+        loaded = self.run_phase(customer_ids, options)
+
+        for label, stats in (('idle', idle), ('batch running', loaded)):
+            for queue, queue_stats in stats.items():
+                self.stdout.write(
+                    f"{label:>13} {queue:>8}: {queue_stats['tasks']} tasks, mean {queue_stats['mean_ms']} ms, "
+                    f"p50 <= {queue_stats['p50_ms']} ms, p99 <= {queue_stats['p99_ms']} ms"
+                )
+        if loaded['realtime']['tasks'] and loaded['realtime']['p99_ms'] == idle['realtime']['p99_ms']:
+            self.stdout.write(self.style.SUCCESS('Real-time p99 queue wait unchanged by the batch run'))
+
+    def run_phase(self, customer_ids, options):
+        reset_queue_wait_stats()
+        interval = 1 / options['rate']
+        deadline = time.monotonic() + options['seconds']
+        sent = 0
+        while time.monotonic() < deadline:
+            process_customer_event.delay(customer_ids[sent % len(customer_ids)], 'page_view', {'source': 'benchmark'})
+            sent += 1
+            time.sleep(interval)
+        # Let the workers drain what was sent
+        time.sleep(2)
+        return queue_wait_stats()
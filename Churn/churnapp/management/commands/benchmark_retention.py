@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from churnapp.models import Customer, CustomerEvent, AnomalyAlert
+from churnapp.retention import ARCHIVE_DIR, purge_expired
+from datetime import timedelta
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare a single queryset delete with chunked retention on synthetic expired alerts and events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=50000,
+            help='Expired rows to create per run'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Rows deleted per transaction by the chunked purge'
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help=f'Also archive the expired events before deleting them (to {ARCHIVE_DIR})'
+        )
+
+    def handle(self, *args, **options):
+        customer, _ = Customer.objects.get_or_create(
+            customer_id='BENCH_RETENTION',
+            defaults={'name': 'Retention Benchmark', 'email': 'retention@example.com'}
+        )
+        expired_at = timezone.now() - timedelta(days=365)
+        rows = options['rows']
+
+        self.create_alerts(customer, rows, expired_at)
+        started = time.perf_counter()
+        AnomalyAlert.objects.filter(customer=customer).delete()
+        single = time.perf_counter() - started
+        self.stdout.write(f"Single delete(): {rows} alerts in {single:.2f}s ({rows / single:.0f} rows/s)")
+
+        self.create_alerts(customer, rows, expired_at)
+        stats = purge_expired('anomaly_alerts', chunk_size=options['chunk_size'], customer=customer)
+        self.stdout.write(self.style.SUCCESS(
+            f"Chunked purge: {stats['deleted']} alerts in {stats['chunks']} transactions, "
+            f"{stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)"
+        ))
+
+        CustomerEvent.objects.bulk_create(
+            [
+                CustomerEvent(customer=customer, event_type='page_view', metadata={'page': f'/p/{i % 50}'}, timestamp=expired_at)
+                for i in range(rows)
+            ],
+            batch_size=5000
+        )
+        stats = purge_expired('events', chunk_size=options['chunk_size'], archive=options['archive'], customer=customer)
+        archived = f", {len(stats['archived_files'])} archive files" if options['archive'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"Chunked purge: {stats['deleted']} events in {stats['chunks']} transactions{archived}, "
+            f"{stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)"
+        ))
+
+    def create_alerts(self, customer, rows, expired_at):
+        AnomalyAlert.objects.bulk_create(
+            [
+                AnomalyAlert(customer=customer, alert_type='login_drop', severity='low',
+                             description='Benchmark alert', anomaly_score=-0.5)
+                for _ in range(rows)
+            ],
+            batch_size=5000
+        )
+        AnomalyAlert.objects.filter(customer=customer).update(detected_at=expired_at)
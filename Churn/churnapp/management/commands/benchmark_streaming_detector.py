@@ -0,0 +1,75 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from churnapp.models import Customer, CustomerBehaviorBaseline
+from churnapp.anomaly_detection import CustomerAnomalyDetector, build_feature_matrix
+from churnapp.baselines import EMPTY_DAY, ROBUST_METRICS, fold_day
+from churnapp.streaming_detection import StreamingAnomalyDetector
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare streaming robust z-score updates with IsolationForest refits: update cost and alert overlap'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customers',
+            type=int,
+            default=5000,
+            help='Customers to score (and refit the forest on)'
+        )
+        parser.add_argument(
+            '--updates',
+            type=int,
+            default=100000,
+            help='Synthetic daily updates to time for the streaming detector'
+        )
+
+    def handle(self, *args, **options):
+        self.benchmark_update_cost(options['updates'])
+
+        customer_ids = list(Customer.objects.order_by('id').values_list('id', flat=True)[:options['customers']])
+        if not customer_ids:
+            self.stdout.write(self.style.WARNING('No customers found. Run populate_sample_data first.'))
+            return
+        if not CustomerBehaviorBaseline.objects.filter(customer_id__in=customer_ids).exists():
+            self.stdout.write(self.style.WARNING('No baselines yet; run update_customer_baselines so the streaming detector has state.'))
+
+        forest = CustomerAnomalyDetector()
+        started = time.perf_counter()
+        if not forest.build_baseline_model(customer_sample_size=None, min_events=1):
+            self.stdout.write(self.style.WARNING('Not enough events to fit the IsolationForest.'))
+            return
+        refit_seconds = time.perf_counter() - started
+
+        ids, X = build_feature_matrix(customer_ids, days_back=7)
+        forest_flags = forest.score_matrix(ids, X) < 0
+        streaming_flags = StreamingAnomalyDetector().score_matrix(ids, X) < 0
+
+        both = int((forest_flags & streaming_flags).sum())
+        either = int((forest_flags | streaming_flags).sum())
+        self.stdout.write(f"IsolationForest full refit: {refit_seconds:.2f}s over {forest.n_samples} customers")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ids)} customers: forest flags {int(forest_flags.sum())}, streaming flags {int(streaming_flags.sum())}, "
+            f"both {both}, overlap (Jaccard) {both / either if either else 1.0:.2f}"
+        ))
+
+    def benchmark_update_cost(self, updates):
+        rng = random.Random(42)
+        day = timezone.localdate() - timedelta(days=1)
+        baselines = [CustomerBehaviorBaseline(customer_id=i) for i in range(1000)]
+        observations = [
+            {**EMPTY_DAY, 'logins': rng.randint(0, 5), 'purchases': rng.randint(0, 2),
+             'engagement': rng.randint(0, 30), 'problems': rng.randint(0, 1), 'cart_abandons': rng.randint(0, 1)}
+            for _ in range(1000)
+        ]
+
+        started = time.perf_counter()
+        for update in range(updates):
+            fold_day(baselines[update % 1000], day, observations[update % 1000])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Streaming update: {elapsed / updates * 1e6:.1f} us per customer-day "
+            f"({updates / elapsed:.0f} updates/s), state: {len(ROBUST_METRICS)} (median, MAD) pairs per customer"
+        )
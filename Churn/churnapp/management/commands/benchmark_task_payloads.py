@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from churnapp.models import Customer
+from churnapp.anomaly_detection import anomaly_detector
+from churnapp.pipeline import anomaly_context, anomaly_payload, customer_prediction_features
+from churnapp.utils import predict_with_explainability
+from kombu.serialization import dumps
+import pickle
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare bytes per task and serialization time of the raw and compact payloads of the detection follow-ups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=2000,
+            help='Serializations timed per payload'
+        )
+
+    def handle(self, *args, **options):
+        customer = Customer.objects.order_by('id').first()
+        if customer is None:
+            self.stdout.write(self.style.WARNING('No customers found. Run populate_sample_data first.'))
+            return
+
+        result = anomaly_detector.detect_anomaly(customer)
+        if result is None:
+            self.stdout.write(self.style.WARNING('No trained anomaly model available. Run the train_anomaly_model task.'))
+            return
+        prediction = predict_with_explainability(customer_prediction_features(customer))
+
+        # Task message bodies are (args, kwargs, embed); results are stored as-is
+        payloads = [
+            ('send_anomaly_notification args',
+             ((customer.id, result), {}, {}),
+             ((customer.id, anomaly_payload(result)), {}, {})),
+            ('trigger_churn_prediction args',
+             ((customer.id,), {'anomaly_context': result}, {}),
+             ((customer.id,), {'anomaly_context': anomaly_context(result)}, {})),
+            ('trigger_churn_prediction result',
+             {'customer_id': customer.id, 'churn_probability': prediction['churn_probability'], 'prediction_result': prediction},
+             {'customer_id': customer.id, 'churn_probability': prediction['churn_probability'], 'prediction_id': 1}),
+        ]
+        for label, before, after in payloads:
+            self.stdout.write(f"{label}:")
+            self.stdout.write(f"  raw:     {self.measure(before, options['iterations'])}")
+            self.stdout.write(self.style.SUCCESS(f"  compact: {self.measure(after, options['iterations'])}"))
+
+    def measure(self, payload, iterations):
+        try:
+            body = dumps(payload, serializer='json')[2]
+        except Exception as exc:
+            # What the pickle serializer would have had to ship instead
+            size = len(pickle.dumps(payload))
+            return f"not JSON-serializable ({type(exc).__name__}); {size} bytes pickled"
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            dumps(payload, serializer='json')
+        per_call = (time.perf_counter() - started) / iterations * 1e6
+        return f"{len(body)} bytes, {per_call:.1f} us to serialize"
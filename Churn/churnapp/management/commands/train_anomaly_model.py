@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from churnapp.anomaly_detection import fit_and_publish_anomaly_model
+
+
+class Command(BaseCommand):
+    help = 'Fit the anomaly detection model and publish it as a new version for all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sample-size',
+            type=int,
+            default=10000,
+            help='Number of customers to fit on (0 = every eligible customer)'
+        )
+        parser.add_argument(
+            '--sampling',
+            choices=['stratified', 'random'],
+            default='stratified',
+            help='How customers are sampled from the population'
+        )
+
+    def handle(self, *args, **options):
+        sample_size = options['sample_size'] or None
+        metadata = fit_and_publish_anomaly_model(sample_size, options['sampling'])
+
+        if metadata is None:
+            self.stdout.write(self.style.WARNING('Insufficient customer data; no model published.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Published anomaly model version {metadata['version']} "
+            f"({metadata['n_samples']} customers, fitted at {metadata['fitted_at']})"
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customerevent',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0002_alter_customerevent_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerbehaviorbaseline',
+            name='last_observed_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
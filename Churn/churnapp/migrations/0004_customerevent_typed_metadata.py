@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0003_customerbehaviorbaseline_last_observed_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerevent',
+            name='amount',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerevent',
+            name='category',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerevent',
+            name='error_code',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='customerevent',
+            index=models.Index(fields=['event_type', 'amount'], name='churnapp_cu_event_t_6caec2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerevent',
+            index=models.Index(fields=['event_type', 'error_code'], name='churnapp_cu_event_t_6d9985_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerevent',
+            index=models.Index(fields=['event_type', 'category'], name='churnapp_cu_event_t_5d9f59_idx'),
+        ),
+    ]
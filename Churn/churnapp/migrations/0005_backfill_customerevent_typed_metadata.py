@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import Q
+
+BATCH_SIZE = 5000
+
+
+def _text(metadata, key):
+    value = metadata.get(key)
+    return str(value)[:50] if value is not None else None
+
+
+def backfill_typed_metadata(apps, schema_editor):
+    """Copy amount / error_code / category out of metadata in id-ordered batches"""
+    CustomerEvent = apps.get_model('churnapp', 'CustomerEvent')
+    pending = CustomerEvent.objects.filter(
+        Q(metadata__has_key='amount') | Q(metadata__has_key='error_code') | Q(metadata__has_key='category')
+    ).order_by('id').only('id', 'metadata')
+
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        for event in batch:
+            metadata = event.metadata if isinstance(event.metadata, dict) else {}
+            try:
+                event.amount = float(metadata['amount'])
+            except (KeyError, TypeError, ValueError):
+                event.amount = None
+            event.error_code = _text(metadata, 'error_code')
+            event.category = _text(metadata, 'category')
+        CustomerEvent.objects.bulk_update(batch, ['amount', 'error_code', 'category'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0004_customerevent_typed_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_typed_metadata, migrations.RunPython.noop),
+    ]
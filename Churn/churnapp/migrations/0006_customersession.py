@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0005_backfill_customerevent_typed_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('duration_minutes', models.FloatField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='churnapp.customer')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='customersession',
+            constraint=models.UniqueConstraint(fields=('customer', 'started_at'), name='unique_customer_session_start'),
+        ),
+    ]
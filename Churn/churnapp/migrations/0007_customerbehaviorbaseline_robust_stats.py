@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0006_customersession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerbehaviorbaseline',
+            name='robust_stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0007_customerbehaviorbaseline_robust_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerbehaviorbaseline',
+            name='quantile_sketches',
+            field=models.BinaryField(blank=True, default=bytes),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0008_customerbehaviorbaseline_quantile_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformIncident',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('login', 'User Login'), ('logout', 'User Logout'), ('purchase', 'Purchase Made'), ('cart_add', 'Item Added to Cart'), ('cart_abandon', 'Cart Abandoned'), ('payment_failed', 'Payment Failed'), ('support_ticket', 'Support Ticket Created'), ('app_crash', 'App Crash'), ('page_view', 'Page View'), ('search', 'Search Performed')], max_length=20)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('resolved', 'Resolved')], default='active', max_length=10)),
+                ('severity', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical')], max_length=10)),
+                ('description', models.TextField()),
+                ('expected_per_minute', models.FloatField()),
+                ('peak_per_minute', models.IntegerField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['status', 'event_type'], name='churnapp_pl_status_bc0720_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0009_platformincident'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='realtimewatchlist',
+            name='anomaly_context',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='realtimewatchlist',
+            name='churn_probability',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='realtimewatchlist',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='realtimewatchlist',
+            name='risk_level',
+            field=models.CharField(default='medium', max_length=10),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('churnapp', '0010_realtimewatchlist_prediction_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChurnPrediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('churn_probability', models.FloatField()),
+                ('risk_level', models.CharField(blank=True, max_length=10)),
+                ('result', models.JSONField(default=dict)),
+                ('anomaly_context', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='churn_predictions', to='churnapp.customer')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['customer', 'created_at'], name='churnapp_ch_custome_857076_idx')],
+            },
+        ),
+    ]
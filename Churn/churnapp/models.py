@@ -41,11 +41,19 @@ class CustomerEvent(models.Model):
     
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='events')
     event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Defaults to now but can be set explicitly, so buffered events keep the
+    # time they were received rather than the time they were flushed
+    timestamp = models.DateTimeField(default=timezone.now)
     
     # Event metadata (JSON field for flexible data storage)
     metadata = models.JSONField(default=dict, blank=True)
     
+    # Hot metadata keys promoted to typed columns so SQL can filter and
+    # aggregate them; filled from metadata on save and at bulk ingestion
+    amount = models.FloatField(null=True, blank=True)
+    error_code = models.CharField(max_length=50, null=True, blank=True)
+    category = models.CharField(max_length=50, null=True, blank=True)
+    
     # Processed flag for anomaly detection
     processed = models.BooleanField(default=False)
     
@@ -54,8 +62,34 @@ class CustomerEvent(models.Model):
         indexes = [
             models.Index(fields=['customer', 'event_type', 'timestamp']),
             models.Index(fields=['processed', 'timestamp']),
+            models.Index(fields=['event_type', 'amount']),
+            models.Index(fields=['event_type', 'error_code']),
+            models.Index(fields=['event_type', 'category']),
         ]
     
+    @staticmethod
+    def typed_metadata(metadata):
+        """Typed column values for the promoted metadata keys; malformed values become None"""
+        metadata = metadata if isinstance(metadata, dict) else {}
+        try:
+            amount = float(metadata['amount'])
+        except (KeyError, TypeError, ValueError):
+            amount = None
+        
+        def text(key):
+            value = metadata.get(key)
+            return str(value)[:50] if value is not None else None
+        
+        return {'amount': amount, 'error_code': text('error_code'), 'category': text('category')}
+    
+    def fill_typed_fields(self):
+        for field, value in self.typed_metadata(self.metadata).items():
+            setattr(self, field, value)
+    
+    def save(self, *args, **kwargs):
+        self.fill_typed_fields()
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.customer.name} - {self.event_type} at {self.timestamp}"
 
@@ -115,6 +149,51 @@ class AnomalyAlert(models.Model):
     def __str__(self):
         return f"{self.customer.name} - {self.alert_type} ({self.severity})"
 
+class PlatformIncident(models.Model):
+    """Platform-wide spike of one event type, alerted once instead of per customer"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('resolved', 'Resolved'),
+    ]
+
+    event_type = models.CharField(max_length=20, choices=CustomerEvent.EVENT_TYPES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    severity = models.CharField(max_length=10, choices=AnomalyAlert.SEVERITY_LEVELS)
+    description = models.TextField()
+
+    # Events per minute expected by the EWMA and the highest minute seen
+    expected_per_minute = models.FloatField()
+    peak_per_minute = models.IntegerField()
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(default=timezone.now)  # Last minute still above threshold
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['status', 'event_type']),
+        ]
+
+    def __str__(self):
+        return f"Platform incident: {self.event_type} ({self.status})"
+
+class CustomerSession(models.Model):
+    """Completed login/logout session, persisted so features need not re-pair events"""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='sessions')
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    duration_minutes = models.FloatField()
+    
+    class Meta:
+        ordering = ['-started_at']
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'started_at'], name='unique_customer_session_start'),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer.name} session at {self.started_at} ({self.duration_minutes:.1f} min)"
+
 class CustomerBehaviorBaseline(models.Model):
     """Store baseline behavior patterns for anomaly detection"""
     customer = models.OneToOneField(Customer, on_delete=models.CASCADE, related_name='baseline')
@@ -122,7 +201,7 @@ class CustomerBehaviorBaseline(models.Model):
     # Login patterns
     avg_logins_per_day = models.FloatField(default=0.0)
     std_logins_per_day = models.FloatField(default=0.0)
-    typical_login_hours = models.JSONField(default=list)  # List of typical hours
+    typical_login_hours = models.JSONField(default=list)  # Decayed logins per hour of day (24 buckets)
     
     # Purchase patterns
     avg_purchases_per_week = models.FloatField(default=0.0)
@@ -137,9 +216,15 @@ class CustomerBehaviorBaseline(models.Model):
     avg_page_views_per_session = models.FloatField(default=0.0)
     avg_searches_per_session = models.FloatField(default=0.0)
     
+    # Streaming {metric: [median, mad]} of daily counts for the streaming detector
+    robust_stats = models.JSONField(default=dict, blank=True)
+    # Packed P5/P95 P-squared sketches of daily counts (see sketches.MetricSketches)
+    quantile_sketches = models.BinaryField(default=bytes, blank=True)
+    
     # Update tracking
     last_updated = models.DateTimeField(auto_now=True)
-    data_points_count = models.IntegerField(default=0)
+    data_points_count = models.IntegerField(default=0)  # Days folded into the baseline
+    last_observed_date = models.DateField(null=True, blank=True)  # Last closed day folded in
     
     def __str__(self):
         return f"Baseline for {self.customer.name}"
@@ -160,6 +245,12 @@ class RealTimeWatchlist(models.Model):
     check_frequency_minutes = models.IntegerField(default=5)  # How often to check for anomalies
     alert_threshold = models.FloatField(default=0.7)  # Anomaly score threshold
     
+    # Latest prediction that put or kept the customer on the watchlist
+    churn_probability = models.FloatField(default=0.0)
+    risk_level = models.CharField(max_length=10, default='medium')
+    anomaly_context = models.JSONField(default=dict, blank=True)
+    last_updated = models.DateTimeField(auto_now=True)
+    
     is_active = models.BooleanField(default=True)
     
     class Meta:
@@ -168,6 +259,27 @@ class RealTimeWatchlist(models.Model):
     def __str__(self):
         return f"Watching {self.customer.name} - {self.priority} priority"
 
+class ChurnPrediction(models.Model):
+    """Full output of a triggered churn prediction, kept here instead of the task result backend"""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='churn_predictions')
+    churn_probability = models.FloatField()
+    risk_level = models.CharField(max_length=10, blank=True)
+    
+    # predict_with_explainability output (SHAP values, explanations, ...)
+    result = models.JSONField(default=dict)
+    anomaly_context = models.JSONField(default=dict, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Churn prediction for {self.customer.name}: {self.churn_probability:.3f}"
+
 class CustomerProfile(models.Model):
     """Store customer data and churn history"""
     customer_id = models.CharField(max_length=100, unique=True)
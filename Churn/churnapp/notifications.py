@@ -0,0 +1,127 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Notifications to the same WebSocket group within a tick are sent as one
+# batched message; 0 sends every notification immediately
+NOTIFICATION_TICK_MS = getattr(settings, 'CHURN_NOTIFICATION_TICK_MS', 100)
+NOTIFICATION_MAX_BATCH = getattr(settings, 'CHURN_NOTIFICATION_MAX_BATCH', 500)
+
+
+class NotificationBatcher:
+    """
+    Per-process batcher for channel layer notifications. send() only queues
+    the message; a background thread flushes every tick, sending one
+    '<handler>_batch' message per (group, handler) with all messages queued
+    since the last flush, or the plain message when there is just one. All
+    groups of a tick go out through a single async_to_sync bridge.
+    """
+
+    def __init__(self, tick_ms, max_batch, autostart=True):
+        self.tick = tick_ms / 1000
+        self.max_batch = max_batch
+        self.autostart = autostart
+
+        self._pending = defaultdict(list)  # (group, handler) -> messages
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._exit_hook_registered = False
+
+        self._stats = {'messages': 0, 'group_sends': 0, 'flush_count': 0, 'send_errors': 0}
+
+    def start(self):
+        """Start the background flusher (idempotent); flushes again on exit"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='churn-notifications', daemon=True)
+            self._thread.start()
+            if not self._exit_hook_registered:
+                atexit.register(self.stop)
+                self._exit_hook_registered = True
+
+    def stop(self):
+        """Stop the flusher and send everything still queued"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def send(self, group, handler, message):
+        """Queue a message for a consumer handler of a WebSocket group"""
+        # A forked worker inherits the object but not the thread
+        if self.autostart and (self._thread is None or not self._thread.is_alive()):
+            self.start()
+
+        with self._lock:
+            queued = self._pending[(group, handler)]
+            queued.append(message)
+            self._stats['messages'] += 1
+            full = len(queued) >= self.max_batch
+
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Send queued messages, one group_send per (group, handler); returns group sends made"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(list)
+            if not pending:
+                return 0
+
+            sends = [
+                (group, {'type': handler, 'message': messages[0]}) if len(messages) == 1
+                else (group, {'type': f'{handler}_batch', 'messages': messages})
+                for (group, handler), messages in pending.items()
+            ]
+            try:
+                async_to_sync(self._send_all)(sends)
+            except Exception as exc:
+                with self._lock:
+                    self._stats['send_errors'] += 1
+                logger.error(f"Error sending {len(sends)} batched notifications: {exc}")
+                return 0
+
+            with self._lock:
+                self._stats['group_sends'] += len(sends)
+                self._stats['flush_count'] += 1
+            return len(sends)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = sum(len(messages) for messages in self._pending.values())
+        stats['messages_per_send'] = round(stats['messages'] / stats['group_sends'], 2) if stats['group_sends'] else 0.0
+        return stats
+
+    async def _send_all(self, sends):
+        layer = get_channel_layer()
+        for group, payload in sends:
+            await layer.group_send(group, payload)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.tick)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                logger.error(f"Error in notification flusher: {exc}")
+
+
+# Global batcher instance
+notification_batcher = NotificationBatcher(tick_ms=NOTIFICATION_TICK_MS, max_batch=NOTIFICATION_MAX_BATCH)
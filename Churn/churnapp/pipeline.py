@@ -0,0 +1,154 @@
+from django.conf import settings
+from django.utils import timezone
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+import logging
+
+from .models import RealTimeWatchlist
+from .utils import predict_churn_probability
+from .notifications import notification_batcher, NOTIFICATION_TICK_MS
+
+logger = logging.getLogger(__name__)
+
+# Run prediction, watchlist and WebSocket updates inside the detection task,
+# passing the loaded customer forward, instead of chaining one task per stage
+FUSED_PIPELINE = getattr(settings, 'CHURN_FUSED_PIPELINE', False)
+
+CHURN_PREDICTION_SCORE = -0.7  # anomaly score below which churn is re-predicted
+WATCHLIST_PROBABILITY = 0.32   # churn probability that puts a customer on the watchlist
+
+
+def customer_prediction_features(customer):
+    """Churn model input for a customer (sample defaults where the profile lacks a field)"""
+    return {
+        'Tenure': getattr(customer, 'tenure', 12),
+        'PreferredLoginDevice': getattr(customer, 'preferred_login_device', 'Mobile Phone'),
+        'CityTier': getattr(customer, 'city_tier', 1),
+        'WarehouseToHome': getattr(customer, 'warehouse_to_home', 15.0),
+        'PreferredPaymentMode': getattr(customer, 'preferred_payment_mode', 'Debit Card'),
+        'Gender': getattr(customer, 'gender', 'Male'),
+        'HourSpendOnApp': getattr(customer, 'hour_spend_on_app', 3.0),
+        'NumberOfDeviceRegistered': getattr(customer, 'number_of_device_registered', 3),
+        'PreferedOrderCat': getattr(customer, 'prefered_order_cat', 'Laptop & Accessory'),
+        'SatisfactionScore': getattr(customer, 'satisfaction_score', 3),
+        'MaritalStatus': getattr(customer, 'marital_status', 'Single'),
+        'NumberOfAddress': getattr(customer, 'number_of_address', 2),
+        'Complain': getattr(customer, 'complain', 0),
+        'OrderAmountHikeFromlastYear': getattr(customer, 'order_amount_hike_from_last_year', 15.0),
+        'CouponUsed': getattr(customer, 'coupon_used', 5),
+        'OrderCount': getattr(customer, 'order_count', 3),
+        'DaySinceLastOrder': getattr(customer, 'day_since_last_order', 5),
+        'CashbackAmount': getattr(customer, 'cashback_amount', 150.0)
+    }
+
+
+def upsert_watchlist_entry(customer, churn_probability, anomaly_context=None):
+    """Put a customer on the watchlist or refresh their entry; returns (entry, created)"""
+    fields = {
+        'churn_probability': churn_probability,
+        'risk_level': 'high' if churn_probability >= 0.6 else 'medium',
+        'anomaly_context': anomaly_context or {},
+        'is_active': True
+    }
+    entry, created = RealTimeWatchlist.objects.get_or_create(
+        customer=customer,
+        defaults={**fields, 'reason': 'High churn risk after behavioral anomaly'}
+    )
+    if not created:
+        for field, value in fields.items():
+            setattr(entry, field, value)
+        entry.save(update_fields=[*fields, 'last_updated'])
+    return entry, created
+
+
+def anomaly_context(result):
+    """JSON-safe summary of a detection result to keep on the watchlist entry"""
+    return {
+        'anomaly_score': float(result['anomaly_score']),
+        'anomaly_types': [detail['type'] for detail in result['anomaly_details']],
+        'detected_at': timezone.now().isoformat()
+    }
+
+
+def anomaly_payload(result):
+    """
+    Compact task payload for a detection result: scalars and alert details
+    only, as plain floats (the raw result holds the Customer, the feature
+    vector and the baseline)
+    """
+    return {
+        'anomaly_score': float(result['anomaly_score']),
+        'anomaly_details': [
+            {
+                'type': detail['type'],
+                'severity': detail['severity'],
+                'description': detail.get('description', ''),
+                'current_value': float(detail['current_value']) if detail.get('current_value') is not None else None,
+                'baseline_value': float(detail['baseline_value']) if detail.get('baseline_value') is not None else None
+            }
+            for detail in result['anomaly_details']
+        ]
+    }
+
+
+def anomaly_message(customer, result):
+    return {
+        'type': 'anomaly_detected',
+        'customer_id': customer.id,
+        'customer_name': customer.name,
+        'anomaly_score': result['anomaly_score'],
+        'anomaly_details': result['anomaly_details'],
+        'timestamp': timezone.now().isoformat(),
+        'severity': 'high' if result['anomaly_score'] < CHURN_PREDICTION_SCORE else 'medium'
+    }
+
+
+def watchlist_message(customer, entry, action):
+    return {
+        'type': 'watchlist_update',
+        'action': action,  # 'added', 'updated', 'removed'
+        'customer_id': customer.id,
+        'customer_name': customer.name,
+        'churn_probability': entry.churn_probability,
+        'risk_level': entry.risk_level,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+def group_send(group, handler, message):
+    """Send a message to a WebSocket group, batched with others in the same tick unless batching is off"""
+    if NOTIFICATION_TICK_MS:
+        notification_batcher.send(group, handler, message)
+    else:
+        async_to_sync(get_channel_layer().group_send)(group, {'type': handler, 'message': message})
+
+
+def run_fused_followups(customer, result):
+    """
+    Follow up an anomalous detection result in the calling task: notify,
+    re-predict churn for severe anomalies and update the watchlist, reusing
+    the customer already loaded for detection. Only the churn probability is
+    computed; the full SHAP explanation stays with the prediction endpoint.
+    Failures are logged rather than raised: a retry of the detection task
+    would broadcast the alert again.
+    """
+    outcome = {'churn_probability': None, 'watchlisted': False}
+    try:
+        group_send('alerts', 'send_alert', anomaly_message(customer, result))
+    except Exception as exc:
+        logger.error(f"Could not send anomaly alert for {customer.name}: {exc}")
+    if result['anomaly_score'] >= CHURN_PREDICTION_SCORE:
+        return outcome
+
+    try:
+        churn_probability = predict_churn_probability(customer_prediction_features(customer))
+        outcome['churn_probability'] = churn_probability
+        if churn_probability >= WATCHLIST_PROBABILITY:
+            entry, created = upsert_watchlist_entry(customer, churn_probability, anomaly_context(result))
+            outcome['watchlisted'] = True
+            group_send('watchlist', 'send_update', watchlist_message(customer, entry, 'added' if created else 'updated'))
+    except Exception as exc:
+        logger.error(f"Fused follow-up failed for {customer.name}: {exc}")
+        return outcome
+    logger.info(f"Fused follow-up for {customer.name}: churn probability {churn_probability:.3f}")
+    return outcome
@@ -0,0 +1,100 @@
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+import logging
+
+from .caching import _incr
+
+logger = logging.getLogger(__name__)
+
+QUEUES = ('realtime', 'bulk')
+
+# Upper bounds (ms) of the queue wait histogram buckets; the last is open
+WAIT_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000, 300000]
+
+SENT_AT_HEADER = 'churn_sent_at'
+BUCKET_KEY = 'churnapp:queue_wait:{}:{}'  # queue, bucket index
+TOTAL_KEY = 'churnapp:queue_wait_total_ms:{}'
+
+
+def _bucket(wait_ms):
+    for index, bound in enumerate(WAIT_BUCKETS_MS):
+        if wait_ms <= bound:
+            return index
+    return len(WAIT_BUCKETS_MS)
+
+
+def record_queue_wait(queue, wait_seconds):
+    """Count one task that waited wait_seconds in a queue before a worker started it"""
+    wait_ms = max(wait_seconds, 0) * 1000
+    try:
+        _incr(BUCKET_KEY.format(queue, _bucket(wait_ms)))
+        _incr(TOTAL_KEY.format(queue), int(wait_ms))
+    except Exception as exc:
+        logger.warning(f"Could not record queue wait for {queue}: {exc}")
+
+
+def _percentile(counts, q):
+    """Upper bound of the bucket holding the q-quantile (None when it is the open bucket)"""
+    rank = q * sum(counts)
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if count and seen >= rank:
+            return WAIT_BUCKETS_MS[index] if index < len(WAIT_BUCKETS_MS) else None
+    return 0
+
+
+def queue_wait_stats(queues=QUEUES):
+    """Tasks started and their queue wait percentiles (bucket upper bounds, ms) per queue"""
+    stats = {}
+    for queue in queues:
+        keys = [BUCKET_KEY.format(queue, index) for index in range(len(WAIT_BUCKETS_MS) + 1)]
+        stored = cache.get_many(keys + [TOTAL_KEY.format(queue)])
+        counts = [stored.get(key, 0) for key in keys]
+        started = sum(counts)
+        stats[queue] = {
+            'tasks': started,
+            'mean_ms': round(stored.get(TOTAL_KEY.format(queue), 0) / started, 1) if started else 0.0,
+            'p50_ms': _percentile(counts, 0.50),
+            'p95_ms': _percentile(counts, 0.95),
+            'p99_ms': _percentile(counts, 0.99),
+        }
+    return stats
+
+
+def reset_queue_wait_stats(queues=QUEUES):
+    cache.delete_many([
+        key
+        for queue in queues
+        for key in [BUCKET_KEY.format(queue, index) for index in range(len(WAIT_BUCKETS_MS) + 1)] + [TOTAL_KEY.format(queue)]
+    ])
+
+
+def stamp_sent_at(headers=None, **kwargs):
+    if headers is not None:
+        headers[SENT_AT_HEADER] = time.time()
+
+
+def measure_queue_wait(task=None, **kwargs):
+    request = task.request
+    sent_at = request.get(SENT_AT_HEADER)
+    if sent_at is None or request.is_eager:
+        return
+    # Countdown and ETA tasks are only due at their ETA
+    if request.eta:
+        eta = request.eta if isinstance(request.eta, datetime) else datetime.fromisoformat(request.eta)
+        sent_at = max(sent_at, eta.timestamp())
+    queue = (request.delivery_info or {}).get('routing_key') or 'unknown'
+    record_queue_wait(queue, time.time() - sent_at)
+
+
+try:
+    from celery.signals import before_task_publish, task_prerun
+    before_task_publish.connect(stamp_sent_at)
+    task_prerun.connect(measure_queue_wait)
+except ImportError:
+    # Celery not available (or shadowed by the project's celery.py when run
+    # through manage.py): nothing is published or run, so nothing to measure
+    pass
@@ -0,0 +1,127 @@
+import json
+import os
+import time
+from datetime import timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+import logging
+
+import numpy as np
+
+from .models import CustomerEvent, AnomalyAlert, ChurnAlert, ChurnPrediction, RealTimeWatchlist
+from .caching import bump_table_version
+
+logger = logging.getLogger(__name__)
+
+# What expires, by which timestamp and after how many days; cache_table is the
+# cached listing to invalidate once per run instead of once per deleted row
+RETENTION_POLICIES = {
+    'events': {'model': CustomerEvent, 'field': 'timestamp', 'days': 90, 'filters': {}, 'cache_table': None},
+    'anomaly_alerts': {'model': AnomalyAlert, 'field': 'detected_at', 'days': 30, 'filters': {}, 'cache_table': 'alerts'},
+    'churn_alerts': {'model': ChurnAlert, 'field': 'created_at', 'days': 90, 'filters': {}, 'cache_table': None},
+    'predictions': {'model': ChurnPrediction, 'field': 'created_at', 'days': 90, 'filters': {}, 'cache_table': None},
+    'watchlist': {'model': RealTimeWatchlist, 'field': 'last_updated', 'days': 7, 'filters': {'is_active': False}, 'cache_table': 'watchlist'},
+}
+for _name, _days in getattr(settings, 'CHURN_RETENTION_DAYS', {}).items():
+    RETENTION_POLICIES[_name]['days'] = _days
+
+RETENTION_CHUNK_SIZE = getattr(settings, 'CHURN_RETENTION_CHUNK_SIZE', 5000)
+ARCHIVE_EXPIRED_EVENTS = getattr(settings, 'CHURN_ARCHIVE_EXPIRED_EVENTS', False)
+ARCHIVE_DIR = Path(getattr(settings, 'CHURN_EVENT_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'event_archive')))
+
+EVENT_ARCHIVE_COLUMNS = ['id', 'customer_id', 'event_type', 'timestamp', 'metadata', 'amount', 'error_code', 'category', 'processed']
+
+
+def write_event_archive(rows, path):
+    """
+    Write CustomerEvent value rows (EVENT_ARCHIVE_COLUMNS order) as a
+    compressed columnar .npz file: one array per column, timestamps as UTC
+    datetime64[us], metadata as JSON text, a missing amount as NaN and a
+    missing error code or category as ''. The file is written under a
+    temporary name and renamed, so a present archive is always complete.
+    """
+    ids, customer_ids, event_types, timestamps, metadata, amounts, error_codes, categories, processed = zip(*rows)
+    columns = {
+        'id': np.array(ids, dtype=np.int64),
+        'customer_id': np.array(customer_ids, dtype=np.int64),
+        'event_type': np.array(event_types, dtype=str),
+        'timestamp': np.array([timezone.make_naive(t, dt_timezone.utc) for t in timestamps], dtype='datetime64[us]'),
+        'metadata': np.array([json.dumps(m, separators=(',', ':')) for m in metadata], dtype=str),
+        'amount': np.array([np.nan if a is None else a for a in amounts], dtype=np.float64),
+        'error_code': np.array([c or '' for c in error_codes], dtype=str),
+        'category': np.array([c or '' for c in categories], dtype=str),
+        'processed': np.array(processed, dtype=bool),
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.partial')
+    with open(partial, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    os.replace(partial, path)
+    return path
+
+
+def read_event_archive(path):
+    """Columns of an event archive as a dict of arrays"""
+    with np.load(path, allow_pickle=False) as archive:
+        return {column: archive[column] for column in archive.files}
+
+
+def purge_expired(policy_name, chunk_size=None, archive=None, now=None, **filters):
+    """
+    Delete the rows of a retention policy older than its cutoff in primary
+    key chunks. Each chunk reads up to chunk_size expired ids past the last
+    one seen and deletes exactly those in its own short transaction, with a
+    plain DELETE ... WHERE id IN (...): rows are not loaded and no
+    per-row delete signals run (nothing references these tables). With
+    archive, expired events are written to a columnar archive before their
+    chunk is deleted. Extra filters narrow the purge, e.g. to one customer.
+    """
+    policy = RETENTION_POLICIES[policy_name]
+    model = policy['model']
+    chunk_size = chunk_size or RETENTION_CHUNK_SIZE
+    archive = ARCHIVE_EXPIRED_EVENTS if archive is None else archive
+    if archive and model is not CustomerEvent:
+        raise ValueError(f"Archiving is only supported for events, not {policy_name}")
+
+    cutoff = (now or timezone.now()) - timedelta(days=policy['days'])
+    expired = model.objects.filter(**{f"{policy['field']}__lt": cutoff}, **policy['filters'], **filters).order_by()
+    db = router.db_for_write(model)
+
+    started = time.perf_counter()
+    deleted = chunks = 0
+    archived_files = []
+    last_pk = 0
+    while True:
+        chunk_ids = list(expired.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not chunk_ids:
+            break
+        last_pk = chunk_ids[-1]
+
+        with transaction.atomic(using=db):
+            chunk = expired.filter(pk__in=chunk_ids)
+            if archive:
+                rows = list(chunk.order_by('pk').values_list(*EVENT_ARCHIVE_COLUMNS))
+                if rows:
+                    path = ARCHIVE_DIR / f"events-{cutoff:%Y%m%d}-{rows[0][0]}-{rows[-1][0]}.npz"
+                    archived_files.append(str(write_event_archive(rows, path)))
+            deleted += chunk._raw_delete(db)
+        chunks += 1
+
+    if deleted and policy['cache_table']:
+        bump_table_version(policy['cache_table'])
+
+    seconds = time.perf_counter() - started
+    stats = {
+        'deleted': deleted,
+        'chunks': chunks,
+        'archived_files': archived_files,
+        'cutoff': cutoff.isoformat(),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(deleted / seconds, 1) if seconds > 0 else 0.0,
+    }
+    logger.info(f"Retention {policy_name}: deleted {deleted} rows in {chunks} chunks ({stats['rows_per_second']} rows/s)")
+    return stats
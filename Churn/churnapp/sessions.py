@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg
+from django.utils import timezone
+import logging
+
+from .models import CustomerEvent, CustomerSession
+
+logger = logging.getLogger(__name__)
+
+# A login with no logout within this many minutes is an unterminated
+# session; a logout that late is not paired with it
+MAX_SESSION_MINUTES = getattr(settings, 'CHURN_MAX_SESSION_MINUTES', 12 * 60)
+
+# Serve session features from CustomerSession instead of pairing events
+READ_PERSISTED_SESSIONS = getattr(settings, 'CHURN_PERSISTED_SESSIONS', False)
+
+DEFAULT_SESSION_MINUTES = 30.0
+
+
+class Sessions:
+    """Completed sessions as parallel arrays, ordered by customer then start"""
+
+    def __init__(self, customer_ids, started_at, ended_at):
+        self.customer_ids = customer_ids
+        self.started_at = started_at  # epoch seconds
+        self.ended_at = ended_at
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+    @property
+    def minutes(self):
+        return (self.ended_at - self.started_at) / 60
+
+    def average_minutes(self):
+        """Mean session minutes per customer id"""
+        if not len(self):
+            return {}
+        customers, inverse = np.unique(self.customer_ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.minutes)
+        counts = np.bincount(inverse)
+        return dict(zip(customers.tolist(), (totals / counts).tolist()))
+
+
+def pair_sessions(customer_ids, is_login, timestamps):
+    """
+    Vectorized login/logout pairing over event arrays sorted by customer and
+    time: a logout closes a session when the previous login/logout event of
+    the same customer is a login (the LAG(event_type) rule). A login followed
+    by another login is superseded, stray logouts are ignored and pairs
+    longer than MAX_SESSION_MINUTES are treated as unterminated.
+    """
+    customer_ids = np.asarray(customer_ids, dtype=np.int64)
+    is_login = np.asarray(is_login, dtype=bool)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+
+    closes = (
+        is_login[:-1] & ~is_login[1:]
+        & (customer_ids[:-1] == customer_ids[1:])
+        & (timestamps[1:] - timestamps[:-1] <= MAX_SESSION_MINUTES * 60)
+    )
+    starts = np.flatnonzero(closes)
+    return Sessions(customer_ids[starts], timestamps[starts], timestamps[starts + 1])
+
+
+def sessions_from_events(events):
+    """Pair the login/logout events of a queryset, for one customer or the whole population"""
+    rows = events.filter(event_type__in=['login', 'logout']).order_by(
+        'customer_id', 'timestamp'
+    ).values_list('customer_id', 'event_type', 'timestamp')
+
+    customer_ids, is_login, timestamps = [], [], []
+    for customer_id, event_type, timestamp in rows.iterator(chunk_size=10000):
+        customer_ids.append(customer_id)
+        is_login.append(event_type == 'login')
+        timestamps.append(timestamp.timestamp())
+    return pair_sessions(customer_ids, is_login, timestamps)
+
+
+def average_session_minutes(customer_ids, start_date, end_date):
+    """
+    Mean session minutes per customer for sessions in [start_date, end_date],
+    from persisted sessions when enabled, otherwise by pairing raw events
+    """
+    if READ_PERSISTED_SESSIONS:
+        return dict(
+            CustomerSession.objects.filter(
+                customer_id__in=customer_ids,
+                started_at__gte=start_date,
+                ended_at__lte=end_date
+            ).values('customer_id').annotate(avg=Avg('duration_minutes')).order_by().values_list('customer_id', 'avg')
+        )
+    return sessions_from_events(CustomerEvent.objects.filter(
+        customer_id__in=customer_ids,
+        timestamp__gte=start_date,
+        timestamp__lte=end_date
+    )).average_minutes()
+
+
+def persist_sessions(customer_ids, since=None):
+    """
+    Pair recent login/logout events of customers (None for everyone) and
+    store the sessions completed since `since`; sessions already stored are
+    skipped. Returns the number of completed sessions found.
+    """
+    since = since or timezone.now() - timedelta(minutes=MAX_SESSION_MINUTES)
+    events = CustomerEvent.objects.filter(timestamp__gte=since - timedelta(minutes=MAX_SESSION_MINUTES))
+    if customer_ids is not None:
+        events = events.filter(customer_id__in=customer_ids)
+    sessions = sessions_from_events(events)
+
+    created = CustomerSession.objects.bulk_create(
+        [
+            CustomerSession(
+                customer_id=customer_id,
+                started_at=datetime.fromtimestamp(started, tz=dt_timezone.utc),
+                ended_at=datetime.fromtimestamp(ended, tz=dt_timezone.utc),
+                duration_minutes=minutes
+            )
+            for customer_id, started, ended, minutes in zip(
+                sessions.customer_ids.tolist(), sessions.started_at.tolist(),
+                sessions.ended_at.tolist(), sessions.minutes.tolist()
+            )
+            if ended >= since.timestamp()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+    return len(created)
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Customer, AnomalyAlert, RealTimeWatchlist
+from .caching import bump_table_version
+
+# Customer saves that only touch activity bookkeeping don't change anything
+# the cached listings display, so they must not invalidate them
+ACTIVITY_ONLY_FIELDS = frozenset({'last_activity', 'updated_at'})
+
+
+@receiver([post_save, post_delete], sender=RealTimeWatchlist)
+def watchlist_changed(sender, **kwargs):
+    bump_table_version('watchlist')
+
+
+@receiver([post_save, post_delete], sender=AnomalyAlert)
+def anomaly_alert_changed(sender, **kwargs):
+    bump_table_version('alerts')
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def customer_changed(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= ACTIVITY_ONLY_FIELDS:
+        return
+    bump_table_version('customer')
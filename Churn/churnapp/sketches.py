@@ -0,0 +1,228 @@
+import numpy as np
+
+
+class P2Quantile:
+    """
+    P-squared streaming quantile estimator (Jain & Chlamtac): five markers
+    whose heights track the min, p/2, p, (1+p)/2 quantiles and the max.
+    O(1) time and memory per observation, no samples kept.
+    """
+
+    def __init__(self, p, heights=None, positions=None, count=0):
+        self.p = p
+        self.heights = list(heights) if heights is not None else []
+        self.positions = list(positions) if positions is not None else [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.count = count
+
+    def _desired(self, i):
+        fraction = (0.0, self.p / 2, self.p, (1 + self.p) / 2, 1.0)[i]
+        return 1 + (self.count - 1) * fraction
+
+    def add(self, value):
+        self.count += 1
+        q, n = self.heights, self.positions
+        if self.count <= 5:
+            q.append(float(value))
+            q.sort()
+            return
+
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= value < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+
+        for i in (1, 2, 3):
+            d = self._desired(i) - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Piecewise-parabolic prediction, falling back to linear
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def value(self):
+        if not self.heights:
+            return None
+        if self.count <= 5:
+            # Exact quantile of the few observations seen so far
+            return float(np.quantile(self.heights, self.p))
+        return self.heights[2]
+
+
+# Core daily metrics sketched per customer, and the quantiles kept for each
+SKETCH_METRICS = ['logins', 'purchases', 'problems', 'cart_abandons']
+SKETCH_QUANTILES = (0.05, 0.95)
+_FLOATS_PER_ESTIMATOR = 10  # five heights, five positions
+
+
+class MetricSketches:
+    """
+    P5/P95 sketches of each core daily metric, packed as float32 for
+    storage on CustomerBehaviorBaseline (324 bytes for four metrics)
+    """
+
+    def __init__(self, count=0, estimators=None):
+        self.count = count
+        self.estimators = estimators or {
+            metric: [P2Quantile(p) for p in SKETCH_QUANTILES] for metric in SKETCH_METRICS
+        }
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data:
+            return cls()
+        values = np.frombuffer(bytes(data), dtype=np.float32).astype(np.float64)
+        count = int(values[0])
+        filled = min(count, 5)
+        estimators = {}
+        offset = 1
+        for metric in SKETCH_METRICS:
+            estimators[metric] = []
+            for p in SKETCH_QUANTILES:
+                block = values[offset:offset + _FLOATS_PER_ESTIMATOR].tolist()
+                estimators[metric].append(P2Quantile(p, block[:filled], block[5:], count))
+                offset += _FLOATS_PER_ESTIMATOR
+        return cls(count, estimators)
+
+    def to_bytes(self):
+        values = [self.count]
+        for metric in SKETCH_METRICS:
+            for estimator in self.estimators[metric]:
+                values += estimator.heights + [0.0] * (5 - len(estimator.heights)) + estimator.positions
+        return np.asarray(values, dtype=np.float32).tobytes()
+
+    def add(self, observation):
+        self.count += 1
+        for metric in SKETCH_METRICS:
+            for estimator in self.estimators[metric]:
+                estimator.add(observation[metric])
+
+    def quantiles(self):
+        """{metric: [p5, p95]} of the daily values seen so far"""
+        return {
+            metric: [estimator.value() for estimator in self.estimators[metric]]
+            for metric in SKETCH_METRICS
+        }
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary holding at most `capacity` counters of
+    (count, error). Counts never underestimate: each overestimates its true
+    count by at most `error` <= total / capacity, so every item occurring
+    more than total / capacity times is guaranteed to be present. Two
+    summaries merge into one with the same bound over the combined stream.
+    """
+
+    def __init__(self, capacity, counters=None, total=0, floor=0):
+        self.capacity = capacity
+        self.counters = counters or {}  # item -> [count, error]
+        self.total = total
+        # Largest count ever evicted: the most an absent item may have reached
+        self.floor = floor
+
+    def add_counts(self, counts):
+        """Fold exact {item: count} (e.g. one ingestion batch) into the summary"""
+        self.merge(SpaceSaving(len(counts), {item: [count, 0] for item, count in counts.items()}, sum(counts.values())))
+
+    def merge(self, other):
+        merged = {}
+        for item in self.counters.keys() | other.counters.keys():
+            count, error = self.counters.get(item, (self.floor, self.floor))
+            other_count, other_error = other.counters.get(item, (other.floor, other.floor))
+            merged[item] = [count + other_count, error + other_error]
+        if len(merged) > self.capacity:
+            ranked = sorted(merged.items(), key=lambda entry: entry[1][0], reverse=True)
+            self.floor = max(self.floor + other.floor, ranked[self.capacity][1][0])
+            merged = dict(ranked[:self.capacity])
+        else:
+            self.floor += other.floor
+        self.counters = merged
+        self.total += other.total
+
+    def top(self, k):
+        """[(item, count, max_error)] of the k largest counters"""
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:k]
+        return [(item, count, error) for item, (count, error) in ranked]
+
+    def error_bound(self):
+        return self.total / self.capacity
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'total': self.total, 'floor': self.floor, 'counters': list(self.counters.items())}
+
+    @classmethod
+    def from_dict(cls, data, capacity):
+        if not data:
+            return cls(capacity)
+        return cls(data['capacity'], {item: list(entry) for item, entry in data['counters']}, data['total'], data['floor'])
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with 2**precision one-byte registers
+    (4 KB at the default precision 12). Relative standard error is
+    1.04 / sqrt(2**precision), about 1.6%; registers merge by maximum, so
+    the union of any buckets costs no extra error.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.size, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Add 64-bit hashes (uint64 array), one per item"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remaining = (hashes << np.uint64(self.precision)) | np.uint64((1 << self.precision) - 1)
+        # Rank = leading zeros of the remaining bits + 1
+        bits = np.floor(np.log2(remaining.astype(np.float64))).astype(np.int64)
+        rank = (64 - bits).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * np.log(self.size / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+    def relative_error(self):
+        return 1.04 / np.sqrt(self.size)
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, precision=12):
+        if not data:
+            return cls(precision)
+        return cls(precision, np.frombuffer(data, dtype=np.uint8).copy())
+
+
+def hash64(values):
+    """Stable 64-bit hashes of integer ids (splitmix64), as a uint64 array"""
+    x = np.asarray(values, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
@@ -1,53 +1,54 @@
-from celery import shared_task
+from celery import chord, group, shared_task
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
-from datetime import timedelta
+from datetime import date, datetime, timedelta
 import logging
 import json
+import time
 
-from .models import Customer, CustomerEvent, AnomalyAlert, RealTimeWatchlist
-from .anomaly_detection import anomaly_detector
+from .models import Customer, CustomerEvent, ChurnPrediction, PlatformIncident, RealTimeWatchlist
+from .anomaly_detection import anomaly_detector, fit_and_publish_anomaly_model
 from .utils import predict_with_explainability
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .ingestion import ingest_events
+from .baselines import customer_id_ranges, roll_baseline_range, roll_baselines
+from .coalescing import detection_coalescer
+from .sessions import persist_sessions
+from .retention import RETENTION_POLICIES, purge_expired
+from .pipeline import (
+    FUSED_PIPELINE, CHURN_PREDICTION_SCORE, WATCHLIST_PROBABILITY, customer_prediction_features,
+    upsert_watchlist_entry, anomaly_context, anomaly_payload, anomaly_message, watchlist_message, group_send,
+    run_fused_followups
+)
+from .behavior_counters import behavior_counters, WINDOW_DAYS
 
 logger = logging.getLogger(__name__)
-channel_layer = get_channel_layer()
 
 @shared_task(bind=True, max_retries=3)
 def process_customer_event(self, customer_id, event_type, metadata=None):
     """Process a new customer event and check for anomalies"""
     try:
-        customer = Customer.objects.get(id=customer_id)
-        
-        # Create the event
-        event = CustomerEvent.objects.create(
-            customer=customer,
-            event_type=event_type,
-            metadata=metadata or {}
-        )
-        
-        logger.info(f"Created event: {event}")
-        
-        # Trigger anomaly detection for critical events
-        critical_events = ['purchase', 'payment_failed', 'support_ticket', 'cart_abandon', 'app_crash']
-        if event_type in critical_events:
-            # Run anomaly detection asynchronously
-            detect_customer_anomaly.delay(customer_id)
-        
-        # Update customer's last activity
-        customer.last_activity = timezone.now()
-        customer.save()
-        
-        return f"Processed event {event.id} for customer {customer.name}"
-        
+        customer = Customer.objects.only('id', 'name').get(id=customer_id)
+        # Same write path as batches: the insert commits atomically and the
+        # counter, session, stats and incident updates after it never raise
+        result = ingest_events([{'customer_id': customer.id, 'event_type': event_type, 'metadata': metadata or {}}])
     except Customer.DoesNotExist:
         logger.error(f"Customer {customer_id} not found")
         raise
     except Exception as exc:
+        # Nothing was committed, so the retry cannot insert a duplicate
         logger.error(f"Error processing event: {exc}")
         raise self.retry(exc=exc, countdown=60)
 
+    # Trigger anomaly detection for critical events, unless a platform
+    # incident already covers this event type; once per burst of triggers
+    if result['critical_customer_ids']:
+        try:
+            queue_anomaly_detection(result['critical_customer_ids'])
+        except Exception as exc:
+            logger.error(f"Could not queue anomaly detection for customer {customer_id}: {exc}")
+
+    return f"Processed {event_type} event for customer {customer.name}"
+
 @shared_task(bind=True, max_retries=2)
 def detect_customer_anomaly(self, customer_id):
     """Detect anomalies for a specific customer"""
@@ -56,16 +57,7 @@ def detect_customer_anomaly(self, customer_id):
         
         # Run anomaly detection
         result = anomaly_detector.detect_anomaly(customer)
-        
-        if result and result['is_anomaly']:
-            logger.info(f"Anomaly detected for customer {customer.name}: {result['anomaly_score']}")
-            
-            # Trigger churn prediction if anomaly is severe
-            if result['anomaly_score'] < -0.7:  # Very anomalous
-                trigger_churn_prediction.delay(customer_id, anomaly_context=result)
-            
-            # Send real-time notification
-            send_anomaly_notification.delay(customer_id, result)
+        _handle_anomaly_result(customer, result)
             
         return f"Anomaly detection completed for customer {customer.name}"
         
@@ -76,40 +68,115 @@ def detect_customer_anomaly(self, customer_id):
         logger.error(f"Error in anomaly detection: {exc}")
         raise self.retry(exc=exc, countdown=120)
 
+def _handle_anomaly_result(customer, result, fused=None):
+    """Follow up on a detection result: churn prediction and notification"""
+    if result and result['is_anomaly']:
+        logger.info(f"Anomaly detected for customer {customer.name}: {result['anomaly_score']}")
+        
+        if result['incident_suppressed']:
+            return  # Explained by an active platform incident
+        
+        if FUSED_PIPELINE if fused is None else fused:
+            run_fused_followups(customer, result)
+            return
+        
+        # Trigger churn prediction if anomaly is severe
+        if result['anomaly_score'] < CHURN_PREDICTION_SCORE:  # Very anomalous
+            trigger_churn_prediction.delay(customer.id, anomaly_context=anomaly_context(result))
+        
+        # Send real-time notification
+        send_anomaly_notification.delay(customer.id, anomaly_payload(result))
+
+@shared_task(bind=True, max_retries=3)
+def process_customer_events_batch(self, events):
+    """Ingest a batch of validated events and queue one detection task for the batch"""
+    try:
+        result = ingest_events(events)
+    except Exception as exc:
+        # Nothing was committed, so the retry cannot insert duplicates
+        logger.error(f"Error processing event batch: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+
+    critical_customer_ids = result.pop('critical_customer_ids')
+    if critical_customer_ids:
+        try:
+            queue_anomaly_detection(critical_customer_ids)
+        except Exception as exc:
+            logger.error(f"Could not queue anomaly detection for event batch: {exc}")
+
+    logger.info(f"Ingested {result['events_created']} events for {result['customers_updated']} customers")
+
+    result['customers_queued_for_detection'] = len(critical_customer_ids)
+    return result
+
+def queue_anomaly_detection(customer_ids):
+    """
+    Debounced entry point for event-driven detection: customers that already
+    have a detection pending are folded into it instead of queueing another
+    """
+    scheduled = detection_coalescer.trigger(customer_ids)
+    if scheduled:
+        run_coalesced_detection.apply_async((scheduled,), countdown=detection_coalescer.debounce_seconds)
+    return scheduled
+
+@shared_task
+def run_coalesced_detection(customer_ids):
+    """Run detection for debounced customers that are due; re-arm for the rest"""
+    ready, waiting, next_due = detection_coalescer.due(customer_ids)
+    
+    if waiting:
+        run_coalesced_detection.apply_async((waiting,), countdown=next_due)
+    
+    if not ready:
+        return {'processed_count': 0, 'anomalies_found': 0, 'deferred_count': len(waiting)}
+    
+    detection_coalescer.complete(ready)
+    result = detect_customer_anomalies(ready)
+    result['deferred_count'] = len(waiting)
+    return result
+
+@shared_task
+def detect_customer_anomalies(customer_ids):
+    """Detect anomalies for a set of customers in a single task"""
+    processed_count = 0
+    anomalies_found = 0
+    
+    for customer in Customer.objects.filter(id__in=customer_ids).iterator():
+        try:
+            result = anomaly_detector.detect_anomaly(customer)
+            processed_count += 1
+            if result and result['is_anomaly']:
+                anomalies_found += 1
+            _handle_anomaly_result(customer, result)
+        except Exception as e:
+            logger.error(f"Error processing customer {customer.id}: {e}")
+            continue
+    
+    return {
+        'processed_count': processed_count,
+        'anomalies_found': anomalies_found
+    }
+
 @shared_task(bind=True, max_retries=2)
 def trigger_churn_prediction(self, customer_id, anomaly_context=None):
     """Trigger churn prediction for a customer with anomaly context"""
     try:
         customer = Customer.objects.get(id=customer_id)
         
-        # Prepare customer data for prediction (using sample data structure)
-        customer_data = {
-            'Tenure': getattr(customer, 'tenure', 12),
-            'PreferredLoginDevice': getattr(customer, 'preferred_login_device', 'Mobile Phone'),
-            'CityTier': getattr(customer, 'city_tier', 1),
-            'WarehouseToHome': getattr(customer, 'warehouse_to_home', 15.0),
-            'PreferredPaymentMode': getattr(customer, 'preferred_payment_mode', 'Debit Card'),
-            'Gender': getattr(customer, 'gender', 'Male'),
-            'HourSpendOnApp': getattr(customer, 'hour_spend_on_app', 3.0),
-            'NumberOfDeviceRegistered': getattr(customer, 'number_of_device_registered', 3),
-            'PreferedOrderCat': getattr(customer, 'prefered_order_cat', 'Laptop & Accessory'),
-            'SatisfactionScore': getattr(customer, 'satisfaction_score', 3),
-            'MaritalStatus': getattr(customer, 'marital_status', 'Single'),
-            'NumberOfAddress': getattr(customer, 'number_of_address', 2),
-            'Complain': getattr(customer, 'complain', 0),
-            'OrderAmountHikeFromlastYear': getattr(customer, 'order_amount_hike_from_last_year', 15.0),
-            'CouponUsed': getattr(customer, 'coupon_used', 5),
-            'OrderCount': getattr(customer, 'order_count', 3),
-            'DaySinceLastOrder': getattr(customer, 'day_since_last_order', 5),
-            'CashbackAmount': getattr(customer, 'cashback_amount', 150.0)
-        }
-        
-        # Get churn prediction
-        prediction_result = predict_with_explainability(customer_data)
+        # Get churn prediction; the full output (SHAP values and all) goes to
+        # the prediction table, the task result only carries its id
+        prediction_result = predict_with_explainability(customer_prediction_features(customer))
+        churn_probability = float(prediction_result.get('churn_probability', 0))
+        prediction = ChurnPrediction.objects.create(
+            customer=customer,
+            churn_probability=churn_probability,
+            risk_level=(prediction_result.get('risk_category') or {}).get('risk_level', ''),
+            result=prediction_result,
+            anomaly_context=anomaly_context or {}
+        )
         
         # Check if customer should be added to watchlist
-        churn_probability = prediction_result.get('churn_probability', 0)
-        if churn_probability >= 0.32:  # High risk threshold
+        if churn_probability >= WATCHLIST_PROBABILITY:  # High risk threshold
             add_to_watchlist.delay(customer_id, churn_probability, anomaly_context)
         
         logger.info(f"Churn prediction for {customer.name}: {churn_probability:.3f}")
@@ -117,7 +184,7 @@ def trigger_churn_prediction(self, customer_id, anomaly_context=None):
         return {
             'customer_id': customer_id,
             'churn_probability': churn_probability,
-            'prediction_result': prediction_result
+            'prediction_id': prediction.id
         }
         
     except Customer.DoesNotExist:
@@ -127,30 +194,13 @@ def trigger_churn_prediction(self, customer_id, anomaly_context=None):
         logger.error(f"Error in churn prediction: {exc}")
         raise self.retry(exc=exc, countdown=120)
 
-@shared_task
+@shared_task(ignore_result=True)
 def add_to_watchlist(customer_id, churn_probability, anomaly_context=None):
     """Add customer to real-time watchlist"""
     try:
         customer = Customer.objects.get(id=customer_id)
         
-        # Check if already on watchlist
-        watchlist_entry, created = RealTimeWatchlist.objects.get_or_create(
-            customer=customer,
-            defaults={
-                'churn_probability': churn_probability,
-                'risk_level': 'high' if churn_probability >= 0.6 else 'medium',
-                'anomaly_context': anomaly_context or {},
-                'is_active': True
-            }
-        )
-        
-        if not created:
-            # Update existing entry
-            watchlist_entry.churn_probability = churn_probability
-            watchlist_entry.risk_level = 'high' if churn_probability >= 0.6 else 'medium'
-            watchlist_entry.anomaly_context = anomaly_context or {}
-            watchlist_entry.last_updated = timezone.now()
-            watchlist_entry.save()
+        upsert_watchlist_entry(customer, churn_probability, anomaly_context)
         
         logger.info(f"Added {customer.name} to watchlist with {churn_probability:.3f} churn probability")
         
@@ -164,30 +214,13 @@ def add_to_watchlist(customer_id, churn_probability, anomaly_context=None):
     except Exception as exc:
         logger.error(f"Error adding to watchlist: {exc}")
 
-@shared_task
+@shared_task(ignore_result=True)
 def send_anomaly_notification(customer_id, anomaly_result):
     """Send real-time anomaly notification to frontend"""
     try:
         customer = Customer.objects.get(id=customer_id)
         
-        notification_data = {
-            'type': 'anomaly_detected',
-            'customer_id': customer_id,
-            'customer_name': customer.name,
-            'anomaly_score': anomaly_result['anomaly_score'],
-            'anomaly_details': anomaly_result['anomaly_details'],
-            'timestamp': timezone.now().isoformat(),
-            'severity': 'high' if anomaly_result['anomaly_score'] < -0.7 else 'medium'
-        }
-        
-        # Send to WebSocket group
-        async_to_sync(channel_layer.group_send)(
-            'alerts',
-            {
-                'type': 'send_alert',
-                'message': notification_data
-            }
-        )
+        group_send('alerts', 'send_alert', anomaly_message(customer, anomaly_result))
         
         logger.info(f"Sent anomaly notification for {customer.name}")
         return f"Notification sent for customer {customer.name}"
@@ -197,31 +230,39 @@ def send_anomaly_notification(customer_id, anomaly_result):
     except Exception as exc:
         logger.error(f"Error sending notification: {exc}")
 
-@shared_task
+@shared_task(ignore_result=True)
+def send_incident_notification(incident_id):
+    """Send one platform incident notification in place of per-customer alerts"""
+    try:
+        incident = PlatformIncident.objects.get(id=incident_id)
+        
+        group_send('alerts', 'send_alert', {
+            'type': 'platform_incident',
+            'incident_id': incident.id,
+            'event_type': incident.event_type,
+            'severity': incident.severity,
+            'description': incident.description,
+            'expected_per_minute': incident.expected_per_minute,
+            'peak_per_minute': incident.peak_per_minute,
+            'timestamp': incident.started_at.isoformat()
+        })
+        
+        logger.info(f"Sent platform incident notification {incident.id}")
+        return f"Notification sent for incident {incident.id}"
+        
+    except PlatformIncident.DoesNotExist:
+        logger.error(f"Platform incident {incident_id} not found")
+    except Exception as exc:
+        logger.error(f"Error sending incident notification: {exc}")
+
+@shared_task(ignore_result=True)
 def send_watchlist_update(customer_id, action):
     """Send watchlist update to frontend"""
     try:
         customer = Customer.objects.get(id=customer_id)
         watchlist_entry = RealTimeWatchlist.objects.get(customer=customer, is_active=True)
         
-        update_data = {
-            'type': 'watchlist_update',
-            'action': action,  # 'added', 'updated', 'removed'
-            'customer_id': customer_id,
-            'customer_name': customer.name,
-            'churn_probability': watchlist_entry.churn_probability,
-            'risk_level': watchlist_entry.risk_level,
-            'timestamp': timezone.now().isoformat()
-        }
-        
-        # Send to WebSocket group
-        async_to_sync(channel_layer.group_send)(
-            'watchlist',
-            {
-                'type': 'send_update',
-                'message': update_data
-            }
-        )
+        group_send('watchlist', 'send_update', watchlist_message(customer, watchlist_entry, action))
         
         logger.info(f"Sent watchlist update for {customer.name}: {action}")
         return f"Watchlist update sent for customer {customer.name}"
@@ -231,66 +272,127 @@ def send_watchlist_update(customer_id, action):
     except Exception as exc:
         logger.error(f"Error sending watchlist update: {exc}")
 
+def _active_customer_ids(cutoff, start_id=None, end_id=None):
+    """Sorted ids of customers active since cutoff, optionally limited to ids in [start_id, end_id)"""
+    customers = Customer.objects.filter(last_activity__gte=cutoff)
+    events = CustomerEvent.objects.filter(timestamp__gte=cutoff)
+    if start_id is not None:
+        customers = customers.filter(id__gte=start_id, id__lt=end_id)
+        events = events.filter(customer_id__gte=start_id, customer_id__lt=end_id)
+    
+    # A union of two id lists avoids the DISTINCT over the customer/event join
+    active_ids = set(customers.values_list('id', flat=True))
+    active_ids.update(events.values_list('customer_id', flat=True).distinct())
+    return sorted(active_ids)
+
+def active_id_ranges(active_ids, range_size):
+    """Half-open [start, end) id ranges holding up to range_size of the sorted active ids each"""
+    return [
+        (active_ids[start], active_ids[min(start + range_size, len(active_ids)) - 1] + 1)
+        for start in range(0, len(active_ids), range_size)
+    ]
+
 @shared_task
-def batch_anomaly_detection():
-    """Run batch anomaly detection for all active customers"""
+def batch_anomaly_detection(fan_out=True, range_size=None):
+    """
+    Run batch anomaly detection for all active customers. The active
+    customers are split into id ranges of range_size; with fan_out each
+    range is scored by its own task in a chord whose callback merges the
+    counts, so the work spreads across workers.
+    """
     try:
-        # Get customers with recent activity (last 24 hours)
+        started_at = time.time()
+        
+        # Customers with recent activity (last 24 hours)
         recent_cutoff = timezone.now() - timedelta(hours=24)
-        active_customers = Customer.objects.filter(
-            Q(last_activity__gte=recent_cutoff) | Q(events__timestamp__gte=recent_cutoff)
-        ).distinct()
-        
-        processed_count = 0
-        anomalies_found = 0
-        
-        for customer in active_customers:
-            try:
-                result = anomaly_detector.detect_anomaly(customer)
-                processed_count += 1
-                
-                if result and result['is_anomaly']:
-                    anomalies_found += 1
-                    logger.info(f"Batch anomaly detected: {customer.name}")
-                    
-                    # Send notification for severe anomalies
-                    if result['anomaly_score'] < -0.6:
-                        send_anomaly_notification.delay(customer.id, result)
-                        
-            except Exception as e:
-                logger.error(f"Error processing customer {customer.id}: {e}")
-                continue
-        
-        logger.info(f"Batch anomaly detection completed: {processed_count} customers processed, {anomalies_found} anomalies found")
+        range_size = range_size or getattr(settings, 'CHURN_BATCH_DETECTION_RANGE_SIZE', 20000)
+        ranges = active_id_ranges(_active_customer_ids(recent_cutoff), range_size)
+        
+        if fan_out and ranges:
+            chord(
+                detect_anomaly_range.s(recent_cutoff.isoformat(), start_id, end_id)
+                for start_id, end_id in ranges
+            )(merge_batch_anomaly_results.s(started_at))
+            logger.info(f"Queued batch anomaly detection for {len(ranges)} customer id ranges")
+            return {
+                'ranges_queued': len(ranges),
+                'timestamp': timezone.now().isoformat()
+            }
         
-        return {
-            'processed_count': processed_count,
-            'anomalies_found': anomalies_found,
-            'timestamp': timezone.now().isoformat()
-        }
+        results = [_detect_range(recent_cutoff, start_id, end_id) for start_id, end_id in ranges]
+        return merge_batch_anomaly_results(results, started_at)
         
     except Exception as exc:
         logger.error(f"Error in batch anomaly detection: {exc}")
         raise
 
+@shared_task
+def detect_anomaly_range(cutoff, start_id, end_id):
+    """Score the customers with ids in [start_id, end_id) that were active since cutoff"""
+    return _detect_range(datetime.fromisoformat(cutoff), start_id, end_id)
+
+def _detect_range(cutoff, start_id, end_id):
+    started = time.perf_counter()
+    active_ids = _active_customer_ids(cutoff, start_id, end_id)
+    chunk_size = getattr(settings, 'CHURN_BATCH_SCORING_CHUNK', 20000)
+    counts = {'processed_count': 0, 'anomalies_found': 0, 'alerts_created': 0, 'failed_count': 0}
+    
+    for start in range(0, len(active_ids), chunk_size):
+        chunk_ids = active_ids[start:start + chunk_size]
+        try:
+            result = anomaly_detector.detect_anomalies_batch(chunk_ids)
+        except Exception as e:
+            logger.error(f"Error scoring customers {chunk_ids[0]}-{chunk_ids[-1]}: {e}")
+            counts['failed_count'] += len(chunk_ids)
+            continue
+        if result is None:
+            break
+        
+        counts['processed_count'] += result['processed_count']
+        counts['anomalies_found'] += len(result['anomalies'])
+        counts['alerts_created'] += result['alerts_created']
+        
+        for anomaly in result['anomalies']:
+            customer = anomaly['customer']
+            logger.info(f"Batch anomaly detected: {customer.name}")
+            
+            # Send notification for severe anomalies not explained by a platform incident
+            if anomaly['anomaly_score'] < -0.6 and not anomaly['incident_suppressed']:
+                send_anomaly_notification.delay(customer.id, anomaly_payload(anomaly))
+    
+    counts['runtime_seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Scored {counts['processed_count']} active customers in ids {start_id}-{end_id - 1} in {counts['runtime_seconds']:.2f}s")
+    return counts
+
+@shared_task
+def merge_batch_anomaly_results(results, started_at):
+    """Chord callback: sum the per-range counts of a batch anomaly detection run"""
+    merged = {
+        key: sum(result[key] for result in results)
+        for key in ('processed_count', 'anomalies_found', 'alerts_created', 'failed_count')
+    }
+    runtime_seconds = time.time() - started_at
+    logger.info(
+        f"Batch anomaly detection completed: {merged['processed_count']} customers processed, "
+        f"{merged['anomalies_found']} anomalies found in {runtime_seconds:.2f}s over {len(results)} ranges"
+    )
+    
+    return {
+        **merged,
+        'ranges': len(results),
+        'range_seconds': [result['runtime_seconds'] for result in results],
+        'runtime_seconds': round(runtime_seconds, 3),
+        'timestamp': timezone.now().isoformat()
+    }
+
 @shared_task
 def cleanup_old_alerts():
     """Clean up old anomaly alerts and watchlist entries"""
     try:
-        # Remove alerts older than 30 days
-        old_alerts_cutoff = timezone.now() - timedelta(days=30)
-        old_alerts = AnomalyAlert.objects.filter(detected_at__lt=old_alerts_cutoff)
-        deleted_alerts = old_alerts.count()
-        old_alerts.delete()
-        
-        # Remove inactive watchlist entries older than 7 days
-        old_watchlist_cutoff = timezone.now() - timedelta(days=7)
-        old_watchlist = RealTimeWatchlist.objects.filter(
-            is_active=False,
-            last_updated__lt=old_watchlist_cutoff
-        )
-        deleted_watchlist = old_watchlist.count()
-        old_watchlist.delete()
+        # Alerts older than 30 days and inactive watchlist entries older than
+        # 7 days (the retention defaults), deleted in primary key chunks
+        deleted_alerts = purge_expired('anomaly_alerts')['deleted']
+        deleted_watchlist = purge_expired('watchlist')['deleted']
         
         logger.info(f"Cleanup completed: {deleted_alerts} alerts, {deleted_watchlist} watchlist entries removed")
         
@@ -305,20 +407,46 @@ def cleanup_old_alerts():
         raise
 
 @shared_task
-def update_customer_baselines():
-    """Update customer behavior baselines periodically"""
+def apply_retention(archive_events=None, chunk_size=None):
+    """Delete expired events, alerts and inactive watchlist entries, archiving events if configured"""
+    results = {}
+    for policy_name in RETENTION_POLICIES:
+        try:
+            results[policy_name] = purge_expired(
+                policy_name,
+                chunk_size=chunk_size,
+                archive=archive_events if policy_name == 'events' else False
+            )
+        except Exception as exc:
+            # Other tables still get their retention; this one resumes next run
+            logger.error(f"Error applying {policy_name} retention: {exc}")
+            results[policy_name] = {'error': str(exc)}
+    
+    return {
+        'policies': results,
+        'timestamp': timezone.now().isoformat()
+    }
+
+@shared_task
+def update_customer_baselines(day=None, fan_out=True):
+    """
+    Fold the last closed day into customer baselines (online mean/variance
+    update). With fan_out, each customer id range becomes its own task so
+    the work spreads across workers.
+    """
     try:
-        customers = Customer.objects.all()
-        updated_count = 0
-        
-        for customer in customers:
-            try:
-                # This will calculate and save new baseline
-                anomaly_detector._calculate_baseline(customer)
-                updated_count += 1
-            except Exception as e:
-                logger.error(f"Error updating baseline for customer {customer.id}: {e}")
-                continue
+        day = day or (timezone.localdate() - timedelta(days=1)).isoformat()
+        ranges = customer_id_ranges()
+        
+        if fan_out:
+            group(update_customer_baseline_range.s(day, start_id, end_id) for start_id, end_id in ranges).apply_async()
+            logger.info(f"Queued baseline updates for {len(ranges)} customer id ranges")
+            return {
+                'ranges_queued': len(ranges),
+                'timestamp': timezone.now().isoformat()
+            }
+        
+        updated_count = roll_baselines(date.fromisoformat(day))
         
         logger.info(f"Updated baselines for {updated_count} customers")
         
@@ -330,3 +458,79 @@ def update_customer_baselines():
     except Exception as exc:
         logger.error(f"Error updating baselines: {exc}")
         raise
+
+@shared_task(bind=True, max_retries=3)
+def update_customer_baseline_range(self, day, start_id, end_id):
+    """Fold a closed day into the baselines of customers with ids in [start_id, end_id)"""
+    try:
+        updated_count = roll_baseline_range(date.fromisoformat(day), start_id, end_id)
+        
+        logger.info(f"Updated baselines for {updated_count} customers in ids {start_id}-{end_id - 1}")
+        
+        return {
+            'updated_count': updated_count,
+            'timestamp': timezone.now().isoformat()
+        }
+        
+    except Exception as exc:
+        logger.error(f"Error updating baselines for ids {start_id}-{end_id - 1}: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+
+@shared_task
+def train_anomaly_model(customer_sample_size=10000, sampling='stratified'):
+    """Fit and publish a new anomaly model version; workers hot-reload it"""
+    try:
+        metadata = fit_and_publish_anomaly_model(customer_sample_size, sampling)
+        if metadata is None:
+            logger.warning("Anomaly model training skipped: insufficient customer data")
+            return None
+        
+        logger.info(f"Published anomaly model version {metadata['version']}")
+        return metadata
+        
+    except Exception as exc:
+        logger.error(f"Error training anomaly model: {exc}")
+        raise
+
+@shared_task
+def backfill_customer_sessions(days_back=30):
+    """Pair historical login/logout events of every customer and store the sessions"""
+    try:
+        since = timezone.now() - timedelta(days=days_back)
+        session_count = persist_sessions(None, since=since)
+        
+        logger.info(f"Backfilled {session_count} customer sessions since {since}")
+        
+        return {
+            'session_count': session_count,
+            'timestamp': timezone.now().isoformat()
+        }
+        
+    except Exception as exc:
+        logger.error(f"Error backfilling customer sessions: {exc}")
+        raise
+
+@shared_task
+def reconcile_behavior_counters(chunk_size=1000):
+    """Rebuild rolling behavior counters from raw events to correct any drift"""
+    try:
+        cutoff = timezone.now() - timedelta(days=max(WINDOW_DAYS))
+        customer_ids = list(
+            CustomerEvent.objects.filter(timestamp__gte=cutoff)
+            .order_by().values_list('customer_id', flat=True).distinct()
+        )
+        
+        rebuilt_count = 0
+        for offset in range(0, len(customer_ids), chunk_size):
+            rebuilt_count += behavior_counters.rebuild(customer_ids[offset:offset + chunk_size])
+        
+        logger.info(f"Reconciled behavior counters for {rebuilt_count} customers")
+        
+        return {
+            'rebuilt_count': rebuilt_count,
+            'timestamp': timezone.now().isoformat()
+        }
+        
+    except Exception as exc:
+        logger.error(f"Error reconciling behavior counters: {exc}")
+        raise
@@ -1,3 +1,1538 @@
 from django.test import TestCase
+from django.core.cache import cache
+from unittest import mock
+import json
+import time
 
-# Create your tests here.
+from .models import Customer, CustomerEvent, AnomalyAlert, RealTimeWatchlist
+from .caching import get_response_cache_stats
+
+
+class ListingCacheTests(TestCase):
+    """ETag / versioned response caching for dashboard listing endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(
+            customer_id='CUST_0001', name='Alice Johnson', email='alice@example.com'
+        )
+        RealTimeWatchlist.objects.create(customer=self.customer, reason='High churn risk')
+
+    def test_unchanged_poll_is_served_without_database(self):
+        first = self.client.get('/api/watchlist/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/watchlist/')
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(cached['ETag'], etag)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get('/api/watchlist/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+        stats = get_response_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['not_modified'], 1)
+        self.assertGreater(stats['queries_saved'], 0)
+
+    def test_model_change_invalidates_cached_listing(self):
+        etag = self.client.get('/api/alerts/?hours=24')['ETag']
+
+        AnomalyAlert.objects.create(
+            customer=self.customer, alert_type='login_drop', severity='high',
+            description='Login frequency dropped', anomaly_score=-0.8
+        )
+        response = self.client.get('/api/alerts/?hours=24', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_activity_only_customer_save_keeps_cache(self):
+        etag = self.client.get('/api/watchlist/')['ETag']
+        self.customer.save(update_fields=['last_activity', 'updated_at'])
+        response = self.client.get('/api/watchlist/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+    def test_writes_and_listings_work_without_the_cache(self):
+        broken = mock.Mock(**{f'{name}.side_effect': ConnectionError('cache down') for name in ('get', 'add', 'incr', 'set')})
+        with mock.patch('churnapp.caching.cache', broken):
+            AnomalyAlert.objects.create(
+                customer=self.customer, alert_type='login_drop', severity='high',
+                description='Login frequency dropped', anomaly_score=-0.8
+            )
+            self.customer.name = 'Alice J.'
+            self.customer.save()
+            response = self.client.get('/api/alerts/?hours=24')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+
+
+class AsyncViewTests(TestCase):
+    """ASGI-native listing views return the same payloads as the sync views"""
+
+    def setUp(self):
+        cache.clear()
+        customer = Customer.objects.create(
+            customer_id='CUST_0002', name='Bob Smith', email='bob@example.com'
+        )
+        RealTimeWatchlist.objects.create(customer=customer, reason='Payment issues')
+        AnomalyAlert.objects.create(
+            customer=customer, alert_type='payment_issues', severity='medium',
+            description='Repeated payment failures', anomaly_score=-0.6
+        )
+
+    async def test_async_listings_match_sync(self):
+        for sync_path, async_path in (
+            ('/api/watchlist/', '/api/async/watchlist/'),
+            ('/api/alerts/?hours=24', '/api/async/alerts/?hours=24'),
+        ):
+            sync_response = await self.async_client.get(sync_path)
+            async_response = await self.async_client.get(async_path)
+            self.assertEqual(async_response.status_code, 200)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_async_predict_validates_input(self):
+        response = await self.async_client.post(
+            '/api/async/predict/', data={}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkEventIngestionTests(TestCase):
+    """/api/track-events/ validation and batched writes"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = Customer.objects.create(customer_id='CUST_0003', name='Alice', email='a@example.com')
+        self.bob = Customer.objects.create(customer_id='CUST_0004', name='Bob', email='b@example.com')
+
+    @mock.patch('churnapp.views.process_customer_events_batch.delay')
+    def test_json_array_and_ndjson_are_validated_together(self, delay):
+        delay.return_value.id = 'task-1'
+        events = [
+            {'customer_id': self.alice.id, 'event_type': 'login'},
+            {'customer_id': self.bob.id, 'event_type': 'purchase', 'metadata': {'amount': 25}},
+            {'customer_id': 999999, 'event_type': 'login'},
+            {'customer_id': self.alice.id, 'event_type': 'teleport'},
+        ]
+        response = self.client.post('/api/track-events/', data=events, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['accepted'], 2)
+        self.assertEqual([item['index'] for item in response.json()['rejected']], [2, 3])
+        delay.assert_called_once()
+
+        ndjson = '\n'.join(json.dumps(event) for event in events[:2])
+        response = self.client.post('/api/track-events/', data=ndjson, content_type='application/x-ndjson')
+        self.assertEqual(response.json()['accepted'], 2)
+
+    @mock.patch('churnapp.tasks.run_coalesced_detection.apply_async')
+    def test_batch_task_writes_in_bulk_and_queues_detection_once(self, apply_async):
+        from .tasks import process_customer_events_batch
+
+        events = [
+            {'customer_id': self.alice.id, 'event_type': 'login', 'metadata': {}},
+            {'customer_id': self.alice.id, 'event_type': 'payment_failed', 'metadata': {}},
+            {'customer_id': self.bob.id, 'event_type': 'cart_abandon', 'metadata': {}},
+            {'customer_id': self.bob.id, 'event_type': 'page_view', 'metadata': {}},
+        ]
+        # Insert and update, inside a savepoint (the test's stand-in for BEGIN/COMMIT)
+        with self.assertNumQueries(4):
+            result = process_customer_events_batch(events)
+
+        self.assertEqual(result['events_created'], 4)
+        self.assertEqual(CustomerEvent.objects.count(), 4)
+        self.assertIsNotNone(Customer.objects.get(id=self.alice.id).last_activity)
+        apply_async.assert_called_once_with((sorted([self.alice.id, self.bob.id]),), countdown=mock.ANY)
+
+    @mock.patch('churnapp.tasks.run_coalesced_detection.apply_async')
+    def test_side_effect_failures_do_not_retry_a_committed_batch(self, apply_async):
+        from .tasks import process_customer_events_batch
+
+        events = [
+            {'customer_id': self.alice.id, 'event_type': 'logout', 'metadata': {}},
+            {'customer_id': self.bob.id, 'event_type': 'purchase', 'metadata': {}},
+        ]
+        broken = RuntimeError('redis down')
+        with mock.patch('churnapp.ingestion.behavior_counters.record_events', side_effect=broken), \
+                mock.patch('churnapp.ingestion.persist_sessions', side_effect=broken), \
+                mock.patch('churnapp.ingestion.dashboard_stats.record_events', side_effect=broken), \
+                mock.patch('churnapp.ingestion.platform_monitor.record_events', side_effect=broken), \
+                mock.patch('churnapp.tasks.queue_anomaly_detection', side_effect=broken), \
+                mock.patch.object(process_customer_events_batch, 'retry') as retry:
+            result = process_customer_events_batch(events)
+
+        retry.assert_not_called()
+        self.assertEqual(result['events_created'], 2)
+        self.assertEqual(CustomerEvent.objects.count(), 2)
+
+    def test_single_event_task_does_not_retry_after_commit(self):
+        from .tasks import process_customer_event
+
+        broken = RuntimeError('redis down')
+        with mock.patch('churnapp.ingestion.platform_monitor.record_events', side_effect=broken), \
+                mock.patch('churnapp.ingestion.dashboard_stats.record_events', side_effect=broken), \
+                mock.patch('churnapp.tasks.detection_coalescer.trigger', side_effect=broken), \
+                mock.patch.object(process_customer_event, 'retry') as retry:
+            process_customer_event(self.alice.id, 'payment_failed', {'amount': 5})
+
+        retry.assert_not_called()
+        event = CustomerEvent.objects.get()
+        self.assertEqual((event.customer_id, event.amount), (self.alice.id, 5.0))
+        self.assertIsNotNone(Customer.objects.get(id=self.alice.id).last_activity)
+
+    def test_promoted_metadata_columns_are_filled(self):
+        from .ingestion import ingest_events
+
+        ingest_events([
+            {'customer_id': self.alice.id, 'event_type': 'purchase', 'metadata': {'amount': '19.5', 'category': 'Books'}},
+            {'customer_id': self.bob.id, 'event_type': 'payment_failed', 'metadata': {'amount': 'n/a', 'error_code': 'CARD_DECLINED'}},
+        ])
+        purchase, failure = CustomerEvent.objects.order_by('id')
+        self.assertEqual((purchase.amount, purchase.category, purchase.error_code), (19.5, 'Books', None))
+        self.assertEqual((failure.amount, failure.error_code), (None, 'CARD_DECLINED'))
+
+        event = CustomerEvent.objects.create(customer=self.bob, event_type='purchase', metadata={'amount': 7})
+        self.assertEqual(event.amount, 7.0)
+
+    def test_backfill_migration_copies_metadata(self):
+        import importlib
+        from django.apps import apps
+
+        migration = importlib.import_module('churnapp.migrations.0005_backfill_customerevent_typed_metadata')
+        CustomerEvent.objects.bulk_create([
+            CustomerEvent(customer=self.alice, event_type='purchase', metadata={'amount': 12, 'category': 'Home'}),
+            CustomerEvent(customer=self.alice, event_type='page_view', metadata={}),
+        ])
+        self.assertFalse(CustomerEvent.objects.filter(amount__isnull=False).exists())
+
+        migration.backfill_typed_metadata(apps, None)
+        self.assertEqual(
+            list(CustomerEvent.objects.filter(amount__isnull=False).values_list('amount', 'category')),
+            [(12.0, 'Home')]
+        )
+
+
+class EventBufferTests(TestCase):
+    """Write-behind buffer flushing, spilling and replay"""
+
+    def setUp(self):
+        import tempfile
+        from .event_buffer import EventBuffer
+
+        self.spill_dir = tempfile.mkdtemp()
+        self.buffer = EventBuffer(
+            capacity=2, flush_interval_ms=50, flush_size=10,
+            spill_dir=self.spill_dir, fsync=True, autostart=False
+        )
+        self.customer = Customer.objects.create(customer_id='CUST_0005', name='Carol', email='c@example.com')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def test_overflow_spills_to_disk_and_is_replayed_on_flush(self):
+        for _ in range(5):
+            self.buffer.append(self.customer.id, 'page_view')
+
+        stats = self.buffer.stats()
+        self.assertEqual(stats['depth'], 2)
+        self.assertEqual(stats['spilled'], 3)
+        self.assertEqual(CustomerEvent.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 5)
+        self.assertEqual(CustomerEvent.objects.count(), 5)
+        stats = self.buffer.stats()
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['spill_files'], 0)
+        self.assertEqual(stats['flush_count'], 1)
+
+    def test_events_keep_their_accept_time(self):
+        self.buffer.append(self.customer.id, 'login')
+        accepted_at = self.buffer._queue[0]['timestamp']
+        self.buffer.flush()
+        self.assertEqual(CustomerEvent.objects.get().timestamp.isoformat(), accepted_at)
+
+    def test_torn_and_orphaned_spill_files_are_replayed(self):
+        from pathlib import Path
+
+        event = {'customer_id': self.customer.id, 'event_type': 'login', 'metadata': {}, 'timestamp': '2024-01-01T00:00:00+00:00'}
+        # A spill file torn mid-write and a replay file orphaned by a dead process
+        Path(self.spill_dir, 'events-999999991.ndjson').write_text(json.dumps(event) + '\n{"customer_id": ')
+        Path(self.spill_dir, 'events-999999992.ndjson.999999993.replay').write_text(json.dumps(event) + '\n')
+
+        with mock.patch('churnapp.event_buffer._pid_alive', return_value=False):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.stats()['spill_files'], 0)
+
+    def test_failed_flush_keeps_buffered_and_spilled_events(self):
+        for _ in range(3):
+            self.buffer.append(self.customer.id, 'page_view')
+
+        with mock.patch('churnapp.event_buffer.ingest_events', side_effect=RuntimeError('db down')):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.stats()['flush_errors'], 1)
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(CustomerEvent.objects.count(), 3)
+        self.assertEqual(self.buffer.stats()['spill_files'], 0)
+
+
+def reference_behavioral_features(events):
+    """Straight Python port of the original per-filter feature extraction"""
+    def of_type(*types):
+        return [e for e in events if e.event_type in types]
+
+    logins = of_type('login')
+    amounts = [float(e.metadata['amount']) for e in of_type('purchase') if 'amount' in e.metadata]
+    sessions, login_time = [], None
+    for e in sorted(of_type('login', 'logout'), key=lambda e: e.timestamp):
+        if e.event_type == 'login':
+            login_time = e.timestamp
+        elif login_time:
+            minutes = (e.timestamp - login_time).total_seconds() / 60
+            if minutes <= 12 * 60:  # longer pairs are unterminated sessions
+                sessions.append(minutes)
+            login_time = None
+    total = len(events)
+    weekend = [e for e in events if e.timestamp.isoweekday() in (6, 7)]
+    late_night = [e for e in events if e.timestamp.hour >= 23 or e.timestamp.hour < 5]
+    return {
+        'login_frequency': len(logins),
+        'avg_login_hour': sum(e.timestamp.hour for e in logins) / len(logins) if logins else 12,
+        'purchase_frequency': len(of_type('purchase')),
+        'avg_purchase_amount': sum(amounts) / len(amounts) if amounts else 0.0,
+        'avg_session_duration': sum(sessions) / len(sessions) if sessions else 30.0,
+        'engagement_frequency': len(of_type('page_view', 'search', 'cart_add')),
+        'problem_frequency': len(of_type('payment_failed', 'app_crash', 'support_ticket')),
+        'cart_abandon_frequency': len(of_type('cart_abandon')),
+        'weekend_activity': len(weekend) / total * 100 if total else 0.0,
+        'late_night_activity': len(late_night) / total * 100 if total else 0.0,
+    }
+
+
+class EventScheduleMixin:
+    """One customer with a fixed week of mixed events, plus one older login"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        self.customer = Customer.objects.create(customer_id='CUST_0006', name='Dave', email='d@example.com')
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        schedule = [
+            ('login', 1, 9, {}), ('page_view', 1, 9, {}), ('logout', 1, 10, {}),
+            ('login', 2, 23, {}), ('purchase', 2, 23, {'amount': 120.5}), ('logout', 3, 1, {}),
+            ('login', 4, 3, {}), ('purchase', 4, 3, {'amount': '30'}), ('purchase', 4, 4, {}),
+            ('cart_abandon', 5, 14, {}), ('payment_failed', 5, 15, {}), ('search', 6, 20, {}),
+            ('support_ticket', 6, 21, {}), ('login', 6, 22, {}),
+            ('login', 20, 12, {}),  # outside the 7-day window
+        ]
+        for event_type, days_ago, hour, metadata in schedule:
+            CustomerEvent.objects.create(
+                customer=self.customer, event_type=event_type, metadata=metadata,
+                timestamp=(now - timedelta(days=days_ago)).replace(hour=hour)
+            )
+        self.now = now
+
+
+class BehavioralFeatureTests(EventScheduleMixin, TestCase):
+    """Aggregate-based feature extraction matches the per-event computation"""
+
+    def test_features_match_reference_in_two_queries(self):
+        from datetime import timedelta
+        from .anomaly_detection import CustomerAnomalyDetector
+
+        window_events = list(CustomerEvent.objects.filter(
+            customer=self.customer, timestamp__gte=self.now - timedelta(days=7)
+        ))
+        expected = reference_behavioral_features(window_events)
+
+        with self.assertNumQueries(2):
+            features = CustomerAnomalyDetector().extract_behavioral_features(self.customer)
+
+        self.assertEqual(list(features), list(expected))
+        for name, value in expected.items():
+            self.assertAlmostEqual(features[name], value, places=6, msg=name)
+
+    def test_customer_without_events_uses_one_query_and_defaults(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+
+        idle = Customer.objects.create(customer_id='CUST_0007', name='Eve', email='e@example.com')
+        with self.assertNumQueries(1):
+            features = CustomerAnomalyDetector().extract_behavioral_features(idle)
+        self.assertEqual(features, reference_behavioral_features([]))
+
+
+class PopulationDataMixin:
+    """A dozen customers with random events spread over the last 40 days"""
+
+    def setUp(self):
+        import random
+        from datetime import timedelta
+        from django.utils import timezone
+
+        rng = random.Random(7)
+        now = timezone.now()
+        event_types = [choice for choice, _ in CustomerEvent.EVENT_TYPES]
+        self.customers = []
+        for i in range(12):
+            customer = Customer.objects.create(customer_id=f'POP_{i}', name=f'Pop {i}', email=f'p{i}@example.com')
+            self.customers.append(customer)
+            events = [
+                CustomerEvent(
+                    customer=customer,
+                    event_type=rng.choice(event_types),
+                    metadata={'amount': rng.randint(5, 500)},
+                    timestamp=now - timedelta(minutes=rng.randint(1, 60 * 24 * 40))
+                )
+                for _ in range(rng.randint(0, 80) if i else 0)  # first customer stays idle
+            ]
+            for event in events:
+                event.fill_typed_fields()
+            CustomerEvent.objects.bulk_create(events)
+
+
+class PopulationFeatureMatrixTests(PopulationDataMixin, TestCase):
+    """Grouped population extraction agrees with per-customer extraction"""
+
+    def test_matrix_rows_match_single_customer_features(self):
+        from .anomaly_detection import CustomerAnomalyDetector, build_feature_matrix, FEATURE_NAMES
+
+        detector = CustomerAnomalyDetector()
+        ids, X = build_feature_matrix([c.id for c in self.customers], days_back=30, chunk_size=5)
+        for customer, row in zip(self.customers, X):
+            features = detector.extract_behavioral_features(customer, days_back=30)
+            self.assertEqual(list(features), FEATURE_NAMES)
+            for name, value in zip(FEATURE_NAMES, row):
+                self.assertAlmostEqual(value, features[name], places=6, msg=f'{customer.customer_id} {name}')
+
+    def test_sampling_respects_size_and_eligibility(self):
+        from django.db.models import Count
+        from .anomaly_detection import sample_customer_ids
+
+        eligible = set(Customer.objects.annotate(n=Count('events')).filter(n__gte=20).values_list('id', flat=True))
+        for strategy in ('random', 'stratified'):
+            sampled = sample_customer_ids(4, sampling=strategy, min_events=20)
+            self.assertLessEqual(len(sampled), 4)
+            self.assertTrue(set(sampled.tolist()) <= eligible)
+        self.assertEqual(set(sample_customer_ids(None, min_events=20).tolist()), eligible)
+
+        # Small samples overshoot across the strata; the trim must not always drop the newest ids
+        trimmed = set()
+        for seed in range(20):
+            sampled = sample_customer_ids(2, sampling='stratified', min_events=20, seed=seed)
+            self.assertEqual(len(sampled), 2)
+            trimmed.update(sampled.tolist())
+        self.assertIn(max(eligible), trimmed)
+
+
+class PersistedAnomalyModelTests(PopulationDataMixin, TestCase):
+    """Versioned model artifacts are loaded and hot-reloaded, never fitted inline"""
+
+    def setUp(self):
+        import tempfile
+        super().setUp()
+        cache.clear()
+        self.model_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.model_dir, ignore_errors=True)
+
+    def test_detection_never_fits_on_request_path(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+
+        detector = CustomerAnomalyDetector(model_dir=self.model_dir)
+        with mock.patch.object(detector, 'build_baseline_model') as build:
+            self.assertIsNone(detector.detect_anomaly(self.customers[1]))
+        build.assert_not_called()
+
+    def test_workers_load_and_hot_reload_published_versions(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+
+        trainer = CustomerAnomalyDetector(model_dir=self.model_dir)
+        self.assertTrue(trainer.build_baseline_model(customer_sample_size=None, min_events=1))
+        first = trainer.save_model()
+
+        worker = CustomerAnomalyDetector(model_dir=self.model_dir)
+        self.assertTrue(worker.refresh_model())
+        self.assertEqual(worker.model_version, first['version'])
+        self.assertIsNotNone(worker.detect_anomaly(self.customers[1]))
+
+        trainer.build_baseline_model(customer_sample_size=None, min_events=1)
+        with mock.patch('time.time', return_value=first['version'] / 1000 + 1):
+            second = trainer.save_model()
+        worker.refresh_model()  # within the check interval: keeps the loaded version
+        self.assertEqual(worker.model_version, first['version'])
+        worker.refresh_model(force=True)
+        self.assertEqual(worker.model_version, second['version'])
+
+    def test_batch_scoring_matches_single_customer_scores(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+
+        detector = CustomerAnomalyDetector(model_dir=self.model_dir)
+        detector.build_baseline_model(customer_sample_size=None, min_events=1)
+        customer_ids = [customer.id for customer in self.customers]
+
+        with mock.patch.object(detector.isolation_forest, 'predict') as predict:
+            result = detector.detect_anomalies_batch(customer_ids, alert_threshold=1.0)
+        predict.assert_not_called()
+        self.assertEqual(result['processed_count'], len(customer_ids))
+
+        for anomaly in result['anomalies']:
+            single = detector.detect_anomaly(anomaly['customer'], alert_threshold=-1.0)
+            self.assertAlmostEqual(anomaly['anomaly_score'], single['anomaly_score'], places=6)
+            self.assertTrue(single['is_anomaly'])
+        self.assertEqual(result['alerts_created'], len(result['anomalies']))
+        self.assertEqual(AnomalyAlert.objects.count(), result['alerts_created'])
+
+        # Alerts raised within the last six hours are not duplicated
+        again = detector.detect_anomalies_batch(customer_ids, alert_threshold=1.0)
+        self.assertEqual(again['alerts_created'], 0)
+
+
+class BehaviorCounterTests(EventScheduleMixin, TestCase):
+    """Rolling hourly and daily counters reproduce the SQL features for hour-aligned events"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_rebuilt_counters_match_sql_features(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+        from .behavior_counters import behavior_counters
+
+        behavior_counters.rebuild([self.customer.id])
+        expected = CustomerAnomalyDetector().extract_behavioral_features(self.customer)
+        with self.assertNumQueries(0):
+            features = behavior_counters.features(self.customer.id, days_back=7)
+        for name, value in expected.items():
+            self.assertAlmostEqual(features[name], value, places=4, msg=name)
+
+    def test_incremental_updates_match_rebuild(self):
+        from .behavior_counters import behavior_counters, CustomerCounters, COUNTER_KEY, WINDOW_DAYS
+
+        cache.set(COUNTER_KEY.format(self.customer.id), CustomerCounters().to_state(), None)
+        events = CustomerEvent.objects.filter(customer=self.customer)
+        behavior_counters.record_events([
+            {'customer_id': e.customer_id, 'event_type': e.event_type,
+             'metadata': e.metadata, 'timestamp': e.timestamp}
+            for e in events
+        ])
+        incremental = behavior_counters.window_features(self.customer.id)
+        behavior_counters.rebuild([self.customer.id])
+        self.assertEqual(incremental, behavior_counters.window_features(self.customer.id))
+        self.assertEqual(sorted(incremental), list(WINDOW_DAYS))
+        self.assertEqual(incremental[30]['login_frequency'], incremental[7]['login_frequency'] + 1)
+
+    def test_missing_counters_are_seeded_from_events(self):
+        from .behavior_counters import behavior_counters
+
+        # The first event after counters are enabled: the whole window counts, not just this event
+        event = CustomerEvent.objects.filter(customer=self.customer).latest('timestamp')
+        behavior_counters.record_events([
+            {'customer_id': event.customer_id, 'event_type': event.event_type, 'metadata': event.metadata, 'timestamp': event.timestamp}
+        ])
+        seeded = behavior_counters.window_features(self.customer.id)
+        behavior_counters.rebuild([self.customer.id])
+        self.assertEqual(seeded, behavior_counters.window_features(self.customer.id))
+
+    def test_updates_wait_for_another_workers_lock(self):
+        from .behavior_counters import behavior_counters, CustomerCounters, COUNTER_KEY, LOCK_KEY
+
+        cache.set(COUNTER_KEY.format(self.customer.id), CustomerCounters().to_state(), None)
+        cache.set(LOCK_KEY.format(self.customer.id), 'other-worker', 5)
+        event = {'customer_id': self.customer.id, 'event_type': 'login', 'metadata': {}, 'timestamp': self.now}
+        with mock.patch('churnapp.behavior_counters.LOCK_WAIT_SECONDS', 0):
+            behavior_counters.record_events([event])
+        self.assertEqual(behavior_counters.features(self.customer.id, 1)['login_frequency'], 0)
+        self.assertEqual(cache.get(LOCK_KEY.format(self.customer.id)), 'other-worker')
+
+        cache.delete(LOCK_KEY.format(self.customer.id))
+        behavior_counters.record_events([event])
+        self.assertEqual(behavior_counters.features(self.customer.id, 1)['login_frequency'], 1)
+        self.assertIsNone(cache.get(LOCK_KEY.format(self.customer.id)))
+
+    def test_aged_hours_fold_into_compact_daily_rows(self):
+        from datetime import timedelta
+        from .behavior_counters import CustomerCounters
+
+        counters = CustomerCounters()
+        for event in CustomerEvent.objects.filter(customer=self.customer).order_by('timestamp'):
+            counters.record(event.event_type, event.timestamp.timestamp(), event.metadata)
+        before = {days: counters.features(days, now=self.now) for days in (7, 30)}
+
+        # A day later every event has left the hourly ring; none is lost
+        later = self.now + timedelta(days=1)
+        counters.record('page_view', later.timestamp())
+        after = counters.features(30, now=later)
+        self.assertEqual(after['login_frequency'], before[30]['login_frequency'])
+        self.assertEqual(after['purchase_frequency'], before[30]['purchase_frequency'])
+        self.assertAlmostEqual(after['avg_login_hour'], before[30]['avg_login_hour'])
+        self.assertEqual(counters.features(1, now=later)['engagement_frequency'], 1)
+
+        state = counters.to_state()
+        self.assertLess(sum(len(value) for value in state.values() if isinstance(value, bytes)), 3 * 1024)
+        self.assertEqual(CustomerCounters.from_state(state).features(7, now=later), counters.features(7, now=later))
+
+    def test_extraction_reads_counters_when_enabled(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+        from .behavior_counters import behavior_counters
+
+        behavior_counters.rebuild([self.customer.id])
+        with mock.patch('churnapp.behavior_counters.COUNTERS_ENABLED', True):
+            with self.assertNumQueries(0):
+                CustomerAnomalyDetector().extract_behavioral_features(self.customer)
+
+
+class OnlineBaselineTests(TestCase):
+    """Daily baseline folding matches batch statistics and is idempotent"""
+
+    def setUp(self):
+        from datetime import datetime, time, timedelta
+        from django.utils import timezone
+
+        self.customer = Customer.objects.create(customer_id='CUST_0007', name='Erin', email='e@example.com')
+        self.today = timezone.localdate()
+        self.daily_logins = [3, 0, 1, 4, 2]
+        events = []
+        for offset, logins in zip(range(5, 0, -1), self.daily_logins):
+            day_start = timezone.make_aware(datetime.combine(self.today - timedelta(days=offset), time(9)))
+            for i in range(logins):
+                login_at = day_start + timedelta(hours=i)
+                events += [
+                    CustomerEvent(customer=self.customer, event_type='login', timestamp=login_at),
+                    CustomerEvent(customer=self.customer, event_type='page_view', timestamp=login_at + timedelta(minutes=5)),
+                    CustomerEvent(customer=self.customer, event_type='logout', timestamp=login_at + timedelta(minutes=20)),
+                ]
+        events.append(CustomerEvent(
+            customer=self.customer, event_type='purchase', metadata={'amount': 40}, amount=40,
+            timestamp=timezone.make_aware(datetime.combine(self.today - timedelta(days=2), time(12)))
+        ))
+        CustomerEvent.objects.bulk_create(events)
+
+    def test_seeded_baseline_matches_batch_statistics(self):
+        import numpy as np
+        from .baselines import seed_baseline
+
+        baseline = seed_baseline(self.customer, days_back=5)
+        self.assertAlmostEqual(baseline.avg_logins_per_day, np.mean(self.daily_logins))
+        self.assertAlmostEqual(baseline.std_logins_per_day, np.std(self.daily_logins))
+        self.assertAlmostEqual(baseline.avg_purchases_per_week, 7 / 5)
+        self.assertAlmostEqual(baseline.avg_purchase_amount, 40)
+        self.assertAlmostEqual(baseline.avg_session_duration, 20)
+        self.assertAlmostEqual(baseline.avg_page_views_per_session, 1)
+        self.assertEqual(baseline.data_points_count, 5)
+        self.assertEqual(len(baseline.typical_login_hours), 24)
+        self.assertAlmostEqual(baseline.typical_login_hours[9], 4 / 5)
+
+    def test_roll_folds_each_day_once(self):
+        from datetime import timedelta
+        from .baselines import roll_baselines
+
+        yesterday = self.today - timedelta(days=1)
+        self.assertEqual(roll_baselines(yesterday), 1)
+        self.assertEqual(roll_baselines(yesterday), 0)
+
+        baseline = Customer.objects.get(id=self.customer.id).baseline
+        self.assertEqual(baseline.data_points_count, 1)
+        self.assertEqual(baseline.last_observed_date, yesterday)
+        self.assertEqual(baseline.avg_logins_per_day, self.daily_logins[-1])
+
+    def test_ranges_cover_idle_customers_and_match_single_pass(self):
+        from datetime import timedelta
+        from .models import CustomerBehaviorBaseline
+        from .baselines import roll_baselines
+        from .tasks import update_customer_baselines
+
+        for i in range(3):
+            Customer.objects.create(customer_id=f'IDLE_{i}', name=f'Idle {i}', email=f'i{i}@example.com')
+        day = (self.today - timedelta(days=1)).isoformat()
+        result = update_customer_baselines(day, fan_out=False)
+        self.assertEqual(result['updated_count'], 4)
+        single_pass = {b.customer_id: b.avg_logins_per_day for b in CustomerBehaviorBaseline.objects.all()}
+
+        CustomerBehaviorBaseline.objects.all().delete()
+        self.assertEqual(roll_baselines(self.today - timedelta(days=1), range_size=2, chunk_size=1), 4)
+        self.assertEqual(
+            {b.customer_id: b.avg_logins_per_day for b in CustomerBehaviorBaseline.objects.all()},
+            single_pass
+        )
+        self.assertEqual(single_pass[self.customer.id], self.daily_logins[-1])
+
+
+class DetectionCoalescingTests(TestCase):
+    """Bursts of critical events collapse into one detection run per customer"""
+
+    def setUp(self):
+        from .coalescing import DetectionCoalescer
+
+        cache.clear()
+        self.coalescer = DetectionCoalescer(debounce_seconds=10, max_wait_seconds=30)
+
+    def test_burst_is_suppressed_until_quiet(self):
+        with mock.patch('time.time', return_value=1000.0):
+            self.assertEqual(self.coalescer.trigger([1, 2]), [1, 2])
+        for second in range(1001, 1006):
+            with mock.patch('time.time', return_value=float(second)):
+                self.assertEqual(self.coalescer.trigger([1]), [])
+
+        with mock.patch('time.time', return_value=1011.0):
+            ready, waiting, next_due = self.coalescer.due([1, 2])
+        self.assertEqual((ready, waiting, next_due), ([2], [1], 4.0))
+
+        self.coalescer.complete(ready)
+        with mock.patch('time.time', return_value=1015.0):
+            self.assertEqual(self.coalescer.due([1])[0], [1])
+            self.assertEqual(self.coalescer.trigger([2]), [2])
+
+        stats = self.coalescer.stats()
+        self.assertEqual(stats['triggered'], 8)
+        self.assertEqual(stats['suppressed'], 5)
+        self.assertEqual(stats['executed'], 1)
+
+    def test_max_wait_caps_a_never_ending_burst(self):
+        for second in range(1000, 1040, 5):
+            with mock.patch('time.time', return_value=float(second)):
+                self.coalescer.trigger([1])
+                ready, _, _ = self.coalescer.due([1])
+            if ready:
+                break
+        self.assertEqual(second, 1030)
+
+    @mock.patch('churnapp.tasks.detect_customer_anomalies')
+    @mock.patch('churnapp.tasks.run_coalesced_detection.apply_async')
+    def test_task_reschedules_customers_still_in_a_burst(self, apply_async, detect):
+        from .tasks import queue_anomaly_detection, run_coalesced_detection
+
+        detect.return_value = {'processed_count': 1, 'anomalies_found': 0}
+        with mock.patch('churnapp.tasks.detection_coalescer', self.coalescer):
+            with mock.patch('time.time', return_value=1000.0):
+                queue_anomaly_detection([1, 2])
+                queue_anomaly_detection([1, 2])
+            apply_async.assert_called_once_with(([1, 2],), countdown=10)
+
+            with mock.patch('time.time', return_value=1008.0):
+                self.coalescer.trigger([2])
+            with mock.patch('time.time', return_value=1010.0):
+                result = run_coalesced_detection([1, 2])
+        detect.assert_called_once_with([1])
+        self.assertEqual(result['deferred_count'], 1)
+        apply_async.assert_called_with(([2],), countdown=8.0)
+
+
+class SessionPairingTests(TestCase):
+    """Vectorized login/logout pairing and persisted sessions"""
+
+    def test_pairing_rules(self):
+        from .sessions import pair_sessions
+
+        hour = 3600
+        sessions = pair_sessions(
+            [1, 1, 1, 1, 1, 1, 2, 2, 3, 3],
+            [True, True, False, False, True, False, True, True, True, False],
+            [0, 10, 70, 80, 100, 100 + 13 * hour, 0, 5, 0, 1800],
+        )
+        # Superseded login, stray logout, overlong session and a login left
+        # open across the customer boundary never pair
+        self.assertEqual(sessions.customer_ids.tolist(), [1, 3])
+        self.assertEqual(sessions.minutes.tolist(), [1.0, 30.0])
+        self.assertEqual(sessions.average_minutes(), {1: 1.0, 3: 30.0})
+
+    def test_ingested_logouts_persist_sessions_read_back_by_features(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .anomaly_detection import CustomerAnomalyDetector
+        from .ingestion import ingest_events
+        from .models import CustomerSession
+
+        customer = Customer.objects.create(customer_id='CUST_0008', name='Finn', email='f@example.com')
+        now = timezone.now()
+        events = [
+            {'customer_id': customer.id, 'event_type': event_type, 'metadata': {},
+             'timestamp': (now - timedelta(minutes=minutes_ago)).isoformat()}
+            for event_type, minutes_ago in (('login', 200), ('logout', 180), ('login', 70), ('logout', 20))
+        ]
+        ingest_events(events[:2])
+        ingest_events(events[2:])
+        self.assertEqual(
+            sorted(CustomerSession.objects.values_list('duration_minutes', flat=True)), [20.0, 50.0]
+        )
+
+        paired = CustomerAnomalyDetector().extract_behavioral_features(customer)
+        with mock.patch('churnapp.sessions.READ_PERSISTED_SESSIONS', True):
+            persisted = CustomerAnomalyDetector().extract_behavioral_features(customer)
+        self.assertEqual(persisted['avg_session_duration'], 35.0)
+        self.assertEqual(persisted, paired)
+
+
+class AlertDedupTests(TestCase):
+    """TTL dedup index for (customer, alert_type) pairs"""
+
+    def setUp(self):
+        from .alert_dedup import AlertDedupIndex
+
+        cache.clear()
+        self.customer = Customer.objects.create(customer_id='CUST_0009', name='Gail', email='g@example.com')
+        self.index = AlertDedupIndex(ttl_seconds=3600)
+
+    def test_only_first_claim_wins_and_release_reopens(self):
+        self.assertTrue(self.index.claim(self.customer.id, 'login_drop'))
+        self.assertFalse(self.index.claim(self.customer.id, 'login_drop'))
+        self.assertTrue(self.index.claim(self.customer.id, 'purchase_drop'))
+        self.index.release(self.customer.id, 'login_drop')
+        self.assertTrue(self.index.claim(self.customer.id, 'login_drop'))
+
+    def test_cold_index_is_warmed_from_recent_alerts(self):
+        AnomalyAlert.objects.create(
+            customer=self.customer, alert_type='login_drop', severity='high',
+            description='Login frequency dropped', anomaly_score=-0.8
+        )
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertFalse(self.index.claim(self.customer.id, 'login_drop'))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.index.claim(self.customer.id, 'purchase_drop'))
+
+    def test_falls_back_to_in_process_index(self):
+        with mock.patch('churnapp.alert_dedup.cache.add', side_effect=ConnectionError('down')):
+            self.assertTrue(self.index.claim(self.customer.id, 'login_drop'))
+            self.assertFalse(self.index.claim(self.customer.id, 'login_drop'))
+
+    def test_bulk_alerts_skip_duplicates_without_lookup_queries(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+
+        detector = CustomerAnomalyDetector()
+        alerts = [
+            AnomalyAlert(customer=self.customer, alert_type=alert_type, severity='high',
+                         description='test', anomaly_score=-0.9)
+            for alert_type in ('login_drop', 'login_drop', 'purchase_drop')
+        ]
+        with mock.patch('churnapp.anomaly_detection.alert_dedup', self.index):
+            self.index.claim(0, 'warm')  # warm the empty index outside the assertion
+            with self.assertNumQueries(1):
+                created = detector._bulk_create_alerts(alerts)
+        self.assertEqual([alert.alert_type for alert in created], ['login_drop', 'purchase_drop'])
+
+
+class StreamingDetectorTests(TestCase):
+    """Robust z-score detector scored from incrementally updated baselines"""
+
+    def setUp(self):
+        from datetime import datetime, time, timedelta
+        from django.utils import timezone
+        from .baselines import seed_baseline
+
+        cache.clear()
+        today = timezone.localdate()
+        self.steady, self.troubled, self.newcomer = [
+            Customer.objects.create(customer_id=f'STREAM_{i}', name=f'Stream {i}', email=f's{i}@example.com')
+            for i in range(3)
+        ]
+        for customer in (self.steady, self.troubled):
+            CustomerEvent.objects.bulk_create([
+                CustomerEvent(customer=customer, event_type='login', timestamp=timezone.make_aware(
+                    datetime.combine(today - timedelta(days=offset), time(10))
+                ))
+                for offset in range(1, 21)
+            ])
+            seed_baseline(customer, days_back=20)
+        CustomerEvent.objects.bulk_create([
+            CustomerEvent(customer=self.troubled, event_type='payment_failed') for _ in range(30)
+        ])
+
+    def test_scores_follow_robust_z_and_need_no_fit(self):
+        from .streaming_detection import StreamingAnomalyDetector
+
+        detector = StreamingAnomalyDetector()
+        self.assertEqual(detector.detect_anomaly(self.steady)['anomaly_score'], 1.0)
+        self.assertEqual(detector.detect_anomaly(self.newcomer)['anomaly_score'], 1.0)
+
+        result = detector.detect_anomaly(self.troubled)
+        self.assertTrue(result['is_anomaly'])
+        self.assertLess(result['anomaly_score'], -0.5)
+        self.assertTrue(AnomalyAlert.objects.filter(customer=self.troubled).exists())
+
+        batch = detector.detect_anomalies_batch([self.steady.id, self.troubled.id, self.newcomer.id])
+        self.assertEqual([anomaly['customer'] for anomaly in batch['anomalies']], [self.troubled])
+        self.assertAlmostEqual(batch['anomalies'][0]['anomaly_score'], result['anomaly_score'])
+
+
+class QuantileSketchTests(TestCase):
+    """P-squared sketches of daily metrics and per-customer anomaly thresholds"""
+
+    def test_p2_tracks_exact_quantiles(self):
+        import numpy as np
+        from .sketches import P2Quantile
+
+        values = np.random.default_rng(7).gamma(2.0, 3.0, size=5000)
+        for p in (0.05, 0.5, 0.95):
+            estimator = P2Quantile(p)
+            for value in values:
+                estimator.add(value)
+            self.assertAlmostEqual(estimator.value(), np.quantile(values, p), delta=0.05 * values.std())
+
+    def test_sketches_round_trip_compactly(self):
+        from .sketches import MetricSketches
+
+        sketches = MetricSketches()
+        for day in range(30):
+            sketches.add({'logins': day % 4, 'purchases': day % 2, 'problems': 0, 'cart_abandons': day % 3})
+        restored = MetricSketches.from_bytes(sketches.to_bytes())
+        self.assertEqual(len(sketches.to_bytes()), 324)
+        self.assertEqual(restored.count, 30)
+        for metric, (p5, p95) in sketches.quantiles().items():
+            self.assertAlmostEqual(restored.quantiles()[metric][0], p5, places=4)
+            self.assertAlmostEqual(restored.quantiles()[metric][1], p95, places=4)
+
+        restored.add({'logins': 1, 'purchases': 0, 'problems': 0, 'cart_abandons': 0})
+        self.assertEqual(MetricSketches.from_bytes(restored.to_bytes()).count, 31)
+
+    def test_bursty_customer_is_judged_against_own_spread(self):
+        from .anomaly_detection import CustomerAnomalyDetector
+        from .baselines import EMPTY_DAY, MIN_SKETCH_DAYS, baseline_to_dict, fold_day
+        from .models import CustomerBehaviorBaseline
+        from datetime import timedelta
+        from django.utils import timezone
+
+        def baseline_for(daily_logins):
+            baseline = CustomerBehaviorBaseline()
+            start = timezone.localdate() - timedelta(days=len(daily_logins))
+            for offset, logins in enumerate(daily_logins):
+                fold_day(baseline, start + timedelta(days=offset), {**EMPTY_DAY, 'logins': logins})
+            return baseline_to_dict(baseline)
+
+        quiet_week = {
+            'login_frequency': 3, 'purchase_frequency': 0, 'problem_frequency': 0, 'cart_abandon_frequency': 0
+        }
+        detector = CustomerAnomalyDetector()
+
+        # Mostly idle with occasional 8-login days: a quiet week is normal for them
+        bursty = baseline_for([8 if day % 4 == 0 else 0 for day in range(40)])
+        self.assertIn('login_drop', [a['type'] for a in detector._analyze_against_ratios(quiet_week, bursty)])
+        self.assertEqual(detector._analyze_anomaly_details(quiet_week, bursty), [])
+
+        steady = baseline_for([3] * 40)
+        self.assertEqual(
+            [a['type'] for a in detector._analyze_anomaly_details(quiet_week, steady)], ['login_drop']
+        )
+
+        newcomer = baseline_for([3] * (MIN_SKETCH_DAYS - 1))
+        self.assertIsNone(newcomer['quantiles'])
+
+
+class PlatformIncidentTests(TestCase):
+    """Population-level spike detection with one incident and per-customer suppression"""
+
+    def setUp(self):
+        from .incidents import platform_monitor
+
+        cache.clear()
+        self.monitor = platform_monitor
+        self.monitor.reset()
+        patcher = mock.patch.multiple(self.monitor, min_events=20, warmup_minutes=5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.monitor.reset)
+        self.customers = [
+            Customer.objects.create(customer_id=f'INC_{i}', name=f'Incident {i}', email=f'i{i}@example.com')
+            for i in range(3)
+        ]
+
+    def events_in_minute(self, minute, event_type, count, customer=None):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        start = timezone.now().replace(second=0, microsecond=0) - timedelta(minutes=30)
+        return [
+            {
+                'customer_id': (customer or self.customers[i % len(self.customers)]).id,
+                'event_type': event_type,
+                'timestamp': start + timedelta(minutes=minute, seconds=i % 60)
+            }
+            for i in range(count)
+        ]
+
+    @mock.patch('churnapp.tasks.send_incident_notification.delay')
+    def test_spike_raises_one_incident_and_suppresses_detection(self, notify):
+        from .ingestion import ingest_events
+        from .models import PlatformIncident
+
+        for minute in range(10):
+            result = ingest_events(self.events_in_minute(minute, 'app_crash', 3))
+            self.assertEqual(len(result['critical_customer_ids']), 3)
+        self.assertFalse(PlatformIncident.objects.exists())
+
+        for minute in (10, 11):
+            result = ingest_events(self.events_in_minute(minute, 'app_crash', 300))
+            self.assertEqual(result['critical_customer_ids'], [])
+
+        self.assertEqual(self.monitor.suppressed_alert_types(), {'problem_spike'})
+
+        # Other event types still trigger detection during the incident
+        result = ingest_events(self.events_in_minute(12, 'purchase', 1) + self.events_in_minute(12, 'app_crash', 1))
+        self.assertEqual(result['critical_customer_ids'], [self.customers[0].id])
+
+        incident = PlatformIncident.objects.get()
+        self.assertEqual((incident.event_type, incident.status, incident.peak_per_minute), ('app_crash', 'active', 300))
+        self.assertAlmostEqual(incident.expected_per_minute, 3, delta=1)
+        notify.assert_called_once_with(incident.id)
+
+    @mock.patch('churnapp.tasks.send_incident_notification.delay')
+    def test_spike_split_across_workers_is_counted_platform_wide(self, notify):
+        from .incidents import PlatformSpikeDetector
+        from .models import PlatformIncident
+
+        workers = [
+            PlatformSpikeDetector(alpha=0.1, sigmas=6.0, min_events=20, warmup_minutes=5, quiet_minutes=10)
+            for _ in range(2)
+        ]
+
+        def record(worker, minute, count):
+            return worker.record_events(
+                (event['event_type'], event['timestamp']) for event in self.events_in_minute(minute, 'app_crash', count)
+            )
+
+        for minute in range(10):
+            for worker in workers:
+                record(worker, minute, 2)
+        # 15 crashes in each worker's share, 30 platform-wide against min_events=20
+        raised = record(workers[0], 10, 15) + record(workers[1], 10, 15)
+        self.assertEqual(len(raised), 1)
+        self.assertEqual(PlatformIncident.objects.get().event_type, 'app_crash')
+        self.assertAlmostEqual(PlatformIncident.objects.get().expected_per_minute, 4, delta=1)
+
+    def test_cache_outage_does_not_raise_on_ingestion(self):
+        broken = mock.Mock(**{f'{name}.side_effect': RuntimeError('redis down') for name in ('add', 'get', 'get_many', 'incr', 'set', 'touch')})
+        events = [(event['event_type'], event['timestamp']) for event in self.events_in_minute(0, 'app_crash', 3)]
+        with mock.patch('churnapp.incidents.cache', broken), mock.patch('churnapp.caching.cache', broken):
+            self.assertEqual(self.monitor.record_events(events), [])
+            self.monitor._report_spike('app_crash', 100, 3.0)
+            self.monitor._extend_incident('app_crash', 100)
+            self.assertEqual(self.monitor.active_event_types(), set())
+
+    @mock.patch('churnapp.tasks.send_incident_notification.delay')
+    def test_active_incident_withholds_customer_alerts_of_its_type(self, notify):
+        from datetime import datetime, time, timedelta
+        from django.utils import timezone
+        from .baselines import seed_baseline
+        from .incidents import ACTIVE_KEY
+        from .streaming_detection import StreamingAnomalyDetector
+
+        troubled = self.customers[0]
+        today = timezone.localdate()
+        CustomerEvent.objects.bulk_create([
+            CustomerEvent(customer=troubled, event_type='login', timestamp=timezone.make_aware(
+                datetime.combine(today - timedelta(days=offset), time(10))
+            ))
+            for offset in range(1, 21)
+        ])
+        seed_baseline(troubled, days_back=20)
+        CustomerEvent.objects.bulk_create([
+            CustomerEvent(customer=troubled, event_type='payment_failed') for _ in range(30)
+        ])
+        detector = StreamingAnomalyDetector()
+
+        cache.set(ACTIVE_KEY.format('payment_failed'), 1, 600)
+        result = detector.detect_anomaly(troubled)
+        self.assertTrue(result['is_anomaly'])
+        self.assertTrue(result['incident_suppressed'])
+        self.assertFalse(AnomalyAlert.objects.exists())
+
+        cache.delete(ACTIVE_KEY.format('payment_failed'))
+        self.assertFalse(detector.detect_anomaly(troubled)['incident_suppressed'])
+        self.assertEqual(AnomalyAlert.objects.get().alert_type, 'problem_spike')
+
+
+class DashboardSketchTests(TestCase):
+    """Space-Saving and HyperLogLog dashboard stats checked against exact queries"""
+
+    def setUp(self):
+        from .dashboard_stats import dashboard_stats
+
+        dashboard_stats.flush()  # drop deltas left by other tests' ingestion
+        cache.clear()
+
+    def test_space_saving_bounds_hold_after_merge(self):
+        import numpy as np
+        from collections import Counter
+        from .sketches import SpaceSaving
+
+        stream = np.random.default_rng(5).zipf(1.3, size=20000) % 5000
+        exact = Counter(stream.tolist())
+        halves = []
+        for part in (stream[:10000], stream[10000:]):
+            summary = SpaceSaving(100)
+            for start in range(0, len(part), 1000):
+                summary.add_counts(Counter(part[start:start + 1000].tolist()))
+            halves.append(summary)
+        halves[0].merge(halves[1])
+        merged = halves[0]
+
+        bound = merged.error_bound()
+        self.assertEqual(merged.total, len(stream))
+        for item, count, error in merged.top(100):
+            self.assertGreaterEqual(count, exact[item])
+            self.assertLessEqual(count - exact[item], min(error, bound))
+        for item, count in exact.items():
+            if count > bound:
+                self.assertIn(item, merged.counters)
+        self.assertEqual([item for item, _, _ in merged.top(5)], [item for item, _ in exact.most_common(5)])
+
+    def test_hyperloglog_error_and_union(self):
+        import numpy as np
+        from .sketches import HyperLogLog, hash64
+
+        left, right = HyperLogLog(), HyperLogLog()
+        left.add_hashes(hash64(np.arange(0, 30000)))
+        right.add_hashes(hash64(np.arange(20000, 50000)))
+        for sketch, exact in ((left, 30000), (right, 30000)):
+            self.assertLess(abs(sketch.count() - exact) / exact, 3 * sketch.relative_error())
+        restored = HyperLogLog.from_bytes(left.to_bytes())
+        restored.merge(right)
+        self.assertLess(abs(restored.count() - 50000) / 50000, 3 * restored.relative_error())
+
+        small = HyperLogLog()
+        small.add_hashes(hash64(np.arange(40)))
+        self.assertEqual(small.count(), 40)
+
+    def test_endpoint_matches_exact_queries(self):
+        from django.db.models import Count
+        from django.utils import timezone
+        from .dashboard_stats import dashboard_stats
+        from .ingestion import ingest_events
+
+        customers = [
+            Customer.objects.create(customer_id=f'DASH_{i}', name=f'Dash {i}', email=f'd{i}@example.com')
+            for i in range(30)
+        ]
+        now = timezone.now()
+        events = [
+            {'customer_id': customer.id, 'event_type': 'payment_failed', 'timestamp': now}
+            for index, customer in enumerate(customers) for _ in range(index % 7)
+        ] + [{'customer_id': customer.id, 'event_type': 'page_view', 'timestamp': now} for customer in customers[:25]]
+        for start in range(0, len(events), 40):
+            ingest_events(events[start:start + 40])
+        dashboard_stats.flush()
+
+        response = self.client.get('/api/dashboard-stats/', {'event_type': 'payment_failed', 'k': 5})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        exact = dict(
+            CustomerEvent.objects.filter(event_type='payment_failed').values('customer_id')
+            .annotate(n=Count('id')).order_by().values_list('customer_id', 'n')
+        )
+        top = data['top_customers']
+        self.assertEqual(top['total_events'], sum(exact.values()))
+        self.assertEqual(len(top['customers']), 5)
+        for entry in top['customers']:
+            self.assertEqual(entry['count'], exact[entry['customer_id']])  # fewer customers than capacity: exact
+        self.assertEqual(top['customers'][0]['count'], max(exact.values()))
+
+        distinct = CustomerEvent.objects.values('customer_id').distinct().count()
+        self.assertEqual(data['active_customers']['hour'], distinct)
+        self.assertEqual(data['active_customers']['day'], distinct)
+
+        self.assertEqual(self.client.get('/api/dashboard-stats/', {'event_type': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard-stats/', {'k': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard-stats/', {'k': -5}).status_code, 400)
+
+    def test_deltas_flush_in_batches_under_per_sketch_locks(self):
+        from django.utils import timezone
+        from .dashboard_stats import DashboardStats, LOCK_KEY, TOP_KEY, ACTIVE_HOUR_KEY, _hour
+
+        stats = DashboardStats(capacity=50, precision=10, flush_events=3, flush_interval_ms=60000)
+        now = timezone.now()
+        top_key = TOP_KEY.format('payment_failed', _hour(now))
+
+        with mock.patch('churnapp.dashboard_stats.cache.add') as add:
+            stats.record_events([(1, 'payment_failed', now)])
+            stats.record_events([(2, 'payment_failed', now)])
+        add.assert_not_called()  # below the batch threshold: no cache traffic
+
+        # Another worker is merging the top-k sketch: the active counts go in, the top-k delta waits
+        cache.set(LOCK_KEY.format(top_key), 'other-worker', 5)
+        stats.record_events([(1, 'payment_failed', now)])
+        self.assertIsNone(cache.get(top_key))
+        self.assertIsNotNone(cache.get(ACTIVE_HOUR_KEY.format(_hour(now))))
+        self.assertEqual(cache.get(LOCK_KEY.format(top_key)), 'other-worker')  # not released by us
+
+        cache.delete(LOCK_KEY.format(top_key))
+        self.assertTrue(stats.flush())
+        self.assertEqual(stats.top_customers(['payment_failed'], hour=_hour(now))['total_events'], 3)
+        stats._timer.cancel()
+
+    def test_pending_delta_is_capped_while_cache_is_down(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .dashboard_stats import DashboardStats, TOP_KEY, _hour
+
+        stats = DashboardStats(capacity=50, precision=10, flush_events=1, flush_interval_ms=60000, max_pending_keys=6)
+        now = timezone.now()
+        hours = [now - timedelta(hours=offset) for offset in (3, 2, 1, 0)]
+        with mock.patch('churnapp.caching.cache.add', side_effect=ConnectionError('cache down')):
+            for timestamp in hours:
+                stats.record_events([(1, 'payment_failed', timestamp)])  # flushes, and fails, every event
+
+        # Each hour pends a top-k and an active-hour key plus the day keys; the oldest hours went first
+        pending = list(stats._pending_counts) + list(stats._pending_active)
+        self.assertLessEqual(len(pending), 6)
+        self.assertIn(TOP_KEY.format('payment_failed', _hour(now)), stats._pending_counts)
+        self.assertNotIn(TOP_KEY.format('payment_failed', _hour(hours[0])), stats._pending_counts)
+        self.assertEqual(stats._pending_events, sum(sum(c.values()) for c in stats._pending_counts.values()))
+
+        self.assertTrue(stats.flush())
+        self.assertEqual(stats.top_customers(['payment_failed'], hour=_hour(now))['total_events'], 1)
+        stats._timer.cancel()
+
+
+class FusedPipelineTests(TestCase):
+    """Event-to-watchlist follow-ups run as one task or as the legacy chain"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(customer_id='FUSE_1', name='Fused', email='f@example.com')
+        self.result = {
+            'anomaly_score': -0.9,
+            'is_anomaly': True,
+            'incident_suppressed': False,
+            'anomaly_details': [{'type': 'purchase_drop', 'severity': 'critical'}]
+        }
+
+    @mock.patch('churnapp.pipeline.group_send')
+    @mock.patch('churnapp.pipeline.predict_churn_probability', return_value=0.7)
+    def test_fused_followups_reuse_the_loaded_customer(self, predict, send):
+        from .tasks import _handle_anomaly_result
+
+        # Customer already loaded: watchlist lookup and insert (in a savepoint), no refetch
+        with self.assertNumQueries(4):
+            _handle_anomaly_result(self.customer, self.result, fused=True)
+
+        entry = RealTimeWatchlist.objects.get(customer=self.customer)
+        self.assertEqual((entry.churn_probability, entry.risk_level), (0.7, 'high'))
+        self.assertEqual(entry.anomaly_context['anomaly_types'], ['purchase_drop'])
+        self.assertEqual([call.args[0] for call in send.call_args_list], ['alerts', 'watchlist'])
+        self.assertEqual(send.call_args_list[1].args[2]['action'], 'added')
+
+        _handle_anomaly_result(self.customer, {**self.result, 'anomaly_score': -0.9}, fused=True)
+        self.assertEqual(send.call_args_list[-1].args[2]['action'], 'updated')
+        self.assertEqual(RealTimeWatchlist.objects.count(), 1)
+
+    @mock.patch('churnapp.pipeline.group_send')
+    @mock.patch('churnapp.pipeline.predict_churn_probability', side_effect=RuntimeError('model unavailable'))
+    def test_fused_followup_failure_does_not_retry_detection(self, predict, send):
+        from .tasks import detect_customer_anomaly
+
+        with mock.patch('churnapp.tasks.anomaly_detector.detect_anomaly', return_value=self.result), \
+                mock.patch('churnapp.tasks.FUSED_PIPELINE', True), \
+                mock.patch.object(detect_customer_anomaly, 'retry') as retry:
+            detect_customer_anomaly(self.customer.id)
+
+        retry.assert_not_called()
+        self.assertEqual([call.args[0] for call in send.call_args_list], ['alerts'])
+        self.assertFalse(RealTimeWatchlist.objects.exists())
+
+    @mock.patch('churnapp.tasks.group_send')
+    @mock.patch('churnapp.tasks.predict_with_explainability', return_value={'churn_probability': 0.7})
+    def test_chained_followups_reach_the_same_watchlist_state(self, predict, send):
+        from celery import current_app
+        from .tasks import _handle_anomaly_result
+
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', current_app.conf.task_always_eager)
+        current_app.conf.task_always_eager = True
+        _handle_anomaly_result(self.customer, self.result, fused=False)
+
+        entry = RealTimeWatchlist.objects.get(customer=self.customer)
+        self.assertEqual((entry.churn_probability, entry.risk_level, entry.is_active), (0.7, 'high', True))
+        self.assertCountEqual([call.args[0] for call in send.call_args_list], ['alerts', 'watchlist'])
+
+
+class NotificationBatchingTests(TestCase):
+    """Per-tick batching of channel layer notifications and consumer unpacking"""
+
+    def test_messages_in_a_tick_share_one_group_send(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from .notifications import NotificationBatcher
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)('alerts', channel)
+        self.addCleanup(async_to_sync(layer.group_discard), 'alerts', channel)
+
+        batcher = NotificationBatcher(tick_ms=100, max_batch=500, autostart=False)
+        for customer_id in range(3):
+            batcher.send('alerts', 'send_alert', {'type': 'anomaly_detected', 'customer_id': customer_id})
+        batcher.send('watchlist', 'send_update', {'type': 'watchlist_update', 'customer_id': 7})
+
+        self.assertEqual(batcher.flush(), 2)
+        received = async_to_sync(layer.receive)(channel)
+        self.assertEqual(received['type'], 'send_alert_batch')
+        self.assertEqual([message['customer_id'] for message in received['messages']], [0, 1, 2])
+
+        batcher.send('alerts', 'send_alert', {'type': 'anomaly_detected', 'customer_id': 9})
+        batcher.flush()
+        self.assertEqual(async_to_sync(layer.receive)(channel), {
+            'type': 'send_alert', 'message': {'type': 'anomaly_detected', 'customer_id': 9}
+        })
+        self.assertEqual(batcher.stats()['messages_per_send'], 1.67)
+
+    def test_consumers_forward_a_batch_in_one_frame(self):
+        from asgiref.sync import async_to_sync
+        from .consumers import AlertsConsumer, WatchlistConsumer
+
+        messages = [{'type': 'anomaly_detected', 'customer_id': 1}, {'type': 'anomaly_detected', 'customer_id': 2}]
+        for consumer, handler in ((AlertsConsumer(), 'send_alert_batch'), (WatchlistConsumer(), 'send_update_batch')):
+            consumer.send = mock.AsyncMock()
+            async_to_sync(getattr(consumer, handler))({'type': handler, 'messages': messages})
+
+            consumer.send.assert_awaited_once()
+            frame = json.loads(consumer.send.await_args.kwargs['text_data'])
+            self.assertEqual(frame, {'type': 'batch', 'messages': messages})
+
+
+class BatchDetectionFanOutTests(TestCase):
+    """Batch detection is split into active-id ranges and merged by a chord callback"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        now = timezone.now()
+        self.cutoff = now - timedelta(hours=24)
+        self.customers = [
+            Customer.objects.create(customer_id=f'FAN_{i}', name=f'Fan {i}', email=f'fan{i}@example.com', last_activity=now)
+            for i in range(7)
+        ]
+        # Idle for days; the second one is still active through a recent event
+        Customer.objects.filter(id__in=[self.customers[2].id, self.customers[5].id]).update(last_activity=now - timedelta(days=3))
+        CustomerEvent.objects.create(customer=self.customers[5], event_type='login', timestamp=now)
+        self.active_ids = sorted({c.id for c in self.customers} - {self.customers[2].id})
+
+    def detect(self, customer_ids, **kwargs):
+        if self.customers[0].id in customer_ids:
+            raise RuntimeError('scoring failed')
+        return {'processed_count': len(customer_ids), 'anomalies': [], 'alerts_created': 1}
+
+    def test_ranges_cover_active_customers(self):
+        from .tasks import _active_customer_ids, active_id_ranges
+
+        self.assertEqual(_active_customer_ids(self.cutoff), self.active_ids)
+        ranges = active_id_ranges(self.active_ids, 4)
+        self.assertEqual(ranges, [(self.active_ids[0], self.active_ids[3] + 1), (self.active_ids[4], self.active_ids[-1] + 1)])
+        self.assertEqual(_active_customer_ids(self.cutoff, *ranges[1]), self.active_ids[4:])
+
+    def test_chord_merges_the_same_counts_as_a_sequential_run(self):
+        from celery import current_app
+        from .tasks import anomaly_detector, batch_anomaly_detection, merge_batch_anomaly_results
+
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', current_app.conf.task_always_eager)
+        current_app.conf.task_always_eager = True
+        with mock.patch.object(anomaly_detector, 'detect_anomalies_batch', side_effect=self.detect), \
+                mock.patch.object(merge_batch_anomaly_results, 'run', wraps=merge_batch_anomaly_results.run) as callback:
+            queued = batch_anomaly_detection(range_size=2)
+            range_results = callback.call_args.args[0]
+            sequential = batch_anomaly_detection(fan_out=False, range_size=2)
+
+        self.assertEqual(queued['ranges_queued'], 3)
+        self.assertEqual(callback.call_count, 2)
+        merged = merge_batch_anomaly_results(range_results, time.time())
+        for result in (merged, sequential):
+            # The chunk holding the failing customer is counted as failed, the other ranges still merge
+            self.assertEqual(result['ranges'], 3)
+            self.assertEqual(result['processed_count'], len(self.active_ids) - 2)
+            self.assertEqual(result['failed_count'], 2)
+            self.assertEqual(result['alerts_created'], 2)
+
+
+class RetentionTests(TestCase):
+    """Expired rows are deleted in primary key chunks, events optionally archived first"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        cache.clear()
+        self.now = timezone.now()
+        self.customers = [
+            Customer.objects.create(customer_id=f'RET_{i}', name=f'Ret {i}', email=f'ret{i}@example.com')
+            for i in range(4)
+        ]
+        alerts = AnomalyAlert.objects.bulk_create([
+            AnomalyAlert(customer=self.customers[i % 4], alert_type='login_drop', severity='high',
+                         description='Login drop', anomaly_score=-0.8)
+            for i in range(7)
+        ])
+        AnomalyAlert.objects.filter(id__in=[a.id for a in alerts[:5]]).update(detected_at=self.now - timedelta(days=31))
+        for i, (active, days) in enumerate([(False, 8), (True, 8), (False, 1)]):
+            RealTimeWatchlist.objects.create(customer=self.customers[i], reason='test', is_active=active)
+            RealTimeWatchlist.objects.filter(customer=self.customers[i]).update(last_updated=self.now - timedelta(days=days))
+
+        events = [
+            CustomerEvent(customer=self.customers[i % 4], event_type='purchase', metadata={'amount': i, 'category': 'Books'} if i % 2 else {},
+                          timestamp=self.now - timedelta(days=100 - i))
+            for i in range(15)
+        ]
+        for event in events:
+            event.fill_typed_fields()
+        CustomerEvent.objects.bulk_create(events)
+
+    def test_alerts_and_inactive_watchlist_are_purged_in_chunks(self):
+        from .caching import TABLE_VERSION_KEY
+        from .retention import purge_expired
+
+        versions = cache.get_many([TABLE_VERSION_KEY.format('alerts'), TABLE_VERSION_KEY.format('watchlist')])
+        alerts = purge_expired('anomaly_alerts', chunk_size=2)
+        self.assertEqual((alerts['deleted'], alerts['chunks']), (5, 3))
+        self.assertEqual(AnomalyAlert.objects.count(), 2)
+
+        watchlist = purge_expired('watchlist', chunk_size=2)
+        self.assertEqual(watchlist['deleted'], 1)
+        self.assertEqual(
+            sorted(RealTimeWatchlist.objects.values_list('customer_id', flat=True)),
+            [self.customers[1].id, self.customers[2].id]
+        )
+        # One cache invalidation per run, not per deleted row
+        for table in ('alerts', 'watchlist'):
+            self.assertEqual(cache.get(TABLE_VERSION_KEY.format(table)), (versions.get(TABLE_VERSION_KEY.format(table)) or 0) + 1)
+
+    def test_expired_events_are_archived_before_deletion(self):
+        from datetime import timedelta
+        import shutil
+        import tempfile
+        import numpy as np
+        from . import retention
+
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir, ignore_errors=True)
+        expired = list(CustomerEvent.objects.filter(timestamp__lt=self.now - timedelta(days=90)).order_by('id'))
+        self.assertEqual(len(expired), 10)
+
+        with mock.patch.object(retention, 'ARCHIVE_DIR', retention.Path(archive_dir)):
+            stats = retention.purge_expired('events', chunk_size=4, archive=True, now=self.now)
+        self.assertEqual((stats['deleted'], len(stats['archived_files'])), (10, 3))
+        self.assertEqual(CustomerEvent.objects.count(), 5)
+
+        columns = [retention.read_event_archive(path) for path in stats['archived_files']]
+        archived = {column: np.concatenate([c[column] for c in columns]) for column in columns[0]}
+        self.assertEqual(archived['id'].tolist(), [event.id for event in expired])
+        self.assertEqual(archived['customer_id'].tolist(), [event.customer_id for event in expired])
+        self.assertEqual([json.loads(m) for m in archived['metadata']], [event.metadata for event in expired])
+        self.assertEqual(archived['category'].tolist(), [event.category or '' for event in expired])
+        np.testing.assert_array_equal(archived['amount'], [np.nan if event.amount is None else event.amount for event in expired])
+        self.assertEqual(
+            archived['timestamp'].astype('datetime64[us]').tolist(),
+            [event.timestamp.replace(tzinfo=None) for event in expired]
+        )
+
+
+class QueueWaitTests(TestCase):
+    """Tasks are stamped at publish and their queue wait recorded per queue when started"""
+
+    def setUp(self):
+        cache.clear()
+
+    def started(self, routing_key, sent_at, eta=None):
+        from celery.app.task import Context
+        from .queue_metrics import SENT_AT_HEADER, measure_queue_wait
+
+        request = Context({SENT_AT_HEADER: sent_at, 'eta': eta, 'delivery_info': {'routing_key': routing_key}})
+        measure_queue_wait(task=mock.Mock(request=request))
+
+    def test_routes_come_from_settings(self):
+        from celery import Celery
+
+        # Web-process publishers only see the settings, not celery.py
+        app = Celery()
+        app.config_from_object('django.conf:settings', namespace='CELERY')
+        for name, queue, priority in (
+            ('churnapp.tasks.send_anomaly_notification', 'realtime', 0),
+            ('churnapp.tasks.batch_anomaly_detection', 'bulk', 5),
+            ('churnapp.tasks.unrouted', 'bulk', None),
+        ):
+            route = app.amqp.router.route({}, name)
+            self.assertEqual((route['queue'].name, route.get('priority')), (queue, priority))
+
+    def test_waits_are_recorded_per_queue(self):
+        from datetime import datetime, timezone as dt_timezone
+        from .queue_metrics import SENT_AT_HEADER, queue_wait_stats, stamp_sent_at
+
+        now = 1_700_000_000.0
+        with mock.patch('time.time', return_value=now):
+            headers = {}
+            stamp_sent_at(headers=headers)
+            self.assertEqual(headers[SENT_AT_HEADER], now)
+
+            for _ in range(99):
+                self.started('realtime', now - 0.004)
+            self.started('realtime', now - 0.15)
+            for seconds in (1.5, 25):
+                self.started('bulk', now - seconds)
+            # A countdown task only starts waiting at its ETA
+            self.started('bulk', now - 600, eta=datetime.fromtimestamp(now - 0.015, dt_timezone.utc).isoformat())
+
+        stats = queue_wait_stats()
+        self.assertEqual(stats['realtime']['tasks'], 100)
+        self.assertEqual((stats['realtime']['p50_ms'], stats['realtime']['p99_ms']), (5, 5))
+        self.assertEqual(stats['bulk']['tasks'], 3)
+        self.assertEqual((stats['bulk']['p50_ms'], stats['bulk']['p99_ms']), (2000, 30000))
+
+
+class TaskPayloadTests(TestCase):
+    """Chained tasks carry ids and scalars; large outputs go to the prediction table"""
+
+    def setUp(self):
+        import numpy as np
+
+        self.customer = Customer.objects.create(customer_id='SLIM_1', name='Slim', email='slim@example.com')
+        self.result = {
+            'customer': self.customer,
+            'anomaly_score': np.float64(-0.9),
+            'is_anomaly': True,
+            'features': {'login_frequency': np.float64(0.0)},
+            'baseline': {'avg_logins_per_day': 2.0},
+            'incident_suppressed': False,
+            'anomaly_details': [{
+                'type': 'login_drop', 'severity': 'high', 'description': 'No logins',
+                'current_value': np.float64(0.0), 'baseline_value': np.float64(14.0)
+            }]
+        }
+
+    def test_detection_followups_send_json_payloads(self):
+        from .tasks import _handle_anomaly_result, send_anomaly_notification, trigger_churn_prediction
+
+        with mock.patch.object(send_anomaly_notification, 'delay') as notify, \
+                mock.patch.object(trigger_churn_prediction, 'delay') as predict:
+            _handle_anomaly_result(self.customer, self.result, fused=False)
+
+        for call in (notify.call_args, predict.call_args):
+            payload = json.loads(json.dumps([call.args, call.kwargs]))
+            self.assertEqual(payload[0][0], self.customer.id)
+        self.assertEqual(notify.call_args.args[1]['anomaly_details'][0]['baseline_value'], 14.0)
+        self.assertNotIn('customer', notify.call_args.args[1])
+        self.assertEqual(predict.call_args.kwargs['anomaly_context']['anomaly_types'], ['login_drop'])
+
+    @mock.patch('churnapp.tasks.predict_with_explainability')
+    def test_prediction_output_is_stored_not_returned(self, predict):
+        from .models import ChurnPrediction
+        from .tasks import add_to_watchlist, trigger_churn_prediction
+
+        predict.return_value = {
+            'churn_probability': 0.2,
+            'risk_category': {'risk_category': 'Low Risk', 'risk_level': 'low'},
+            'shap_values': {'Tenure': -0.12, 'Complain': 0.04}
+        }
+        with mock.patch.object(add_to_watchlist, 'delay') as watchlist:
+            returned = trigger_churn_prediction.apply(args=(self.customer.id,), kwargs={'anomaly_context': {'anomaly_score': -0.9}}).get()
+
+        prediction = ChurnPrediction.objects.get(customer=self.customer)
+        self.assertEqual(returned, {'customer_id': self.customer.id, 'churn_probability': 0.2, 'prediction_id': prediction.id})
+        self.assertEqual((prediction.risk_level, prediction.result['shap_values']['Tenure']), ('low', -0.12))
+        self.assertEqual(prediction.anomaly_context, {'anomaly_score': -0.9})
+        watchlist.assert_not_called()
+        self.assertTrue(add_to_watchlist.ignore_result)
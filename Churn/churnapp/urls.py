@@ -1,17 +1,34 @@
 
 from django.urls import path
 from .views import (
-    predict_view, track_customer_event, get_anomaly_alerts, 
+    predict_view, track_customer_event, track_customer_events, get_anomaly_alerts, 
     get_watchlist, trigger_anomaly_detection, resolve_alert, 
-    get_customer_behavior
+    get_customer_behavior, get_cache_stats, get_event_buffer_stats, get_detection_stats,
+    get_dashboard_stats, get_queue_stats
+)
+from .async_views import (
+    predict_view_async, get_anomaly_alerts_async, get_watchlist_async,
+    get_customer_behavior_async
 )
 
 urlpatterns = [
     path('predict/', predict_view, name='predict'),
     path('track-event/', track_customer_event, name='track_event'),
+    path('track-events/', track_customer_events, name='track_events'),
     path('alerts/', get_anomaly_alerts, name='get_alerts'),
     path('watchlist/', get_watchlist, name='get_watchlist'),
+    path('cache-stats/', get_cache_stats, name='cache_stats'),
+    path('event-buffer/stats/', get_event_buffer_stats, name='event_buffer_stats'),
+    path('detection-stats/', get_detection_stats, name='detection_stats'),
+    path('dashboard-stats/', get_dashboard_stats, name='dashboard_stats'),
+    path('queue-stats/', get_queue_stats, name='queue_stats'),
     path('trigger-anomaly/', trigger_anomaly_detection, name='trigger_anomaly'),
     path('resolve-alert/', resolve_alert, name='resolve_alert'),
     path('customer/<int:customer_id>/behavior/', get_customer_behavior, name='customer_behavior'),
+
+    # ASGI-native variants (serve with an ASGI server, e.g. uvicorn churn.asgi:application)
+    path('async/predict/', predict_view_async, name='predict_async'),
+    path('async/alerts/', get_anomaly_alerts_async, name='get_alerts_async'),
+    path('async/watchlist/', get_watchlist_async, name='get_watchlist_async'),
+    path('async/customer/<int:customer_id>/behavior/', get_customer_behavior_async, name='customer_behavior_async'),
 ]
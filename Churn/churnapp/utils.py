@@ -25,7 +25,9 @@ RAW_FEATURES = [
     "CashbackAmount"
 ]
 
-# Load trained pipeline (RandomForest + ColumnTransformer)
+# Load trained pipeline (RandomForest + ColumnTransformer). The artifact is
+# not in version control: it is the pipeline pickled by
+# Python_Code/Ecommerce_Churn_Prediction.ipynb, copied to this path
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'Model', 'Ecommerce_Churn_Prediction_model_output.pkl')
 
 # Handle scikit-learn version compatibility issues
@@ -597,6 +599,12 @@ def award_badges(churn_probability: float, customer_data: dict, retention_score_
     
     return badges
 
+def predict_churn_probability(data: dict) -> float:
+    """Churn probability only: no SHAP, segmentation or gamification"""
+    input_df = preprocess_input(data)
+    return round(float(model.predict_proba(input_df)[0][1]), 4)
+
+
 def predict_with_explainability(data: dict):
     """Make prediction + explainability with SHAP + personalized action suggestions + gamification"""
     input_df = preprocess_input(data)
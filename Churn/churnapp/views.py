@@ -1,13 +1,21 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework import status
+from .parsers import NDJSONParser
+from .ingestion import ingest_events
+from .event_buffer import event_buffer
 from .utils import predict_with_explainability, RAW_FEATURES
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.http import JsonResponse
 from .models import Customer, CustomerEvent, AnomalyAlert, RealTimeWatchlist
+from .caching import cached_listing, get_response_cache_stats
+from .coalescing import detection_coalescer
+from .dashboard_stats import dashboard_stats, DEFAULT_TOP_EVENT_TYPES
+from .queue_metrics import queue_wait_stats
 try:
-    from .tasks import process_customer_event, detect_customer_anomaly
+    from .tasks import process_customer_event, process_customer_events_batch, detect_customer_anomaly
     CELERY_AVAILABLE = True
 except ImportError:
     CELERY_AVAILABLE = False
@@ -16,12 +24,81 @@ try:
     ANOMALY_DETECTOR_AVAILABLE = True
 except ImportError:
     ANOMALY_DETECTOR_AVAILABLE = False
+from django.conf import settings
 from datetime import timedelta
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+MAX_EVENTS_PER_BATCH = getattr(settings, 'CHURN_MAX_EVENTS_PER_BATCH', 10000)
+# Accept events into the in-process write-behind buffer instead of queueing a task per request
+WRITE_BEHIND_ENABLED = getattr(settings, 'CHURN_EVENT_WRITE_BEHIND', False)
+VALID_EVENT_TYPES = {choice for choice, _ in CustomerEvent.EVENT_TYPES}
+
+
+def alert_to_dict(alert):
+    """Serialize an anomaly alert for the alerts listing (customer must be loaded)"""
+    return {
+        'id': alert.id,
+        'customer_id': alert.customer.id,
+        'customer_name': alert.customer.name,
+        'alert_type': alert.alert_type,
+        'severity': alert.severity,
+        'description': alert.description,
+        'anomaly_score': alert.anomaly_score,
+        'baseline_value': alert.baseline_value,
+        'current_value': alert.current_value,
+        'detected_at': alert.detected_at.isoformat(),
+        'is_resolved': alert.status == 'resolved'
+    }
+
+
+def watchlist_entry_to_dict(entry):
+    """Serialize a watchlist entry for the watchlist listing (customer must be loaded)"""
+    # Calculate risk level based on customer's current churn probability
+    churn_prob = entry.customer.current_churn_probability
+    if churn_prob >= 0.8:
+        risk_level = 'high'
+    elif churn_prob >= 0.5:
+        risk_level = 'medium'
+    else:
+        risk_level = 'low'
+
+    return {
+        'id': entry.id,
+        'customer_id': entry.customer.id,
+        'customer_name': entry.customer.name,
+        'churn_probability': churn_prob,
+        'risk_level': risk_level,
+        'reason': entry.reason,
+        'priority': entry.priority,
+        'added_at': entry.added_at.isoformat(),
+        'last_updated': entry.customer.last_prediction_update.isoformat() if entry.customer.last_prediction_update else entry.added_at.isoformat(),
+        'is_active': entry.is_active
+    }
+
+
+def event_to_dict(event):
+    return {
+        'id': event.id,
+        'event_type': event.event_type,
+        'metadata': event.metadata,
+        'timestamp': event.timestamp.isoformat()
+    }
+
+
+def customer_alert_to_dict(alert):
+    return {
+        'id': alert.id,
+        'alert_type': alert.alert_type,
+        'severity': alert.severity,
+        'description': alert.description,
+        'anomaly_score': alert.anomaly_score,
+        'detected_at': alert.detected_at.isoformat(),
+        'is_resolved': alert.status == 'resolved'
+    }
+
 
 @csrf_exempt
 @api_view(['POST', 'GET'])
@@ -79,11 +156,12 @@ def track_customer_event(request):
             )
         
         # Process event asynchronously
-        if CELERY_AVAILABLE:
+        task_id = None
+        if WRITE_BEHIND_ENABLED:
+            event_buffer.append(customer.id, event_type, metadata)
+        elif CELERY_AVAILABLE:
             task = process_customer_event.delay(customer_id, event_type, metadata)
             task_id = task.id
-        else:
-            task_id = None
         
         return Response({
             "message": "Event tracked successfully",
@@ -101,8 +179,88 @@ def track_customer_event(request):
         )
 
 
+@csrf_exempt
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+def track_customer_events(request):
+    """
+    Bulk event ingestion: accepts a JSON array or NDJSON stream of
+    {customer_id, event_type, metadata} objects and queues them as one batch
+    """
+    try:
+        events = request.data
+        if isinstance(events, dict):
+            events = events.get('events', [])
+        if not isinstance(events, list) or not events:
+            return Response(
+                {"error": "Expected a non-empty JSON array or NDJSON stream of events"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(events) > MAX_EVENTS_PER_BATCH:
+            return Response(
+                {"error": f"Batch exceeds {MAX_EVENTS_PER_BATCH} events"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        # Validate shape first, then every referenced customer in one query
+        rejected = []
+        candidates = []
+        for index, event in enumerate(events):
+            if not isinstance(event, dict) or not event.get('customer_id') or not event.get('event_type'):
+                rejected.append({'index': index, 'error': 'customer_id and event_type are required'})
+            elif event['event_type'] not in VALID_EVENT_TYPES:
+                rejected.append({'index': index, 'error': f"Unknown event_type '{event['event_type']}'"})
+            else:
+                try:
+                    candidates.append((index, int(event['customer_id']), event))
+                except (TypeError, ValueError):
+                    rejected.append({'index': index, 'error': 'customer_id must be an integer'})
+        
+        known_ids = set(Customer.objects.filter(
+            id__in={customer_id for _, customer_id, _ in candidates}
+        ).values_list('id', flat=True))
+        
+        accepted = []
+        for index, customer_id, event in candidates:
+            if customer_id not in known_ids:
+                rejected.append({'index': index, 'error': 'Customer not found'})
+                continue
+            accepted.append({
+                'customer_id': customer_id,
+                'event_type': event['event_type'],
+                'metadata': event.get('metadata') or {}
+            })
+        
+        task_id = None
+        if accepted:
+            if WRITE_BEHIND_ENABLED:
+                for event in accepted:
+                    event_buffer.append(event['customer_id'], event['event_type'], event['metadata'])
+            elif CELERY_AVAILABLE:
+                task_id = process_customer_events_batch.delay(accepted).id
+            else:
+                # No worker to hand off to: write the batch inline
+                ingest_events(accepted)
+        
+        return Response({
+            "message": "Events tracked successfully",
+            "task_id": task_id,
+            "accepted": len(accepted),
+            "rejected": sorted(rejected, key=lambda item: item['index']),
+            "timestamp": timezone.now().isoformat()
+        }, status=status.HTTP_201_CREATED if accepted else status.HTTP_400_BAD_REQUEST)
+        
+    except Exception as e:
+        logger.error(f"Error tracking events: {e}")
+        return Response(
+            {"error": "Failed to track events"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @csrf_exempt
 @api_view(['GET'])
+@cached_listing('alerts', 'customer')
 def get_anomaly_alerts(request):
     """Get recent anomaly alerts"""
     try:
@@ -112,23 +270,9 @@ def get_anomaly_alerts(request):
         cutoff_time = timezone.now() - timedelta(hours=hours_back)
         alerts = AnomalyAlert.objects.filter(
             detected_at__gte=cutoff_time
-        ).order_by('-detected_at')[:limit]
-        
-        alert_data = []
-        for alert in alerts:
-            alert_data.append({
-                'id': alert.id,
-                'customer_id': alert.customer.id,
-                'customer_name': alert.customer.name,
-                'alert_type': alert.alert_type,
-                'severity': alert.severity,
-                'description': alert.description,
-                'anomaly_score': alert.anomaly_score,
-                'baseline_value': alert.baseline_value,
-                'current_value': alert.current_value,
-                'detected_at': alert.detected_at.isoformat(),
-                'is_resolved': alert.status == 'resolved'
-            })
+        ).select_related('customer').order_by('-detected_at')[:limit]
+        
+        alert_data = [alert_to_dict(alert) for alert in alerts]
         
         return Response({
             'alerts': alert_data,
@@ -146,41 +290,20 @@ def get_anomaly_alerts(request):
 
 @csrf_exempt
 @api_view(['GET'])
+@cached_listing('watchlist', 'customer')
 def get_watchlist(request):
     """Get current real-time watchlist"""
     try:
         active_only = request.GET.get('active_only', 'true').lower() == 'true'
         limit = int(request.GET.get('limit', 50))
         
-        queryset = RealTimeWatchlist.objects.all()
+        queryset = RealTimeWatchlist.objects.select_related('customer')
         if active_only:
             queryset = queryset.filter(is_active=True)
         
         watchlist_entries = queryset.order_by('-added_at')[:limit]
         
-        watchlist_data = []
-        for entry in watchlist_entries:
-            # Calculate risk level based on customer's current churn probability
-            churn_prob = entry.customer.current_churn_probability
-            if churn_prob >= 0.8:
-                risk_level = 'high'
-            elif churn_prob >= 0.5:
-                risk_level = 'medium'
-            else:
-                risk_level = 'low'
-                
-            watchlist_data.append({
-                'id': entry.id,
-                'customer_id': entry.customer.id,
-                'customer_name': entry.customer.name,
-                'churn_probability': churn_prob,
-                'risk_level': risk_level,
-                'reason': entry.reason,
-                'priority': entry.priority,
-                'added_at': entry.added_at.isoformat(),
-                'last_updated': entry.customer.last_prediction_update.isoformat() if entry.customer.last_prediction_update else entry.added_at.isoformat(),
-                'is_active': entry.is_active
-            })
+        watchlist_data = [watchlist_entry_to_dict(entry) for entry in watchlist_entries]
         
         return Response({
             'watchlist': watchlist_data,
@@ -196,6 +319,73 @@ def get_watchlist(request):
         )
 
 
+@csrf_exempt
+@api_view(['GET'])
+def get_cache_stats(request):
+    """Get hit ratio and database queries saved by the listing cache"""
+    return Response(get_response_cache_stats(), status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+@api_view(['GET'])
+def get_event_buffer_stats(request):
+    """Get write-behind buffer depth and flush latency for this process"""
+    stats = event_buffer.stats()
+    stats['enabled'] = WRITE_BEHIND_ENABLED
+    return Response(stats, status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+@api_view(['GET'])
+def get_detection_stats(request):
+    """Get how many detection triggers were coalesced versus executed"""
+    return Response(detection_coalescer.stats(), status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+@api_view(['GET'])
+def get_dashboard_stats(request):
+    """
+    Get top customers by event type and distinct active customers from the
+    streaming sketches, without scanning events. Query params: event_type
+    (comma-separated, default the problem events), k (default 20) and
+    hour (YYYYMMDDHH, default the current hour).
+    """
+    event_types = request.GET.get('event_type')
+    event_types = event_types.split(',') if event_types else DEFAULT_TOP_EVENT_TYPES
+    unknown = [event_type for event_type in event_types if event_type not in VALID_EVENT_TYPES]
+    if unknown:
+        return Response({"error": f"Unknown event types: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        k = min(int(request.GET.get('k', 20)), dashboard_stats.capacity)
+    except ValueError:
+        return Response({"error": "k must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    if k < 1:
+        return Response({"error": "k must be at least 1"}, status=status.HTTP_400_BAD_REQUEST)
+
+    top =dashboard_stats.top_customers(event_types, k=k, hour=request.GET.get('hour'))
+    names = Customer.objects.in_bulk([entry['customer_id'] for entry in top['customers']])
+    for entry in top['customers']:
+        customer = names.get(entry['customer_id'])
+        entry['customer_name'] = customer.name if customer else None
+
+    return Response({
+        'top_customers': top,
+        'active_customers': dashboard_stats.active_customers(),
+        'timestamp': timezone.now().isoformat()
+    }, status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+@api_view(['GET'])
+def get_queue_stats(request):
+    """Get queue wait time percentiles for the realtime and bulk Celery queues"""
+    return Response({
+        'queue_wait': queue_wait_stats(),
+        'timestamp': timezone.now().isoformat()
+    }, status=status.HTTP_200_OK)
+
+
 @csrf_exempt
 @api_view(['POST'])
 def trigger_anomaly_detection(request):
@@ -317,27 +507,10 @@ def get_customer_behavior(request, customer_id):
         ).exists()
         
         # Format events data
-        events_data = []
-        for event in recent_events[:20]:  # Limit to 20 recent events
-            events_data.append({
-                'id': event.id,
-                'event_type': event.event_type,
-                'metadata': event.metadata,
-                'timestamp': event.timestamp.isoformat()
-            })
+        events_data = [event_to_dict(event) for event in recent_events[:20]]  # Limit to 20 recent events
         
         # Format alerts data
-        alerts_data = []
-        for alert in recent_alerts:
-            alerts_data.append({
-                'id': alert.id,
-                'alert_type': alert.alert_type,
-                'severity': alert.severity,
-                'description': alert.description,
-                'anomaly_score': alert.anomaly_score,
-                'detected_at': alert.detected_at.isoformat(),
-                'is_resolved': alert.status == 'resolved'
-            })
+        alerts_data = [customer_alert_to_dict(alert) for alert in recent_alerts]
         
         return Response({
             'customer_id': customer_id,
@@ -83,7 +83,8 @@ const RealTimeWatchlist = () => {
       
       watchlistWs.current.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        handleWatchlistUpdate(data);
+        // The server batches updates sent within the same tick into one frame
+        (data.type === 'batch' ? data.messages : [data]).forEach(handleWatchlistUpdate);
       };
       
       watchlistWs.current.onclose = () => {
@@ -111,7 +112,7 @@ const RealTimeWatchlist = () => {
       
       alertsWs.current.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        handleAlertUpdate(data);
+        (data.type === 'batch' ? data.messages : [data]).forEach(handleAlertUpdate);
       };
       
       alertsWs.current.onclose = () => {